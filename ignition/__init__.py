@@ -12,4 +12,10 @@ def __ignition_debug():
     return eval(os.getenv('IGNITION_DEBUG', 'False'))
 IGNITION_DEBUG = __ignition_debug()
 
+def __ignition_logging():
+    # Libraries leave logging configuration to the application.
+    import logging
+    logging.getLogger(__name__).addHandler(logging.NullHandler())
+__ignition_logging()
+
 from utils import *
@@ -53,7 +53,7 @@ class CodeObj(object):
     @property
     def variables(self):
         vars = filter(lambda x: isinstance(x, Variable), self.objs)
-        loops = filter(lambda x: isinstance(x, LoopNode) and x.kind == "for", self.objs)
+        loops = filter(lambda x: isinstance(x, LoopNode), self.objs)
         for loop in loops:
             if not loop.idx.declared:
                 vars.append(loop.idx)
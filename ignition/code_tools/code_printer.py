@@ -127,26 +127,33 @@ class CCodePrinter(CodePrinter):
         super(CCodePrinter, self).to_file(filename, header)
         self.c_files.append(filename)
 
-    def to_ctypes_module(self, modname):
-        self.to_file(modname+".c", modname+".h")
-        self._compile_shared_lib(modname)
-        ctypes_mod = "from ctypes import cdll\n"
-        ctypes_mod += "lib = cdll.LoadLibrary('./lib%(modname)s.so')\n"
+    def to_ctypes_module(self, modname, directory=None):
+        """Writes, compiles and wraps the code as the ctypes module modname
+        in directory, the current one by default, and returns the
+        directory."""
+        path = modname if directory is None else os.path.join(directory,
+                                                              modname)
+        self.to_file(path + ".c", path + ".h")
+        self._compile_shared_lib(modname, directory)
+        ctypes_mod = "import os\nfrom ctypes import cdll\n"
+        ctypes_mod += "lib = cdll.LoadLibrary(os.path.join(" \
+                      "os.path.dirname(os.path.abspath(__file__)), " \
+                      "'lib%(modname)s.so'))\n"
         for f in self.code_obj.functions:
-            ctypes_mod += "%(func)s = lib.%(func)s" % {"func": f.func_name}
-        with open(modname + ".py", 'w') as fp:
+            ctypes_mod += "%(func)s = lib.%(func)s\n" % {"func": f.func_name}
+        with open(path + ".py", 'w') as fp:
             fp.write(ctypes_mod % {"modname": modname})
         # TODO: Need to manage temporary files better.
-        return os.getcwd()
+        return os.getcwd() if directory is None else directory
 
-    def _compile_shared_lib(self, libname):
+    def _compile_shared_lib(self, libname, output_dir=None):
         if not self.c_files:
             raise RuntimeError("Must call to_file before compile")
 
         # TODO: Add configuration options for compiler
         compiler = distutils.ccompiler.new_compiler()
-        objs = compiler.compile(self.c_files)
-        compiler.link_shared_lib(objs, libname)
+        objs = compiler.compile(self.c_files, output_dir=output_dir)
+        compiler.link_shared_lib(objs, libname, output_dir=output_dir)
 
     def _print_header_file(self, headername):
         with open(headername, 'w') as fp:
@@ -155,8 +162,8 @@ class CCodePrinter(CodePrinter):
     def _decl_func(self, func_node, add_end=False):
         ret_type = func_node.ret_type
         if ret_type is None:
-            ret_type == "void"
-        func_args = " ".join(map(lambda x: x.var_type + " " + x.var_name,
+            ret_type = "void"
+        func_args = ", ".join(map(lambda x: x.var_type + " " + x.var_name,
                                  func_node.inputs))
         return "%(ret_type)s %(func_name)s(%(func_args)s)%(end)s" \
                % {'ret_type': ret_type,
@@ -193,12 +200,12 @@ class CCodePrinter(CodePrinter):
             else:
                 ret_str += "%(var_type)s %(var_name)s" % var.__dict__
                 val = var.var_init
-                ret_str += "" if val is NIL else "= %s" % val
+                ret_str += "" if val is NIL else " = %s" % val
             ret_str += ";\n"
         return ret_str
 
     def _visit_block_head(self, node, indent=0):
-        vars = set(node.variables)
+        vars = OrderedSet(node.variables)
         ret_str = "{\n"
         ret_str += indent_code(self._decl_vars(vars), indent)
         return ret_str
@@ -215,11 +222,11 @@ class CCodePrinter(CodePrinter):
         return indent_code("return %(output)s;\n" % node.__dict__, indent)
 
     def _visit_while_loop_head(self, node, indent=0):
-        return "(%(idx)s = %(init)s; \n" \
+        return "%(idx)s = %(init)s;\n" \
                "while (%(idx)s < %(test)s)\n" % node.__dict__
 
     def _visit_while_loop_inc(self, node, indent=0):
-        ret_str += indent_code("%(idx)s += %(inc)s;\n" % node.__dict__,
+        return indent_code("%(idx)s += %(inc)s;\n" % node.__dict__,
                                self.num_indent)
 
 
@@ -338,12 +345,12 @@ class PythonCodePrinter(CodePrinter):
 
 
     def _visit_while_loop_head(self, node, indent=0):
-        return "(%(idx)s = %(init)s \n" \
-               "while (%(idx)s < %(test)s):\n" % node.__dict__
+        return "%(idx)s = %(init)s\n" \
+               "while %(idx)s < %(test)s:\n" % node.__dict__
 
     def _visit_while_loop_inc(self, node, indent=0):
         return indent_code("%(idx)s += %(inc)s\n" % node.__dict__,
-                           indent + self.num_indent)
+                           self.num_indent)
 
     def _visit_variable(self, node, indent=0):
         ret_str = str(node)
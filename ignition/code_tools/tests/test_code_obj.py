@@ -48,6 +48,26 @@ def test_double_for_loop():
     create_double_sum()  # Should raise exception if fails.
 
 
+def create_while_sum():
+    """Returns a code dag for the sum of the even numbers below N."""
+    N = Variable('N', var_type='int')
+    sum_var = Variable('sum_var', var_type='int')
+
+    while_sum = FunctionNode('while_sum', ret_type='int', inputs=[N],
+                             output=sum_var)
+    while_sum.add_object(sum_var)
+    while_sum.add_statement('=', sum_var, 0)
+    wloop = LoopNode(kind='while', init=0, test=N, inc=2)
+    wloop.add_statement('+=', sum_var, wloop.idx)
+    while_sum.add_object(wloop)
+    return CodeObj().add_object(while_sum)
+
+
+def test_while_loop():
+    """Test for creating a while loop"""
+    create_while_sum()  # Should raise exception if fails.
+
+
 def create_index_variable_loop():
     """Create a dag with a simple loop sum"""
     sum = Variable('sum', var_type='int')
@@ -8,7 +8,8 @@ from ignition.code_tools.code_obj import Statement
 from ignition.code_tools.code_printer import CCodePrinter, PythonCodePrinter
 
 from test_code_obj import (create_class_obj, create_double_sum,
-                           create_index_variable_loop, create_sum_squares)
+                           create_index_variable_loop, create_sum_squares,
+                           create_while_sum)
 
 
 TEST_DIR = ''
@@ -55,6 +56,15 @@ def test_double_sum_C():
     assert(double_sum.double_sum(3) == 20)
 
 
+def test_while_sum_C():
+    dag = create_while_sum()
+    modname = "ignition_while_sum_c"
+    modpath = CCodePrinter(dag).to_ctypes_module(modname)
+    sys.path.append(modpath)
+    while_sum = import_module(modname)
+    assert(while_sum.while_sum(7) == 12)
+
+
 def test_index_variable_loop_C():
     dag = create_index_variable_loop()
     modname = "ignition_index_variable_loop_c"
@@ -90,6 +100,15 @@ def test_double_sum_Py():
     assert(double_sum.double_sum(3) == 20)
 
 
+def test_while_sum_Py():
+    dag = create_while_sum()
+    modname = "ignition_while_sum_py"
+    modpath = PythonCodePrinter(dag).to_module(modname)
+    sys.path.append(modpath)
+    while_sum = import_module(modname)
+    assert(while_sum.while_sum(7) == 12)
+
+
 def test_index_variable_loop_Py():
     dag = create_index_variable_loop()
     modname = "ignition_index_variable_loop_py"
@@ -8,4 +8,5 @@ generate FLAME worksheets or code.
 from tensors import *
 from pobj import *
 from generator import *
+from batch import generate_batch
 from printing import *
@@ -0,0 +1,135 @@
+"""Batch derivation of partitioned algorithms.
+
+generate_batch derives the algorithms of many (operation, loop invariant,
+args) jobs at once, for example the whole family of loop invariants of an
+operation.  Jobs given equal operands share their PObjs, so each operand
+is partitioned once, and jobs with the same invariant and operands share
+their generator.  The solver runs once for each distinct set of equations,
+on a pool of worker processes, and the worksheets are written at the end.
+"""
+
+from . import generator
+from .generator import (equations_key, get_solution_cache,
+                        NONCACHEABLE_SOLVER_KWS, PAlgGenerator)
+from .printing import get_printer
+from .tensors import tensor_solver
+from ...utils import get_num_procs, pool_imap
+
+# PObj keywords that set a partition directly instead of from its rules.
+_PART_KWS = ["part", "part_subs", "repart", "fuse"]
+# PObj keywords of the partition rules, compared by type and attributes.
+_RULE_KWS = ["part_fun", "repart_fun", "fuse_fun"]
+
+def _hashable (val):
+    """Returns val with its lists, sets and dicts made hashable."""
+    if isinstance(val, (list, tuple)):
+        return tuple(map(_hashable, val))
+    if isinstance(val, (set, frozenset)):
+        return frozenset(map(_hashable, val))
+    if isinstance(val, dict):
+        return tuple(sorted((k, _hashable(v)) for k, v in val.iteritems()))
+    return val
+
+def _rule_key (rule):
+    return type(rule), _hashable(getattr(rule, "__dict__", {}))
+
+def _arg_key (arg):
+    """Returns a key equal for PObjs with the same object, rules and
+    keywords, such as props, or id(arg) if they can't be compared."""
+    if any(kw in arg._kws for kw in _PART_KWS):
+        return id(arg)
+    kws = dict((k, v) for k, v in arg._kws.iteritems() if k not in _RULE_KWS)
+    key = (arg.obj, _hashable(arg._args), _hashable(kws)) + \
+          tuple(_rule_key(getattr(arg, kw)) for kw in _RULE_KWS)
+    try:
+        hash(key)
+    except TypeError:
+        return id(arg)
+    return key
+
+def _job_tuple (job):
+    """Returns (op, loop_inv, args, filename, filetype) of a job."""
+    if len(job) < 3 or len(job) > 5:
+        raise ValueError("Jobs are (op, loop_inv, args[, filename[, "
+                         "filetype]]) tuples, got: %s" % (job,))
+    return tuple(job) + (None,) * (5 - len(job))
+
+def _solve (job):
+    solver, b4_eqns, aft_eqns, knowns, solve_kws = job
+    return solver(b4_eqns, aft_eqns, e_knowns=knowns, **solve_kws)
+
+def generate_batch (jobs, solver=tensor_solver, num_procs=None,
+                    use_cache=None, **solve_kws):
+    """Generates the algorithms of jobs and returns their generators, in
+    the order of jobs.
+
+    Each job is a tuple (op, loop_inv, args), where args are the PObjs of
+    the loop invariant, optionally followed by the filename and filetype
+    of its worksheet.  Worksheets are only written for jobs with a
+    filename.  The solver runs are farmed out to num_procs worker
+    processes, all cpus by default, so the solver, the equations and
+    solve_kws must be picklable, and the solver must not start its own
+    workers.  use_cache and the remaining keywords are as for
+    PAlgGenerator.gen_update.
+    """
+    if get_num_procs(num_procs) != 1 and solve_kws.get("num_procs", 1) != 1:
+        raise ValueError("The solver can't use worker processes in a batch "
+                         "run on several processes.")
+    jobs = map(_job_tuple, jobs)
+    shared_args = {}
+    gens = {}
+    gen_list = []
+    job_gens = []
+    for op, loop_inv, args, _, _ in jobs:
+        args = tuple(shared_args.setdefault(_arg_key(arg), arg)
+                     for arg in args)
+        key = (op, loop_inv, tuple(map(id, args)))
+        if key not in gens:
+            gens[key] = PAlgGenerator(loop_inv, solver, *args, op=op)
+            gen_list.append(gens[key])
+        job_gens.append(gens[key])
+    # The distinct sets of equations, in the order of the jobs, and the
+    # generators having them.
+    keys = []
+    eqns_gens = {}
+    solve_jobs = {}
+    uncached = set()
+    for gen_obj in gen_list:
+        knowns = gen_obj.gen_eqns()
+        key = gen_obj.solution_key(knowns, solve_kws)
+        if key is None:
+            # Not cached, but the same equations are still solved once.
+            key = equations_key(gen_obj.b4_eqns, gen_obj.aft_eqns, knowns)
+            uncached.add(key)
+        if key not in eqns_gens:
+            keys.append(key)
+            eqns_gens[key] = []
+            solve_jobs[key] = (solver, gen_obj.b4_eqns, gen_obj.aft_eqns,
+                               knowns, solve_kws)
+        eqns_gens[key].append(gen_obj)
+    if use_cache is None:
+        use_cache = generator.USE_SOLUTION_CACHE
+    if any(solve_kws.get(k) for k in NONCACHEABLE_SOLVER_KWS):
+        use_cache = False
+    solutions = {}
+    if use_cache:
+        cache = get_solution_cache()
+        for key in keys:
+            if key in uncached:
+                continue
+            update_tups = cache.get(key)
+            if update_tups is not None:
+                solutions[key] = update_tups
+    todo = [key for key in keys if key not in solutions]
+    results = pool_imap(_solve, [solve_jobs[key] for key in todo], num_procs)
+    for key, update_tups in zip(todo, results):
+        solutions[key] = update_tups
+        if use_cache and key not in uncached:
+            cache.put(key, update_tups)
+    for key in keys:
+        for gen_obj in eqns_gens[key]:
+            gen_obj.set_update_tups(solutions[key])
+    for gen_obj, (_, _, _, filename, filetype) in zip(job_gens, jobs):
+        if filename is not None:
+            get_printer(gen_obj, filename, filetype).write()
+    return job_gens
@@ -0,0 +1,330 @@
+"""Benchmarks of the FLAME derivation engine.
+
+Runs a fixed corpus of derivations, the iterative methods of the demos with
+levels pinned so the corpus runs in well under a minute, and records for
+each the wall time, the orders of unknowns tested, the solutions found and
+the peak memory.  Nothing is printed to LaTeX and no solution cache is used.
+Each benchmark runs in its own process, see ignition.utils.benchmark.
+
+Save a baseline, then compare a later run against it:
+
+    python -m ignition.dsl.flame.benchmarks --save baseline.json
+    python -m ignition.dsl.flame.benchmarks --baseline baseline.json
+
+The exit status is 1 if a benchmark regressed.  --memo reports how many
+ranks and shapes the CG derivation computes with and without their memo.
+"""
+
+import optparse
+import sys
+
+from numpy import matrix
+
+from ...utils.benchmark import (compare, load_records, measure, run_isolated,
+                                save_records, TOLERANCE)
+from ...utils.iterators import flatten_list
+from .generator import PAlgGenerator
+from .pobj import PObj
+from .tensors import all_back_sub, iterative_arg, T, Tensor, tensor_solver
+from .tensors import tensor_expr
+from .tensors.basic_operators import add_invertible
+from .tensors.iterative_prules import (Fuse_1x1, Fuse_1x3, Fuse_J_3x3,
+                                       Part_1x1, Part_1x3, Part_J_3x3,
+                                       Repart_1x1, Repart_1x3, Repart_J_3x3)
+
+def _unroll (eqns):
+    ret_val = []
+    for eqn in eqns:
+        if isinstance(eqn, matrix):
+            ret_val.extend(flatten_list(eqn.tolist()))
+        else:
+            ret_val.append(eqn)
+    return ret_val
+
+def cg_eqns ():
+    """Returns the equations and knowns of an iteration of CG."""
+    delta_1, mu_12 = map(lambda x: Tensor(x, rank=0), ['delta_1', 'mu_12'])
+    r_1, r_2, p_1, p_2, x_1, x_2 = map(lambda x: Tensor(x, rank=1),
+                                       ['r_1', 'r_2', 'p_1', 'p_2', 'x_1',
+                                        'x_2'])
+    A = Tensor('A', rank=2)
+    eqns = [delta_1 * A * p_1 - r_1 + r_2,
+            p_2 - r_2 + p_1 * mu_12,
+            x_2 - x_1 - delta_1 * p_1,
+            T(r_1) * r_2,
+            T(p_1) * A * p_2]
+    return eqns, [p_1, r_1, x_1, A]
+
+def expanded_cg_eqns ():
+    """Returns the equations and knowns of CG with q = A*p."""
+    delta_1, mu_12 = map(lambda x: Tensor(x, rank=0), ['delta_1', 'mu_12'])
+    r_1, r_2, q_1, q_2, p_1, p_2, x_1, x_2 = map(
+        lambda x: Tensor(x, rank=1),
+        ['r_1', 'r_2', 'q_1', 'q_2', 'p_1', 'p_2', 'x_1', 'x_2'])
+    A = Tensor('A', rank=2)
+    eqns = [delta_1 * q_1 - r_1 + r_2,
+            delta_1 * A * p_1 - r_1 + r_2,
+            q_2 - A * p_2,
+            q_2 - A * r_2 + q_1 * mu_12,
+            p_2 - r_2 + p_1 * mu_12,
+            x_2 - x_1 - delta_1 * p_1,
+            T(r_1) * r_2,
+            T(p_1) * q_2]
+    return eqns, [p_1, q_1, r_1, x_1, A]
+
+def chronos_cg_eqns ():
+    """Returns the equations and knowns of the Chronopoulos-Gear CG."""
+    delta_1, omega_2, pi_1, pi_2, mu_12 = map(
+        lambda x: Tensor(x, rank=0),
+        ['delta_1', 'omega_2', 'pi_1', 'pi_2', 'mu_12'])
+    r_1, r_2, q_1, q_2, p_1, p_2, x_1, x_2 = map(
+        lambda x: Tensor(x, rank=1),
+        ['r_1', 'r_2', 'q_1', 'q_2', 'p_1', 'p_2', 'x_1', 'x_2'])
+    A, R_0, P_0 = map(lambda x: Tensor(x, rank=2), ['A', 'R_0', 'P_0'])
+    eqns = [r_2 - r_1 - delta_1 * q_1,
+            q_2 - A * p_2,
+            p_2 - r_2 + p_1 * mu_12,
+            q_2 - A * r_2 + q_1 * mu_12,
+            x_2 - x_1 - delta_1 * p_1,
+            omega_2 - T(r_2) * r_2,
+            pi_2 - T(p_2) * A * p_2,
+            T(R_0) * r_2,
+            T(r_1) * r_2,
+            T(P_0) * A * p_2,
+            T(p_1) * A * p_2,
+            T(p_2) * A * p_2 - T(r_2) * A * r_2 + T(mu_12) * pi_1 * mu_12]
+    return eqns, [pi_1, p_1, r_1, q_1, x_1, A, R_0, P_0]
+
+def _ak_kj_inv (A, K, J):
+    [A] = A
+    [K_l, k_m, K_r] = K
+    [[J_tl, _, _],
+     [Tj_ml, _, _],
+     [_, j_bm, J_br]] = J
+    return _unroll([A * K_l - K_l * J_tl - k_m * Tj_ml]), []
+
+def ak_kj_generator ():
+    """Returns the generator of the Krylov recurrence AK = KJ."""
+    A = PObj(Tensor("A", rank=2), part_fun=Part_1x1(),
+             repart_fun=Repart_1x1(), fuse_fun=Fuse_1x1(),
+             arg_src=PObj.ARG_SRC.Input)
+    K = PObj(Tensor("K", rank=2), part_fun=Part_1x3(),
+             repart_fun=Repart_1x3(), fuse_fun=Fuse_1x3(),
+             arg_src=PObj.ARG_SRC.Output)
+    J = PObj(Tensor("J", rank=2), part_fun=Part_J_3x3(),
+             repart_fun=Repart_J_3x3(), fuse_fun=Fuse_J_3x3(),
+             arg_src=PObj.ARG_SRC.Computed)
+    return PAlgGenerator(_ak_kj_inv, tensor_solver, A, K, J)
+
+def blocked_ak_kj_generator (block_size=None):
+    """Returns the generator of the block Krylov recurrence AK = KJ, whose
+    blocks of K are block_size columns wide."""
+    return PAlgGenerator(
+        _ak_kj_inv, tensor_solver,
+        iterative_arg("A", rank=2, part_suffix="1x1"),
+        iterative_arg("K", rank=2, part_suffix="Blocked_1x3",
+                      arg_src="Output", block_size=block_size),
+        iterative_arg("J", rank=2, part_suffix="Blocked_J_3x3",
+                      arg_src="Computed", block_size=block_size))
+
+def _ar_rh_inv (A, R, H, X, O):
+    [A] = A
+    [R_l, r_m, R_r] = R
+    [[H_tl, h_tm, H_tr],
+     [Th_ml, eta_mm, Th_mr],
+     [_, h_bm, H_br]] = H
+    [[O_tl, _, _],
+     [_, omega_mm, _],
+     [_, _, O_br]] = O
+    return _unroll([A * R_l - R_l * H_tl - r_m * Th_ml,
+                    T(R_l) * R_l - O_tl,
+                    T(r_m) * R_l,
+                    T(R_l) * r_m,
+                    T(r_m) * r_m - omega_mm]), []
+
+def ar_rh_generator ():
+    """Returns the generator of the orthogonalization AR = RH."""
+    return PAlgGenerator(
+        _ar_rh_inv, tensor_solver,
+        iterative_arg("A", rank=2, part_suffix="1x1"),
+        iterative_arg("R", rank=2, part_suffix="1x3", arg_src="Computed"),
+        iterative_arg("H", rank=2, part_suffix="H_3x3", arg_src="Computed"),
+        iterative_arg("X", rank=2, part_suffix="1x3", arg_src="Overwrite"),
+        iterative_arg("O", rank=2, part_suffix="Diag_3x3",
+                      arg_src="Computed"))
+
+def _cg_pme_inv (A, X, P, I, U, J, D, R, O):
+    [A] = A
+    [X_l, x_m, X_r] = X
+    [P_l, p_m, P_r] = P
+    [[I_tl, _, _],
+     [_, o, _],
+     [_, _, I_br]] = I
+    [[U_tl, u_tm, U_tr],
+     [_, _, t_u_mr],
+     [_, _, U_br]] = U
+    [[J_tl, _, _],
+     [T_m_j_ml, _, _],
+     [_, j_bm, J_br]] = J
+    [[D_l, _, _],
+     [_, d_m, _],
+     [_, _, D_r]] = D
+    [R_l, r_m, R_t] = R
+    return _unroll([A * P_l * D_l - R_l * (I_tl - J_tl) - r_m * T_m_j_ml,
+                    P_l * D_l - X_l * (I_tl - J_tl) - x_m * T_m_j_ml,
+                    P_l * (I_tl - U_tl) - R_l,
+                    - P_l * u_tm + p_m - r_m,
+                    T(R_l) * r_m,
+                    T(r_m) * R_l,
+                    T(P_l) * A * p_m]), []
+
+def cg_pme_generator ():
+    """Returns the generator of CG from the loop invariant of its PME.
+
+    Registers the invertible products of the demo, which changes global
+    state, so run it in its own process.
+    """
+    A = Tensor("A", rank=2)
+    P_0 = Tensor("P_0", rank=2)
+    add_invertible(T(P_0) * A * P_0)
+    add_invertible(T(P_0) * A ** 2 * P_0)
+    return PAlgGenerator(
+        _cg_pme_inv, tensor_solver,
+        iterative_arg("A", rank=2, part_suffix="1x1"),
+        iterative_arg("X", rank=2, part_suffix="1x3", arg_src="Overwrite"),
+        iterative_arg("P", rank=2, part_suffix="1x3", arg_src="Computed"),
+        iterative_arg("I", rank=2, part_suffix="I_3x3", arg_src="Computed"),
+        iterative_arg("U", rank=2, part_suffix="Upper_Bidiag_3x3",
+                      arg_src="Computed"),
+        iterative_arg("J", rank=2, part_suffix="J_3x3", arg_src="Computed"),
+        iterative_arg("D", rank=2, part_suffix="Diag_3x3",
+                      arg_src="Computed"),
+        iterative_arg("R", rank=2, part_suffix="1x3", arg_src="Computed"),
+        iterative_arg("O", rank=2, part_suffix="1x3", arg_src="Computed"))
+
+def solve_eqns (eqns_fun, levels):
+    """Benchmarks all_back_sub on the equations and knowns of eqns_fun."""
+    eqns, knowns = eqns_fun()
+    return {"solutions": len(all_back_sub(eqns, knowns, levels=levels))}
+
+def solve_generator (gen_fun, levels):
+    """Benchmarks the tensor_solver updates of the generator of gen_fun."""
+    sols = []
+    gen = gen_fun()
+    gen.gen_update(use_cache=False, verbose=False, levels=levels,
+                   sol_callback=lambda *sol: sols.append(sol))
+    return {"solutions": len(sols)}
+
+def solve_eqns_memo_size (memo_size, eqns_fun, levels):
+    """Benchmarks solve_eqns with the expr_rank and expr_shape memo limited
+    to memo_size entries, 0 turns it off."""
+    tensor_expr.MAX_RANK_CACHE_SIZE = memo_size
+    return solve_eqns(eqns_fun, levels)
+
+def rank_memo_records (eqns_fun=cg_eqns, levels=-1):
+    """Returns {"memo": record, "no_memo": record} of deriving the updates
+    of eqns_fun with and without the expr_rank and expr_shape memo.
+
+    The calls in the records are the ranks and shapes computed rather than
+    looked up.
+    """
+    return {"memo": run_isolated(solve_eqns_memo_size,
+                                 tensor_expr.MAX_RANK_CACHE_SIZE, eqns_fun,
+                                 levels),
+            "no_memo": run_isolated(solve_eqns_memo_size, 0, eqns_fun,
+                                    levels)}
+
+def format_memo_records (records):
+    """Returns a table of the records of rank_memo_records."""
+    lines = ["%-8s %9s %10s %9s %9s" % ("", "seconds", "expr_shape",
+                                        "expr_rank", "lookups")]
+    for name in ["no_memo", "memo"]:
+        rec = records[name]
+        lookups = rec["counters"].get("expr_shape.cache_hits", 0) + \
+                  rec["counters"].get("expr_rank.cache_hits", 0)
+        lines.append("%-8s %9.2f %10d %9d %9d" % (
+            name, rec["seconds"], rec["calls"].get("expr_shape", 0),
+            rec["calls"].get("expr_rank", 0), lookups))
+    return "\n".join(lines)
+
+# The corpus, (name, benchmark, eqns or generator function, levels).
+BENCHMARKS = [("cg", solve_eqns, cg_eqns, -1),
+              ("expanded_cg", solve_eqns, expanded_cg_eqns, 3),
+              ("chronos_cg", solve_eqns, chronos_cg_eqns, 1),
+              ("cg_pme", solve_generator, cg_pme_generator, 1),
+              ("ak_kj", solve_generator, ak_kj_generator, -1),
+              ("ar_rh", solve_generator, ar_rh_generator, 1)]
+
+def run_benchmarks (names=None, isolate=True):
+    """Returns {name: record} of the benchmarks in names, all by default.
+
+    Each record holds the wall time in seconds, the peak memory in
+    kilobytes, the number of solutions and orders tested, the levels used
+    and the solver counters.  With isolate each benchmark runs in a new
+    process.
+    """
+    run = run_isolated if isolate else measure
+    records = {}
+    for name, bench, fun, levels in BENCHMARKS:
+        if names is not None and name not in names:
+            continue
+        record = run(bench, fun, levels)
+        record["orders_tested"] = record["counters"].get("orders.tested", 0)
+        record["levels"] = levels
+        records[name] = record
+    return records
+
+def format_records (records, baseline=None):
+    """Returns a table of the records, with the baseline values if given."""
+    lines = ["%-12s %9s %9s %7s %5s" % ("benchmark", "seconds", "peak_kb",
+                                         "orders", "sols")]
+    for name, _, _, _ in BENCHMARKS:
+        if name not in records:
+            continue
+        rec = records[name]
+        lines.append("%-12s %9.2f %9d %7d %5d" % (name, rec["seconds"],
+                                                  rec["peak_kb"],
+                                                  rec["orders_tested"],
+                                                  rec["solutions"]))
+        if baseline and name in baseline:
+            rec = baseline[name]
+            lines.append("%-12s %9.2f %9d %7d %5d" % (
+                "  baseline", rec["seconds"], rec["peak_kb"],
+                rec["orders_tested"], rec["solutions"]))
+    return "\n".join(lines)
+
+def main (argv=None):
+    parser = optparse.OptionParser(usage="%prog [options] [benchmark ...]")
+    parser.add_option("-b", "--baseline", dest="baseline",
+                      help="Compare against the records in FILE",
+                      metavar="FILE")
+    parser.add_option("-s", "--save", dest="save",
+                      help="Save the records to FILE", metavar="FILE")
+    parser.add_option("-t", "--tolerance", dest="tolerance", type="float",
+                      default=TOLERANCE,
+                      help="Relative slow down flagged as a regression "
+                           "[default: %default]")
+    parser.add_option("-m", "--memo", dest="memo", action="store_true",
+                      default=False,
+                      help="Only report the effect of the rank and shape "
+                           "memo on the CG derivation")
+    opts, names = parser.parse_args(argv)
+    if opts.memo:
+        print format_memo_records(rank_memo_records())
+        return 0
+    records = run_benchmarks(names or None)
+    baseline = load_records(opts.baseline) if opts.baseline else None
+    print format_records(records, baseline)
+    if opts.save:
+        save_records(records, opts.save)
+    if baseline is None:
+        return 0
+    regressions = compare(records, baseline, opts.tolerance,
+                          keys=["seconds", "peak_kb", "orders_tested",
+                                "solutions"])
+    for name, key, old, new in regressions:
+        print "REGRESSION %s %s: %s -> %s" % (name, key, old, new)
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,13 +1,115 @@
 """Code generator for PME Language"""
 
+import os
+import sys
+from collections import namedtuple
+from sympy import srepr
+
+from ignition import __version__
+from ...utils.cache import DiskCache, hash_key
+from ...utils.frozen_dict import FrozenDict
 from .pobj import PObj
 from .printing import get_printer
+from .tensors.tensor import Tensor
+
+# Directory of the cache of solver results, set IGNITION_NO_CACHE to disable.
+SOLUTION_CACHE_DIR = os.getenv('IGNITION_CACHE_DIR',
+                               os.path.join(os.path.expanduser('~'),
+                                            '.ignition', 'cache'))
+USE_SOLUTION_CACHE = not os.getenv('IGNITION_NO_CACHE')
+# Format of the cached solutions, part of every key with the package
+# version.  Bump it when the solvers change their solutions, so earlier
+# entries are missed instead of returned.
+SOLUTION_CACHE_VERSION = 3
+# Solver options that don't change the solutions.
+UNCACHED_SOLVER_KWS = ['verbose', 'progress']
+# Solver options with side effects that a cache hit would skip, or whose
+# results depend on timing.
+NONCACHEABLE_SOLVER_KWS = ['solution_file', 'logic_files', 'sol_callback',
+                           'time_budget', 'profile']
+
+_solution_cache = None
+
+def get_solution_cache ():
+    """Returns the DiskCache used by PAlgGenerator.gen_update."""
+    global _solution_cache
+    if _solution_cache is None or \
+       _solution_cache.directory != SOLUTION_CACHE_DIR:
+        _solution_cache = DiskCache(SOLUTION_CACHE_DIR)
+    return _solution_cache
+
+def _canonical_eqns (eqns):
+    # srepr only records tensor names, so add the remaining attributes.
+    tensors = set()
+    for eqn in eqns:
+        tensors.update(filter(lambda a: isinstance(a, Tensor), eqn.atoms()))
+    return "%s\n%s" % ("\n".join(map(srepr, eqns)),
+                       "\n".join(sorted("%s %r %r %r %r" % (t.name, t.rank,
+                                                            t.shape,
+                                                            t.has_inverse,
+                                                            t.symmetric)
+                                         for t in tensors)))
+
+def _fun_name (fun):
+    """Returns the qualified name of fun, or None if the name doesn't
+    identify it, as for lambdas, partials and nested functions."""
+    module = getattr(fun, "__module__", None)
+    name = getattr(fun, "__name__", None)
+    if module is None or name is None or \
+       getattr(sys.modules.get(module), name, None) is not fun:
+        return None
+    return "%s.%s" % (module, name)
+
+def equations_key (b4_eqns, aft_eqns, knowns):
+    """Returns a key equal for the same equations and knowns."""
+    return (_canonical_eqns(b4_eqns), _canonical_eqns(aft_eqns),
+            "\n".join(sorted(map(srepr, knowns))))
+
+def solution_cache_key (solver, b4_eqns, aft_eqns, knowns, solve_kws):
+    """Returns the key identifying a call to solver in the solution cache,
+    or None if the solver or a function in solve_kws has no qualified name
+    to key on, in which case the solutions are not cached."""
+    # Functions, such as a cost, are named so the key is stable.
+    funs = [solver] + [v for k, v in solve_kws.iteritems()
+                       if callable(v) and k not in UNCACHED_SOLVER_KWS]
+    if any(_fun_name(fun) is None for fun in funs):
+        return None
+    kws = sorted((k, _fun_name(v) if callable(v) else v)
+                 for k, v in solve_kws.iteritems()
+                 if k not in UNCACHED_SOLVER_KWS)
+    return hash_key(SOLUTION_CACHE_VERSION, __version__, _fun_name(solver),
+                    *(equations_key(b4_eqns, aft_eqns, knowns) + (repr(kws),)))
+
+# The mappings of the arguments of a generator: {obj: partition} and
+# {obj: rule} dicts, and the partitions in argument order.
+PartMappings = namedtuple("PartMappings",
+                          ["partition", "part_fun", "repartition",
+                           "repart_fun", "fuse", "fuse_fun",
+                           "parts", "reparts", "fuses"])
+
+def part_mappings (args):
+    """Returns the PartMappings of the PObjs args, with FrozenDicts and
+    tuples."""
+    def _mapping (attr):
+        return FrozenDict((v.obj, getattr(v, attr)) for v in args)
+    return PartMappings(partition=_mapping("part"),
+                        part_fun=_mapping("part_fun"),
+                        repartition=_mapping("repart"),
+                        repart_fun=_mapping("repart_fun"),
+                        fuse=_mapping("fuse"),
+                        fuse_fun=_mapping("fuse_fun"),
+                        parts=tuple(v.part for v in args),
+                        reparts=tuple(v.repart for v in args),
+                        fuses=tuple(v.fuse for v in args))
 
 class PAlgGenerator (object):
     """Wrapper object for generating partitioned algorithms.
 
     operation: The operation to generate
     args: List of PObjs that are input for the operation.
+
+    The partition, repartition and fuse mappings are computed once, see
+    mappings, so call invalidate after changing an argument.
     """
 
     def __init__ (self, loop_inv_op, solver, *args, **kws):
@@ -32,78 +134,118 @@ class PAlgGenerator (object):
              "PAlgGenerator requires at least one output, none given."
         self.debug = False
         self.solver = solver
+        self._mappings = None
+
+    @property
+    def mappings (self):
+        """The PartMappings of the arguments, computed on first use."""
+        if self._mappings is None:
+            self._mappings = part_mappings(self._args)
+        return self._mappings
 
+    def invalidate (self, *args):
+        """Drops the mappings and the partitions of the PObjs args, of all
+        the arguments if none are given, after they changed."""
+        for arg in args or self._args:
+            arg.invalidate()
+        self._mappings = None
 
     @property
     def partition (self):
         """Partition mapping"""
-        ret_dict = {}
-        for v in self._args:
-            ret_dict[v.obj] = v.part
-        return ret_dict
+        return self.mappings.partition
 
     @property
     def part_fun (self):
-        ret_dict = {}
-        for v in self._args:
-            ret_dict[v.obj] = v.part_fun
-        return ret_dict
+        return self.mappings.part_fun
 
     @property
     def repartition (self):
         """Repartition mapping"""
-        ret_dict = {}
-        for v in self._args:
-            ret_dict[v.obj] = v.repart
-        return ret_dict
+        return self.mappings.repartition
 
     @property
     def repart_fun (self):
-        ret_dict = {}
-        for v in self._args:
-            ret_dict[v.obj] = v.repart_fun
-        return ret_dict
+        return self.mappings.repart_fun
 
     @property
     def fuse (self):
         """Fuse mapping"""
-        ret_dict = {}
-        for v in self._args:
-            ret_dict[v.obj] = v.fuse
-        return ret_dict
+        return self.mappings.fuse
 
     @property
     def fuse_fun (self):
-        ret_dict = {}
-        for v in self._args:
-            ret_dict[v.obj] = v.fuse_fun
-        return ret_dict
+        return self.mappings.fuse_fun
 
     def _repart_invariant(self):
-        return self.loop_inv_op(*map(lambda o: o.repart, self._args))
+        return self.loop_inv_op(*self.mappings.reparts)
 
     def _fuse_invariant(self):
-        return self.loop_inv_op(*map(lambda o: o.fuse, self._args))
+        return self.loop_inv_op(*self.mappings.fuses)
 
     def _loop_invariant(self):
-        return self.loop_inv_op(*map(lambda o: o.part, self._args))
+        return self.loop_inv_op(*self.mappings.parts)
 
     def _guard(self):
         return map(lambda o:o.part[-1], self.outputs)
 
-    def gen_update (self, filename=None, type=None, **solve_kws):
-        """Generates the loop updates and pre/post conditions inside loop."""
+    def gen_update (self, filename=None, type=None, use_cache=None,
+                    **solve_kws):
+        """Generates the loop updates and pre/post conditions inside loop.
+
+        The solutions are cached on disk, keyed on the equations, knowns
+        and solver options, so regenerating an unchanged algorithm skips
+        the solver.  Pass use_cache=False to always run the solver.
+
+        The remaining keywords go to the solver, for tensor_solver these
+        include time_budget, max_sols, cheapest and sol_callback to bound
+        the search and stream the solutions found.
+        """
+        knowns = self.gen_eqns()
+        if use_cache is None:
+            use_cache = USE_SOLUTION_CACHE
+        if any(solve_kws.get(k) for k in NONCACHEABLE_SOLVER_KWS):
+            use_cache = False
+        if use_cache:
+            key = self.solution_key(knowns, solve_kws)
+            use_cache = key is not None
+        if use_cache:
+            cache = get_solution_cache()
+            update_tups = cache.get(key)
+        else:
+            update_tups = None
+        if update_tups is None:
+            update_tups = self.solver(self.b4_eqns, self.aft_eqns,
+                                      e_knowns=knowns, **solve_kws)
+            if use_cache:
+                cache.put(key, update_tups)
+        self.set_update_tups(update_tups)
+
+    def gen_eqns (self):
+        """Sets the loop invariant, the equations before and after the
+        updates and the guard, and returns the knowns of the equations."""
         self.loop_inv = self._loop_invariant()
         self.b4_eqns, kb4 = self._repart_invariant()
         self.aft_eqns, kaft = self._fuse_invariant()
         self.guard = self._guard()
-        self.update_tups = self.solver(self.b4_eqns, self.aft_eqns,
-                                        e_knowns=kb4 + kaft, **solve_kws)
+        return kb4 + kaft
+
+    def solution_key (self, knowns, solve_kws):
+        """Returns the solution cache key of the equations set by gen_eqns,
+        with their knowns, or None if they can't be cached."""
+        return solution_cache_key(self.solver, self.b4_eqns, self.aft_eqns,
+                                  knowns, solve_kws)
+
+    def set_update_tups (self, update_tups):
+        """Sets the solutions of the solver, taking the first as the
+        update."""
+        self.update_tups = update_tups
         if len(self.update_tups) == 0:
             print "PAlgGenerator.generate: no updates found."
             self.update = None
+            self.update_order = None
         else:
-            self.update = self.update_tups[0][0]
+            self.update, self.update_order = self.update_tups[0]
 
 def generate (filename=None, filetype=None, op=None, loop_inv=None, inv_args=[],
               PME=None, solver=None, **solve_kws):
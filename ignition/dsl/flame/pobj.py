@@ -57,6 +57,13 @@ class PObj (object):
         self.props = kws.get("props", [])
         self.arg_src = kws.get("arg_src", [])
 
+    def invalidate (self):
+        """Drops the partitions computed by the rules, after a rule
+        changed."""
+        self._part = self._kws.get("part", None)
+        self._repart = self._kws.get("repart", None)
+        self._fuse = self._kws.get("fuse", None)
+
     @property
     def part (self):
         if self._part is None:
@@ -72,25 +79,32 @@ class PObj (object):
                                   % type(self.part))
 
     def _apply_partsub_list (self, subs):
-        def _recur(blst):
-            if type(blst) is list:
-                return map(_recur, blst)
-            elif blst in subs:
-                return subs[blst]
-            else:
-                return blst
-        return _recur(self.part)
+        """Returns a copy of the nested lists of the partition with the
+        entries in subs replaced, walking the lists with a stack."""
+        ret_val = list(self.part)
+        stack = [ret_val]
+        while stack:
+            blst = stack.pop()
+            for i, elem in enumerate(blst):
+                if type(elem) is list:
+                    blst[i] = list(elem)
+                    stack.append(blst[i])
+                elif elem in subs:
+                    blst[i] = subs[elem]
+        return ret_val
 
     @property
     def repart (self):
-        """Returns the partition transformed by repart"""
+        """Returns the partition transformed by repart, computed once, see
+        invalidate"""
         if self._repart is None:
             self._repart = self._apply_partsub(self.repart_fun(self.part))
         return self._repart
 
     @property
     def fuse (self):
-        """Returns the partition transformed by fuse"""
+        """Returns the partition transformed by fuse, computed once, see
+        invalidate"""
         if self._fuse is None:
             self._fuse = self._apply_partsub(self.fuse_fun(self.part))
         return self._fuse
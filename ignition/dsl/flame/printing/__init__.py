@@ -5,4 +5,6 @@ import os
 FLAME_TEMPLATE_DIR = os.path.join(os.path.dirname(__file__), "templates")
 
 from printer import get_printer, TemplatePrinter
+from c_code import c_function, flame_code_obj
+from numpy_code import NumpyPrinter
 from worksheet import LatexWorksheetPrinter, WorksheetPrinter
@@ -0,0 +1,430 @@
+"""C code for partitioned algorithms.
+
+flame_code_obj lowers the algorithm found by a PAlgGenerator to a
+code_tools function with a while loop over the loop index, laid out as
+described in loops.  The operands are column major arrays of doubles and
+their sizes are int arguments named after the symbols of their shapes.
+Each block of the repartition is a pointer into its operand, with the
+strides between its rows and columns, so transposes are views too.  The
+updates are evaluated with two BLAS-like kernels included in the code:
+ig_gemm for the dot, gemv, gemm and outer products, and ig_axpby for the
+scaled sums like axpy.  With blocked partition rules the block size is the
+int argument b after the sizes, and the middle blocks are b columns or rows
+wide, the last ones being cut at the end of their axis.  c_function
+compiles the code with CCodePrinter and returns it as a function of NumPy
+arrays.
+"""
+
+import ctypes
+import os
+import tempfile
+
+import numpy
+from sympy import Add, Mul, Pow, Symbol
+
+from ....code_tools import CCodePrinter, CodeObj
+from ....code_tools.code_obj import Blurb, FunctionNode, LoopNode, Statement, \
+                                    Variable
+from ..tensors.basic_operators import Inner, Inverse, Transpose
+from ..tensors.tensor import Tensor
+from ..tensors.tensor_expr import expr_rank, is_one, is_zero
+
+from .loops import algorithm_updates, block_size, loop_axis, loop_end, \
+                   py_name, repartition_slots
+
+C_KERNELS = """#include <stdlib.h>
+
+static int ig_min(int a, int b)
+{
+  return a < b ? a : b;
+}
+
+/* C = alpha*A*B + beta*C, A being m x p and B p x n.  Each matrix is given
+   by its first entry and the strides between its rows and its columns. */
+static void ig_gemm(int m, int n, int p, double alpha,
+                    const double* A, int ars, int acs,
+                    const double* B, int brs, int bcs,
+                    double beta, double* C, int crs, int ccs)
+{
+  int i, j, l;
+  for (j = 0; j < n; j++) {
+    for (i = 0; i < m; i++) {
+      double sum = 0.0;
+      for (l = 0; l < p; l++)
+        sum += A[i*ars + l*acs] * B[l*brs + j*bcs];
+      if (beta == 0.0)
+        C[i*crs + j*ccs] = alpha*sum;
+      else
+        C[i*crs + j*ccs] = alpha*sum + beta*C[i*crs + j*ccs];
+    }
+  }
+}
+
+/* Y = alpha*X + beta*Y, X and Y being m x n. */
+static void ig_axpby(int m, int n, double alpha,
+                     const double* X, int xrs, int xcs,
+                     double beta, double* Y, int yrs, int ycs)
+{
+  int i, j;
+  for (j = 0; j < n; j++) {
+    for (i = 0; i < m; i++) {
+      if (beta == 0.0)
+        Y[i*yrs + j*ycs] = alpha*X[i*xrs + j*xcs];
+      else
+        Y[i*yrs + j*ycs] = alpha*X[i*xrs + j*xcs] + beta*Y[i*yrs + j*ycs];
+    }
+  }
+}
+"""
+
+class _Block (object):
+    """A strided matrix in C: the pointer to its first entry, its number of
+    rows and columns and the strides between its rows and its columns."""
+
+    def __init__ (self, ptr, rows, cols, row_stride, col_stride):
+        self.ptr = ptr
+        self.rows = rows
+        self.cols = cols
+        self.row_stride = row_stride
+        self.col_stride = col_stride
+
+    @property
+    def T (self):
+        return _Block(self.ptr, self.cols, self.rows, self.col_stride,
+                      self.row_stride)
+
+    @property
+    def args (self):
+        return [self.ptr, self.row_stride, self.col_stride]
+
+def _block_range (index, size):
+    """Returns the first entry and the size of the block of an axis of the
+    given size at index, see block_indices.  The sizes are clamped to the
+    end of the axis, so the blocks at the end may be narrower or empty."""
+    if index == ":":
+        return "0", size
+    if index == ":k":
+        return "0", "k"
+    if index.endswith(":"):
+        start = index[:-1]
+        return start, "%s - ig_min(%s, %s)" % (size, start, size)
+    if ":" in index:
+        start, end = index.split(":")
+        return start, "ig_min(%s, %s) - (%s)" % (end, size, start)
+    return index, "1"
+
+def _offset (row, col, rows):
+    terms = [t for t in [row, "(%s)*(%s)" % (col, rows) if col != "0" else "0"]
+             if t != "0"]
+    return " + ".join(terms) if terms else "0"
+
+def _operand_dims (obj):
+    rows = str(obj.shape[0])
+    cols = str(obj.shape[1]) if obj.rank == 2 else "1"
+    return rows, cols
+
+def operand_sizes (gen_obj):
+    """Returns the symbols of the shapes of the operands of gen_obj, the
+    size arguments of its C function."""
+    sizes = []
+    for arg in gen_obj._args:
+        for dim in arg.obj.shape[:arg.obj.rank]:
+            if isinstance(dim, Symbol) and dim not in sizes:
+                sizes.append(dim)
+    return sizes
+
+class _Lowering (object):
+    """Lowers the loop of a generator to a code_tools loop node."""
+
+    def __init__ (self, gen_obj):
+        self.gen_obj = gen_obj
+        self.slots = repartition_slots(gen_obj)
+        operand, axis, lag = loop_axis(gen_obj)
+        size = _operand_dims(operand)[axis]
+        self.idx = Variable("k", "int")
+        blocked = block_size(gen_obj) is not None
+        self.loop = LoopNode("while", init=0,
+                             test=loop_end(size, lag, blocked),
+                             inc="b" if blocked else 1, idx=self.idx)
+        self.blocks = {}
+        self.scalars = {}
+        self.temps = []
+        self.num_temps = 0
+
+    def lower (self):
+        for arg in self.gen_obj._args:
+            obj = arg.obj
+            if obj.rank == 0:
+                raise NotImplementedError("Scalar operands are not supported: "
+                                          "%s" % obj)
+            rows, cols = _operand_dims(obj)
+            self.blocks[obj] = _Block(py_name(obj.name), rows, cols, "1", rows)
+        updates = algorithm_updates(self.gen_obj)
+        used = set(key for key, _ in updates)
+        for _, val in updates:
+            used.update(val.atoms(Tensor))
+        for ten in sorted(used, key=str):
+            if ten in self.slots:
+                self._bind(ten)
+        for key, val in updates:
+            self._update(key, val)
+        for temp in self.temps:
+            self.loop.add_statement("free", temp)
+        return self.loop
+
+    def _bind (self, ten):
+        """Declares the variable of a repartition entry."""
+        obj, indices, transposed = self.slots[ten]
+        rows, cols = _operand_dims(obj)
+        row, n_rows = _block_range(indices[0], rows)
+        if obj.rank == 2:
+            col, n_cols = _block_range(indices[1], cols)
+        else:
+            col, n_cols = "0", "1"
+        name = py_name(ten.name)
+        offset = _offset(row, col, rows)
+        if ten.rank == 0:
+            self.loop.add_object(Variable(name, "double",
+                                 var_init="%s[%s]" % (py_name(obj.name),
+                                                      offset)))
+            self.scalars[ten] = name
+            return
+        ptr = py_name(obj.name)
+        if offset != "0":
+            ptr += " + " + offset
+        self.loop.add_object(Variable(name, "double*", var_init=ptr))
+        block = _Block(name, n_rows, n_cols, "1", rows)
+        self.blocks[ten] = block.T if transposed else block
+
+    def _update (self, key, val):
+        name = py_name(key.name)
+        if key.rank == 0:
+            value = self.scalar(val)
+            if key not in self.scalars:
+                self.loop.add_object(Variable(name, "double"))
+                self.scalars[key] = name
+            self.loop.add_statement("=", name, value)
+            if key in self.slots:
+                obj, indices, _ = self.slots[key]
+                rows, _ = _operand_dims(obj)
+                row = _block_range(indices[0], rows)[0]
+                col = _block_range(indices[1], "1")[0] \
+                      if len(indices) > 1 else "0"
+                self.loop.add_statement("=", "%s[%s]" % (py_name(obj.name),
+                                        _offset(row, col, rows)), name)
+        elif key in self.blocks:
+            dest = self.blocks[key]
+            if key in val.atoms(Tensor):
+                self._axpby(self.evaluate(val), dest, "1.0", "0.0")
+            else:
+                self.evaluate(val, dest)
+        else:
+            self.blocks[key] = self.evaluate(val)
+
+    def _temp (self, rows, cols):
+        name = "t_%d" % self.num_temps
+        self.num_temps += 1
+        self.loop.add_object(Variable(name, "double*",
+                             var_init="malloc(sizeof(double) * (%s) * (%s))"
+                                      % (rows, cols)))
+        self.temps.append(name)
+        return _Block(name, rows, cols, "1", rows)
+
+    def _scalar_temp (self):
+        name = "t_%d" % self.num_temps
+        self.num_temps += 1
+        self.loop.add_object(Variable(name, "double"))
+        return name
+
+    def _gemm (self, left, right, dest, alpha, beta):
+        # Sized by dest, like ig_axpby, so a block cut at the end of its
+        # axis only gets the leading part of the product.
+        self.loop.add_statement(*(["ig_gemm", dest.rows, dest.cols, left.cols,
+                                   alpha] + left.args + right.args +
+                                  [beta] + dest.args))
+
+    def _axpby (self, block, dest, alpha, beta):
+        self.loop.add_statement(*(["ig_axpby", dest.rows, dest.cols, alpha] +
+                                  block.args + [beta] + dest.args))
+
+    def scalar (self, expr):
+        """Returns the C expression of a rank 0 expression."""
+        if expr.is_Number:
+            return repr(float(expr))
+        if isinstance(expr, Tensor):
+            if is_zero(expr):
+                return "0.0"
+            if is_one(expr):
+                return "1.0"
+            if expr not in self.scalars:
+                raise ValueError("Scalar %s is used before it is computed."
+                                 % expr)
+            return self.scalars[expr]
+        if isinstance(expr, Add):
+            return "(%s)" % " + ".join(map(self.scalar, expr.args))
+        if isinstance(expr, Mul):
+            if all(expr_rank(arg) == 0 for arg in expr.args):
+                return "(%s)" % " * ".join(map(self.scalar, expr.args))
+            return self._scalar_product(expr.args)
+        if isinstance(expr, Pow) and expr.args[1].is_Integer:
+            base = self.scalar(expr.args[0])
+            exp = int(expr.args[1])
+            prod = " * ".join([base] * abs(exp)) or "1.0"
+            return "(1.0 / (%s))" % prod if exp < 0 else "(%s)" % prod
+        if isinstance(expr, Inverse):
+            return "(1.0 / %s)" % self.scalar(expr.args[0])
+        if isinstance(expr, Transpose):
+            return self.scalar(expr.args[0])
+        if isinstance(expr, Inner):
+            return self._scalar_product(Mul.make_args(expr.args[0]) +
+                                        Mul.make_args(expr.args[1]))
+        raise NotImplementedError("Unable to lower: %s" % expr)
+
+    def _scalar_product (self, factors):
+        coeffs = [f for f in factors if expr_rank(f) == 0]
+        chain = [f for f in factors if expr_rank(f) != 0]
+        name = self._scalar_temp()
+        self.product(chain, _Block("&" + name, "1", "1", "1", "1"),
+                     self.scalar(Mul(*coeffs)) if coeffs else "1.0", "0.0")
+        return name
+
+    def operand (self, expr):
+        """Returns the block of a factor of a product."""
+        if isinstance(expr, Tensor) and expr in self.blocks:
+            return self.blocks[expr]
+        if isinstance(expr, Transpose):
+            return self.operand(expr.args[0]).T
+        if isinstance(expr, Tensor) and not (is_zero(expr) or is_one(expr)):
+            raise ValueError("%s is used before it is computed." % expr)
+        return self.evaluate(expr)
+
+    def product (self, factors, dest, alpha, beta):
+        """Computes dest = alpha*prod(factors) + beta*dest, from the right,
+        and returns dest, a new temporary if dest is None."""
+        blocks = map(self.operand, factors)
+        if dest is None:
+            dest = self._temp(blocks[0].rows, blocks[-1].cols)
+        while len(blocks) > 2:
+            right = blocks.pop()
+            left = blocks.pop()
+            tmp = self._temp(left.rows, right.cols)
+            self._gemm(left, right, tmp, "1.0", "0.0")
+            blocks.append(tmp)
+        if len(blocks) == 2:
+            self._gemm(blocks[0], blocks[1], dest, alpha, beta)
+        else:
+            self._axpby(blocks[0], dest, alpha, beta)
+        return dest
+
+    def evaluate (self, expr, dest=None):
+        """Computes the vector or matrix expr into dest and returns dest, a
+        new temporary if dest is None."""
+        beta = "0.0"
+        for term in Add.make_args(expr):
+            args = Mul.make_args(term)
+            if any(is_zero(arg) for arg in args):
+                continue
+            coeffs = [arg for arg in args if expr_rank(arg) == 0]
+            chain = [arg for arg in args if expr_rank(arg) != 0 and
+                     not (is_one(arg) and expr_rank(arg) == 2)]
+            if not chain:
+                raise NotImplementedError("Unable to lower the scalar %s of "
+                                          "%s." % (term, expr))
+            alpha = self.scalar(Mul(*coeffs)) if coeffs else "1.0"
+            dest = self.product(chain, dest, alpha, beta)
+            beta = "1.0"
+        if dest is None:
+            raise NotImplementedError("Unable to lower: %s" % expr)
+        if beta == "0.0":
+            self._axpby(dest, dest, "0.0", "0.0")
+        return dest
+
+def flame_code_obj (gen_obj, name="flame_algorithm"):
+    """Returns a CodeObj with the C function of the algorithm of gen_obj.
+
+    The function takes the sizes given by operand_sizes, the block size b
+    of blocked partition rules, then the operands in the order given to the
+    generator, and computes the outputs in place.
+    """
+    inputs = [Variable(str(size), "int") for size in operand_sizes(gen_obj)]
+    if block_size(gen_obj) is not None:
+        inputs.append(Variable("b", "int"))
+    inputs += [Variable(py_name(arg.obj.name), "double*")
+               for arg in gen_obj._args]
+    func = FunctionNode(name, inputs=inputs)
+    func.add_object(_Lowering(gen_obj).lower())
+    return CodeObj().add_object(Blurb(C_KERNELS)).add_object(func)
+
+def _check_array (obj, arr, size_vals):
+    """Raises TypeError or ValueError unless arr can be passed to C as the
+    operand obj, recording the sizes of its shape in size_vals."""
+    if not isinstance(arr, numpy.ndarray) or arr.dtype != numpy.float64:
+        raise TypeError("%s must be a float64 array, got %s."
+                        % (obj, getattr(arr, "dtype", type(arr).__name__)))
+    if not (arr.flags.f_contiguous and arr.flags.aligned and
+            arr.flags.writeable):
+        raise ValueError("%s must be a column major (Fortran contiguous), "
+                         "aligned and writeable array." % obj)
+    dims = obj.shape[:obj.rank]
+    if arr.ndim != len(dims):
+        raise ValueError("%s must have %d dimensions, got %d."
+                         % (obj, len(dims), arr.ndim))
+    for dim, val in zip(dims, arr.shape):
+        if isinstance(dim, Symbol):
+            expected = size_vals.setdefault(dim, val)
+        else:
+            expected = int(dim)
+        if val != expected:
+            raise ValueError("Size %s of %s is %d, expected %d."
+                             % (dim, obj, val, expected))
+
+def c_function (gen_obj, name="flame_algorithm", directory=None):
+    """Compiles the C code of gen_obj and returns it as a function of NumPy
+    arrays.
+
+    The function takes the operands in the order given to the generator,
+    and the block size as the keyword argument b, computes the outputs in
+    place and returns them, like the function of NumpyPrinter.  The
+    operands must be column major (Fortran contiguous) float64 arrays
+    whose shapes agree with the shapes of the tensors, see
+    numpy.asfortranarray, otherwise TypeError or ValueError is raised
+    before calling C.  The code is built in directory, a new temporary
+    directory by default.
+    """
+    code_obj = flame_code_obj(gen_obj, name)
+    if directory is None:
+        directory = tempfile.mkdtemp(prefix="ignition-")
+    CCodePrinter(code_obj).to_ctypes_module(name, directory)
+    c_fun = getattr(ctypes.cdll.LoadLibrary(
+                        os.path.join(directory, "lib%s.so" % name)), name)
+    c_fun.restype = None
+    operands = [arg.obj for arg in gen_obj._args]
+    sizes = operand_sizes(gen_obj)
+    outputs = [operands.index(arg.obj) for arg in gen_obj.outputs]
+    default_block_size = block_size(gen_obj)
+
+    def _call (*arrays, **kws):
+        if len(arrays) != len(operands):
+            raise TypeError("%s takes %d arrays, %d given."
+                            % (name, len(operands), len(arrays)))
+        b = kws.pop("b", default_block_size)
+        if kws:
+            raise TypeError("%s got unexpected keyword arguments: %s"
+                            % (name, ", ".join(sorted(kws))))
+        if default_block_size is not None and not b >= 1:
+            raise ValueError("The block size b must be positive, got %s."
+                             % b)
+        size_vals = {}
+        for obj, arr in zip(operands, arrays):
+            _check_array(obj, arr, size_vals)
+        c_args = [ctypes.c_int(size_vals[size]) for size in sizes]
+        if default_block_size is not None:
+            c_args.append(ctypes.c_int(b))
+        c_args += [arr.ctypes.data_as(ctypes.POINTER(ctypes.c_double))
+                   for arr in arrays]
+        c_fun(*c_args)
+        if len(outputs) == 1:
+            return arrays[outputs[0]]
+        return tuple(arrays[i] for i in outputs)
+    _call.__name__ = name
+    return _call
@@ -0,0 +1,235 @@
+"""Layout of the loop of a partitioned algorithm, shared by the code
+printers.
+
+The loop index k is the size of the top left part of the partition.  Each
+axis of an operand is split into the blocks of its repartition, indexed
+around k as in block_indices, and the fuse step moves k by one, or by the
+block size b of blocked partition rules, whose middle blocks are b entries
+wide.
+"""
+
+import keyword
+import re
+
+from numpy import ndarray
+
+from ..tensors.basic_operators import Transpose
+from ..tensors.cost import expr_cost
+from ..tensors.tensor import Tensor
+from ..tensors.tensor_expr import is_one, is_zero
+
+def py_name (name):
+    """Returns an identifier for a tensor name.
+
+    >>> py_name("A_TL")
+    'A_TL'
+    >>> py_name("a^T'")
+    'a_T_t'
+    >>> py_name("lambda_1"), py_name("lambda")
+    ('lambda_1', 'lambda_')
+    """
+    ident = re.sub(r"\W", "_", name.replace("'", "_t"))
+    if ident[0].isdigit():
+        ident = "_" + ident
+    if keyword.iskeyword(ident):
+        ident += "_"
+    return ident
+
+def block_indices (blocks, blocked=False):
+    """Returns the index of each block of an axis split into blocks.
+
+    The first block holds the k entries before the loop index and the last
+    one the entries after the others.  The middle blocks are single entries,
+    or ranges of b entries if blocked.
+
+    >>> block_indices(1)
+    [':']
+    >>> block_indices(4)
+    [':k', 'k', 'k+1', 'k+2:']
+    >>> block_indices(4, blocked=True)
+    [':k', 'k:k+b', 'k+b:k+2*b', 'k+2*b:']
+    """
+    if blocks == 1:
+        return [":"]
+    def _offset (i):
+        if not i:
+            return "k"
+        if blocked:
+            return "k+b" if i == 1 else "k+%d*b" % i
+        return "k+%d" % i
+    if blocked:
+        middle = ["%s:%s" % (_offset(i), _offset(i + 1))
+                  for i in xrange(blocks - 2)]
+    else:
+        middle = map(_offset, xrange(blocks - 2))
+    return [":k"] + middle + [_offset(blocks - 2) + ":"]
+
+def _grid (part):
+    if len(part) > 0 and isinstance(part[0], list):
+        return part
+    return [part]
+
+def _positions (shape):
+    return [(a, b) for a in xrange(shape[0]) for b in xrange(shape[1])]
+
+def _extents (grid):
+    """Returns the number of repartition blocks of each row and column of
+    a grid of repartition matrices and constants."""
+    rows = [1] * len(grid)
+    cols = [1] * len(grid[0])
+    for i, row in enumerate(grid):
+        for j, entry in enumerate(row):
+            if isinstance(entry, ndarray):
+                rows[i], cols[j] = entry.shape
+    return rows, cols
+
+def _is_constant (expr):
+    return is_zero(expr) or is_one(expr)
+
+def _is_partitioned (arg):
+    rows, cols = _extents(_grid(arg.repart))
+    return sum(rows) > 1 or sum(cols) > 1
+
+def block_size (gen_obj):
+    """Returns the block size of the blocked partition rules of gen_obj, or
+    None if they are not blocked.
+
+    The partitioned operands move together, so they are either all blocked
+    with the same block size, or none is.
+    """
+    sizes = set(getattr(arg.repart_fun, "block_size", None)
+                for arg in gen_obj._args if _is_partitioned(arg))
+    if len(sizes) > 1:
+        raise ValueError("Partition rules of different block sizes: %s"
+                         % ", ".join(map(str, sorted(sizes))))
+    if sizes:
+        return sizes.pop()
+    return None
+
+def repartition_slots (gen_obj):
+    """Returns {tensor: (operand, indices, transposed)} of the tensors of
+    the repartition of gen_obj.
+
+    indices holds the block index of the tensor along each axis of the
+    operand, one for vectors, and transposed tells if the block is the
+    transpose of the tensor.  Constants are left out.
+    """
+    blocked = block_size(gen_obj) is not None
+    slots = {}
+    for arg in gen_obj._args:
+        obj = arg.obj
+        if obj.rank == 0:
+            continue
+        rows, cols = _extents(_grid(arg.repart))
+        row_idx = block_indices(sum(rows), blocked)
+        col_idx = block_indices(sum(cols), blocked)
+        for elem, row, col in _repart_blocks(arg):
+            if obj.rank == 2:
+                indices = (row_idx[row], col_idx[col])
+            elif len(row_idx) > 1:
+                indices = (row_idx[row],)
+            else:
+                indices = (col_idx[col],)
+            _add_slot(slots, obj, elem, indices)
+    return slots
+
+def _repart_blocks (arg):
+    """Yields (elem, row, col) of the entries of the repartition of arg,
+    row and col being the block index along each axis."""
+    grid = _grid(arg.repart)
+    rows, cols = _extents(grid)
+    r0 = 0
+    for i, row in enumerate(grid):
+        c0 = 0
+        for j, entry in enumerate(row):
+            if isinstance(entry, ndarray):
+                for (a, b), elem in zip(_positions(entry.shape), entry.flat):
+                    yield elem, r0 + a, c0 + b
+            c0 += cols[j]
+        r0 += rows[i]
+
+def _add_slot (slots, obj, elem, indices):
+    transposed = isinstance(elem, Transpose)
+    if transposed:
+        elem = elem.args[0]
+    if not isinstance(elem, Tensor) or _is_constant(elem) or \
+       elem == obj or elem in slots:
+        return
+    slots[elem] = (obj, indices, transposed)
+
+def _block_lag (index, blocks):
+    """Returns the lag needed for the block at index of an axis split into
+    blocks, the last block being allowed to be empty."""
+    if index == blocks - 1:
+        return max(blocks - 3, 0)
+    return max(index - 1, 0)
+
+def _used_tensors (gen_obj):
+    """Returns the tensors read or written by the updates of gen_obj, or
+    None if they are not set."""
+    if gen_obj.update is None:
+        return None
+    used = set()
+    for key, val in algorithm_updates(gen_obj):
+        used.add(key)
+        used.update(val.atoms(Tensor))
+    return used
+
+def loop_axis (gen_obj):
+    """Returns (operand, axis, lag) of the loop of gen_obj.
+
+    The loop runs over the axis of the first partitioned output, and stops
+    lag entries, or lag blocks if blocked, before its end, so the blocks
+    after the loop index used by the updates exist.  The last block of a
+    blocked loop may be narrower than b.
+    """
+    used = _used_tensors(gen_obj)
+    lag = 0
+    for arg in gen_obj._args:
+        if arg.obj.rank == 0:
+            continue
+        rows, cols = _extents(_grid(arg.repart))
+        if used is None:
+            lag = max(lag, sum(rows) - 3, sum(cols) - 3)
+            continue
+        for elem, row, col in _repart_blocks(arg):
+            if isinstance(elem, Transpose):
+                elem = elem.args[0]
+            if elem in used:
+                lag = max(lag, _block_lag(row, sum(rows)),
+                          _block_lag(col, sum(cols)))
+    for arg in gen_obj.outputs:
+        rows, cols = _extents(_grid(arg.repart))
+        if sum(rows) > 1:
+            return arg.obj, 0, lag
+        elif sum(cols) > 1:
+            return arg.obj, 1 if arg.obj.rank == 2 else 0, lag
+    raise ValueError("No partitioned output to loop over.")
+
+def loop_end (size, lag, blocked=False):
+    """Returns the end of the loop over an axis of the given size, lag
+    entries or blocks of b entries before its end.
+
+    >>> loop_end("n", 0), loop_end("n", 1), loop_end("n", 2, blocked=True)
+    ('n', 'n - 1', 'n - 2*b')
+    """
+    if not lag:
+        return size
+    if blocked:
+        return "%s - %s" % (size, "b" if lag == 1 else "%d*b" % lag)
+    return "%s - %d" % (size, lag)
+
+def algorithm_updates (gen_obj):
+    """Returns the (tensor, expression) updates of gen_obj in computing
+    order, taking the cheapest of alternative expressions."""
+    if gen_obj.update is None:
+        raise ValueError("No updates to print, see PAlgGenerator.gen_update.")
+    order = getattr(gen_obj, "update_order", None)
+    keys = reversed(order) if order else gen_obj.update.keys()
+    ret_val = []
+    for key in keys:
+        val = gen_obj.update[key]
+        if isinstance(val, (set, frozenset)):
+            val = min(val, key=lambda v: (expr_cost(v), str(v)))
+        ret_val.append((key, val))
+    return ret_val
@@ -0,0 +1,137 @@
+"""NumPy code printer for partitioned algorithms.
+
+NumpyPrinter writes the algorithm found by a PAlgGenerator as a Python
+function of its operands, which it updates in place.  The loop is laid
+out as described in loops, each block of the repartition being a NumPy
+view of its operand, so no block is copied.  The updates are evaluated with
+dot, which calls the BLAS dot, gemv and gemm routines, and the sums of
+scaled vectors, like axpy, are NumPy array expressions.  With blocked
+partition rules the middle blocks are b columns or rows wide, b being a
+keyword argument of the function, and the updates are gemm calls.  The
+blocks at the end of the operands may be narrower, so the update of a
+block is trimmed to its shape, as the C printer does.
+"""
+
+from copy import copy
+
+from ..tensors.printers import defaults, print_visitor
+from ..tensors.tensor import Tensor
+from ..tensors.tensor_expr import is_one, is_zero
+
+from .loops import algorithm_updates, block_size, loop_axis, loop_end, \
+                   py_name, repartition_slots
+from .printer import TemplatePrinter
+
+def _numpy_tensor (expr):
+    if is_zero(expr):
+        return "0.0"
+    if is_one(expr):
+        if expr.rank == 0:
+            return "1.0"
+        raise NotImplementedError("Unable to print: %s" % expr)
+    return py_name(expr.name)
+
+numpy_strs = copy(defaults)
+numpy_strs["dot"] = "dot(%s, %s)"
+numpy_strs["inverse"] = "inv(%s)"
+numpy_strs["mat_pow"] = "matrix_power(%s, %s)"
+numpy_strs["outer"] = "outer(%s, %s)"
+numpy_strs["tensor"] = _numpy_tensor
+numpy_strs["transpose"] = "(%s).T"
+
+def numpy_expr (expr):
+    """Prints a tensor expression as a NumPy expression of arrays, vectors
+    being one dimensional arrays."""
+    return print_visitor(expr, numpy_strs)
+
+class NumpyPrinter (TemplatePrinter):
+    """Prints the algorithm of a generator as a Python function.
+
+    The function takes the operands in the order given to the generator,
+    as NumPy arrays, computes the outputs in place and returns them.  Call
+    function to get it without writing a file.  The function of blocked
+    partition rules takes the block size b as a keyword argument, whose
+    default is the block size of the rules.
+    """
+
+    def __init__ (self, gen_obj, filename=None, name="flame_algorithm",
+                  template="numpy.mako", **kws):
+        TemplatePrinter.__init__(self, template, filename)
+        self._gen_obj = gen_obj
+        self.name = name
+
+    @property
+    def template_dict(self):
+        operand, axis, lag = loop_axis(self._gen_obj)
+        args = self._operand_names
+        size = block_size(self._gen_obj)
+        if size is None:
+            loop_range = loop_end("n", lag)
+        else:
+            args = args + ["b=%d" % size]
+            loop_range = "0, %s, b" % loop_end("n", lag, blocked=True)
+        return {"name" : self.name,
+                "args" : ", ".join(args),
+                "blocked" : size is not None,
+                "size" : "%s.shape[%d]" % (py_name(operand.name), axis),
+                "loop_range" : loop_range,
+                "body" : self._body(),
+                "outputs" : self._outputs,
+                }
+
+    def function(self):
+        """Returns the printed function."""
+        namespace = {}
+        code = compile(self.render(), self.filename or "<%s>" % self.name,
+                       "exec")
+        exec code in namespace
+        return namespace[self.name]
+
+    @property
+    def _operand_names(self):
+        return [py_name(arg.obj.name) for arg in self._gen_obj._args]
+
+    @property
+    def _outputs(self):
+        names = [py_name(arg.obj.name) for arg in self._gen_obj.outputs]
+        if len(names) == 1:
+            return names[0]
+        return ", ".join(names)
+
+    def _body(self):
+        """Returns the lines of the loop body."""
+        slots = repartition_slots(self._gen_obj)
+        blocked = block_size(self._gen_obj) is not None
+        updates = algorithm_updates(self._gen_obj)
+        used = set()
+        for key, val in updates:
+            used.update(val.atoms(Tensor))
+        lines = []
+        for ten in sorted(used, key=str):
+            if ten in slots:
+                lines.append("%s = %s" % (py_name(ten.name),
+                                          self._view(slots[ten])))
+        for key, val in updates:
+            name = py_name(key.name)
+            if key in slots and blocked:
+                lines.append("%s = %s" % (name, self._view(slots[key])))
+                lines.append("%s[...] = fit(%s, %s.shape)"
+                             % (name, numpy_expr(val), name))
+            elif key in slots:
+                operand, indices, transposed = slots[key]
+                value = numpy_expr(val)
+                if transposed:
+                    value = "(%s).T" % value
+                lines.append("%s[%s] = %s" % (py_name(operand.name),
+                                              ", ".join(indices), value))
+                lines.append("%s = %s" % (name, self._view(slots[key])))
+            else:
+                lines.append("%s = %s" % (name, numpy_expr(val)))
+        return lines
+
+    def _view(self, slot):
+        operand, indices, transposed = slot
+        view = "%s[%s]" % (py_name(operand.name), ", ".join(indices))
+        if transposed:
+            view += ".T"
+        return view
@@ -1,10 +1,38 @@
 """Base printer objects."""
 
+import os
 import sys
 
 from mako.lookup import TemplateLookup
+from mako.runtime import Context
 
 from ignition.dsl.flame.printing import FLAME_TEMPLATE_DIR
+from ignition.utils.cache import hash_key
+
+# Directory of the compiled templates, set IGNITION_NO_CACHE to disable.
+# The modules of each template directory are kept apart, so other
+# installs don't load modules of templates with the same names.
+TEMPLATE_MODULE_DIR = os.path.join(
+    os.getenv('IGNITION_TEMPLATE_CACHE_DIR',
+              os.path.join(os.path.expanduser('~'), '.ignition', 'templates')),
+    hash_key(os.path.abspath(FLAME_TEMPLATE_DIR)))
+USE_TEMPLATE_MODULES = not os.getenv('IGNITION_NO_CACHE')
+
+_template_lookup = None
+
+def get_template_lookup ():
+    """Returns the process wide lookup of the printer templates.
+
+    The templates are compiled once per process, and to modules in
+    TEMPLATE_MODULE_DIR, which later processes load instead of compiling
+    the templates again.
+    """
+    global _template_lookup
+    if _template_lookup is None:
+        module_dir = TEMPLATE_MODULE_DIR if USE_TEMPLATE_MODULES else None
+        _template_lookup = TemplateLookup(FLAME_TEMPLATE_DIR,
+                                          module_directory=module_dir)
+    return _template_lookup
 
 class TemplatePrinter (object):
     """Abstract printer class for using a Mako Template"""
@@ -13,15 +41,24 @@ class TemplatePrinter (object):
         self.template = template
         self.filename = filename
 
+    def render(self):
+        """Returns the filled in template as a string."""
+        template = get_template_lookup().get_template(self.template)
+        return template.render(**self.template_dict)
+
     def write(self):
-        mylookup = TemplateLookup(FLAME_TEMPLATE_DIR)
-        template = mylookup.get_template(self.template)
+        """Writes the filled in template to filename, or to stdout if it is
+        None, as it is rendered."""
+        template = get_template_lookup().get_template(self.template)
+        # Filled in before the file is opened, so errors leave no file.
+        template_dict = self.template_dict
         if self.filename is None:
-            fp = sys.stdout
-        else:
-            fp = open(self.filename, 'w')
-        fp.write(template.render(**self.template_dict))
-        if self.filename is not None:
+            template.render_context(Context(sys.stdout, **template_dict))
+            return
+        fp = open(self.filename, 'w')
+        try:
+            template.render_context(Context(fp, **template_dict))
+        finally:
             fp.close()
 
     @property
@@ -41,8 +78,11 @@ def get_printer (gen_obj, filename=None, filetype=None):
         return LatexWorksheetPrinter(gen_obj, filename)
     elif filetype == "text" or ext == "txt":
         return WorksheetPrinter(gen_obj, filename)
+    elif filetype == "numpy" or ext == "py":
+        return NumpyPrinter(gen_obj, filename)
 
     raise ValueError, "Unable to determine file type from extension\n"\
                       "  given: %s" % filename
 
+from numpy_code import NumpyPrinter
 from worksheet import LatexWorksheetPrinter, WorksheetPrinter
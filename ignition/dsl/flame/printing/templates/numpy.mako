@@ -0,0 +1,17 @@
+<%namespace file="license.mako" import="license" />${license('#')}
+from numpy import dot, outer
+from numpy.linalg import inv, matrix_power
+% if blocked:
+
+def fit(value, shape):
+    """Returns the leading part of value of the given shape."""
+    return value[tuple(slice(0, size) for size in shape)]
+% endif
+
+def ${name}(${args}):
+    n = ${size}
+    for k in xrange(${loop_range}):
+% for line in body:
+        ${line}
+% endfor
+    return ${outputs}
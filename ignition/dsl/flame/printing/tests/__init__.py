@@ -0,0 +1 @@
+from ignition.dsl.flame.tests import setup_package, teardown_package
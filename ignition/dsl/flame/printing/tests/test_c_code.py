@@ -0,0 +1,133 @@
+import numpy
+from numpy.linalg import matrix_power
+from sympy.utilities.pytest import raises
+
+from ignition.code_tools import CCodePrinter
+from ignition.dsl.flame import PAlgGenerator
+from ignition.dsl.flame.benchmarks import ak_kj_generator, \
+                                          blocked_ak_kj_generator
+from ignition.dsl.flame.printing import c_function, flame_code_obj, \
+                                        NumpyPrinter
+from ignition.dsl.flame.tensors import T, Tensor, iterative_arg, tensor_solver
+
+def _rand (*shape):
+    return numpy.asfortranarray(numpy.random.rand(*shape))
+
+def _zeros (shape):
+    return numpy.zeros(shape, order="F")
+
+def cg_generator ():
+    """Returns a generator with the CG updates set by hand."""
+    gen_obj = PAlgGenerator(None, tensor_solver,
+        iterative_arg("A", rank=2, part_suffix="1x1"),
+        iterative_arg("P", rank=2, part_suffix="1x3", arg_src="Computed"),
+        iterative_arg("R", rank=2, part_suffix="1x3", arg_src="Output"),
+        iterative_arg("D", rank=2, part_suffix="Diag_3x3",
+                      arg_src="Computed"))
+    A = Tensor("A", rank=2)
+    p_1, p_2, r_1, r_2 = map(lambda x: Tensor(x, rank=1),
+                             ["p_1", "p_2", "r_1", "r_2"])
+    delta_11 = Tensor("delta_11", rank=0)
+    gen_obj.update = {delta_11: (T(r_1) * r_1) / (T(p_1) * A * p_1),
+                      r_2: r_1 - delta_11 * A * p_1,
+                      p_2: r_2 + (T(r_2) * r_2) / (T(r_1) * r_1) * p_1}
+    gen_obj.update_order = [p_2, r_2, delta_11]
+    return gen_obj
+
+def blocked_generator ():
+    """Returns a generator of Y = AXD with blocked partitions of X, D and Y
+    and its update set by hand."""
+    gen_obj = PAlgGenerator(None, tensor_solver,
+        iterative_arg("A", rank=2, part_suffix="1x1"),
+        iterative_arg("X", rank=2, part_suffix="Blocked_1x3", block_size=3),
+        iterative_arg("D", rank=2, part_suffix="Blocked_Diag_3x3",
+                      block_size=3),
+        iterative_arg("Y", rank=2, part_suffix="Blocked_1x3",
+                      arg_src="Output", block_size=3))
+    A, X_1, D_11, Y_1 = map(lambda x: Tensor(x, rank=2),
+                            ["A", "X_1", "D_11", "Y_1"])
+    gen_obj.update = {Y_1: A * X_1 * D_11}
+    return gen_obj
+
+def test_ak_kj ():
+    gen_obj = ak_kj_generator()
+    gen_obj.gen_update(use_cache=False)
+    src = CCodePrinter(flame_code_obj(gen_obj, "ak_kj")).code_str()
+    assert("void ak_kj(int n, double* A, double* K, double* J)" in src)
+    assert("while (k < n - 1)" in src)
+    ak_kj = c_function(gen_obj, "ak_kj")
+    A = _rand(6, 6)
+    K = _zeros((6, 6))
+    K[:, 0] = _rand(6)
+    J = _zeros((6, 6))
+    assert(ak_kj(A, K, J) is K)
+    for j in xrange(6):
+        assert(numpy.allclose(K[:, j], numpy.dot(matrix_power(A, j), K[:, 0])))
+
+def test_cg ():
+    gen_obj = cg_generator()
+    c_cg = c_function(gen_obj, "cg")
+    py_cg = NumpyPrinter(gen_obj).function()
+    M = _rand(5, 5)
+    A = numpy.asfortranarray(numpy.dot(M.T, M) + 5 * numpy.eye(5))
+    b = _rand(5)
+    arrays = {}
+    for fun in [c_cg, py_cg]:
+        P, R, D = _zeros((5, 5)), _zeros((5, 5)), _zeros((5, 5))
+        P[:, 0] = R[:, 0] = b
+        assert(fun(A, P, R, D) is R)
+        arrays[fun] = (P, R, D)
+    for c_arr, py_arr in zip(arrays[c_cg], arrays[py_cg]):
+        assert(numpy.allclose(c_arr, py_arr))
+    # The residuals are orthogonal.
+    R = arrays[c_cg][1]
+    RtR = numpy.dot(R.T, R)
+    assert(numpy.allclose(RtR, numpy.diag(numpy.diag(RtR))))
+
+def test_checks ():
+    gen_obj = ak_kj_generator()
+    gen_obj.gen_update(use_cache=False)
+    ak_kj = c_function(gen_obj, "ak_kj")
+    A, K, J = _rand(4, 4), _zeros((4, 4)), _zeros((4, 4))
+    ak_kj(A, K, J)
+    # Nothing is copied, so only column major doubles are taken.
+    raises(TypeError, "ak_kj(A, K, numpy.zeros((4, 4), dtype=int))")
+    raises(ValueError, "ak_kj(numpy.ascontiguousarray(A), K, J)")
+    raises(ValueError, "ak_kj(A, K[:, ::2], J)")
+    raises(ValueError, "ak_kj(A, K, _zeros((5, 5)))")
+    raises(ValueError, "ak_kj(A, K, _zeros((4, 5)))")
+    raises(ValueError, "ak_kj(A, K, _zeros(4))")
+
+def test_blocked_ak_kj ():
+    gen_obj = blocked_ak_kj_generator(block_size=2)
+    gen_obj.gen_update(use_cache=False)
+    src = CCodePrinter(flame_code_obj(gen_obj, "ak_kj")).code_str()
+    assert("void ak_kj(int n, int b, double* A, double* K, double* J)" in src)
+    assert("while (k < n - b)" in src)
+    assert("k += b;" in src)
+    ak_kj = c_function(gen_obj, "ak_kj")
+    # The last block is narrower when b doesn't divide n.
+    for n, b in [(6, 2), (6, 3), (7, 2), (7, 3), (8, 3)]:
+        A = _rand(n, n)
+        K = _zeros((n, n))
+        K[:, :b] = _rand(n, b)
+        J = _zeros((n, n))
+        expected = numpy.array([numpy.dot(matrix_power(A, j / b), K[:, j % b])
+                                for j in xrange(n)]).T
+        assert(ak_kj(A, K, J, b=b) is K)
+        assert(numpy.allclose(K, expected))
+
+def test_blocked ():
+    gen_obj = blocked_generator()
+    c_fun = c_function(gen_obj, "axd")
+    py_fun = NumpyPrinter(gen_obj).function()
+    for n, b in [(6, 3), (7, 3), (7, 2), (8, 3), (2, 3)]:
+        A, X, D = _rand(n, n), _rand(n, n), \
+                  _rand(n, n)
+        # Only the diagonal blocks of D are read, the last one cut at n.
+        D_blocks = _zeros((n, n))
+        for k in xrange(0, n, b):
+            D_blocks[k:k + b, k:k + b] = D[k:k + b, k:k + b]
+        Y = numpy.dot(numpy.dot(A, X), D_blocks)
+        for fun in [c_fun, py_fun]:
+            assert(numpy.allclose(fun(A, X, D, _zeros((n, n)), b=b), Y))
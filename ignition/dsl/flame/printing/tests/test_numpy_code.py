@@ -0,0 +1,64 @@
+import numpy
+from numpy.linalg import matrix_power
+
+from ignition.dsl.flame.benchmarks import ak_kj_generator, \
+                                          blocked_ak_kj_generator
+from ignition.dsl.flame.printing import get_printer, NumpyPrinter
+from ignition.dsl.flame.printing.loops import block_indices, py_name
+from ignition.dsl.flame.printing.numpy_code import numpy_expr
+from ignition.dsl.flame.tensors import Inverse, T, Tensor
+
+def test_names ():
+    assert(py_name("A_01") == "A_01")
+    assert(py_name("a^T'") == "a_T_t")
+    assert(py_name("lambda") == "lambda_")
+    assert(block_indices(1) == [":"])
+    assert(block_indices(3) == [":k", "k", "k+1:"])
+    assert(block_indices(4) == [":k", "k", "k+1", "k+2:"])
+    assert(block_indices(3, blocked=True) == [":k", "k:k+b", "k+b:"])
+
+def test_numpy_expr ():
+    A = Tensor("A", rank=2, has_inv=True)
+    p, r = Tensor("p", rank=1), Tensor("r", rank=1)
+    delta = Tensor("delta", rank=0)
+    assert(numpy_expr(r - delta * A * p) == "-(dot(delta, (dot(A, p)))) + r")
+    assert(numpy_expr(A ** 2 * p) == "dot((matrix_power(A, 2)), p)")
+    assert(numpy_expr(Inverse(A) * p) == "dot(inv(A), p)")
+    assert(numpy_expr(p * T(r)) == "outer(p, (r).T)")
+
+def test_ak_kj ():
+    gen_obj = ak_kj_generator()
+    gen_obj.gen_update(use_cache=False)
+    printer = get_printer(gen_obj, filetype="numpy")
+    assert(isinstance(printer, NumpyPrinter))
+    src = printer.render()
+    assert("def flame_algorithm(A, K, J):" in src)
+    assert("K[:, k+1] = dot(A, k_1)" in src)
+    ak_kj = printer.function()
+    A = numpy.random.rand(6, 6)
+    K = numpy.zeros((6, 6))
+    K[:, 0] = numpy.random.rand(6)
+    J = numpy.zeros((6, 6))
+    assert(ak_kj(A, K, J) is K)
+    for j in xrange(6):
+        assert(numpy.allclose(K[:, j], numpy.dot(matrix_power(A, j), K[:, 0])))
+
+def test_blocked_ak_kj ():
+    gen_obj = blocked_ak_kj_generator(block_size=2)
+    gen_obj.gen_update(use_cache=False)
+    printer = NumpyPrinter(gen_obj)
+    src = printer.render()
+    assert("def flame_algorithm(A, K, J, b=2):" in src)
+    assert("for k in xrange(0, n - b, b):" in src)
+    assert("K_2[...] = fit(dot(A, K_1), K_2.shape)" in src)
+    ak_kj = printer.function()
+    # The last block is narrower when b doesn't divide n.
+    for n, b in [(6, 2), (6, 3), (7, 2), (7, 3), (8, 3)]:
+        A = numpy.random.rand(n, n)
+        K = numpy.zeros((n, n))
+        K[:, :b] = numpy.random.rand(n, b)
+        J = numpy.zeros((n, n))
+        expected = numpy.array([numpy.dot(matrix_power(A, j / b), K[:, j % b])
+                                for j in xrange(n)]).T
+        assert(ak_kj(A, K, J, b=b) is K)
+        assert(numpy.allclose(K, expected))
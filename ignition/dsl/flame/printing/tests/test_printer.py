@@ -0,0 +1,34 @@
+import os
+import shutil
+import tempfile
+
+from ignition.dsl.flame.benchmarks import ak_kj_generator
+from ignition.dsl.flame.printing import NumpyPrinter, WorksheetPrinter
+from ignition.dsl.flame.printing import printer
+
+def test_template_lookup ():
+    old_dir = printer.TEMPLATE_MODULE_DIR
+    old_lookup = printer._template_lookup
+    old_use = printer.USE_TEMPLATE_MODULES
+    directory = tempfile.mkdtemp()
+    printer.TEMPLATE_MODULE_DIR = os.path.join(directory, "modules")
+    printer.USE_TEMPLATE_MODULES = True
+    printer._template_lookup = None
+    try:
+        lookup = printer.get_template_lookup()
+        assert(printer.get_template_lookup() is lookup)
+        gen_obj = ak_kj_generator()
+        gen_obj.gen_update(use_cache=False)
+        for cls, name in [(WorksheetPrinter, "ak_kj.txt"),
+                          (NumpyPrinter, "ak_kj.py")]:
+            filename = os.path.join(directory, name)
+            cls(gen_obj, filename).write()
+            assert(open(filename).read() == cls(gen_obj).render())
+        modules = os.listdir(printer.TEMPLATE_MODULE_DIR)
+        assert("worksheet.mako.py" in modules)
+        assert("numpy.mako.py" in modules)
+    finally:
+        printer.TEMPLATE_MODULE_DIR = old_dir
+        printer.USE_TEMPLATE_MODULES = old_use
+        printer._template_lookup = old_lookup
+        shutil.rmtree(directory)
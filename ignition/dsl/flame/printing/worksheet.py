@@ -116,8 +116,16 @@ class WorksheetPrinter (TemplatePrinter):
     def _update (self):
         if self._gen_obj.update is None:
             return "UPDATES NOT DETERMINED."
+        update = self._gen_obj.update
+        order = getattr(self._gen_obj, "update_order", None)
+        # Updates, and the temporaries they use, are computed in reverse
+        # order.
+        keys = reversed(order) if order else update.keys()
         ret_str = ""
-        for k, v in self._gen_obj.update.iteritems():
+        for k in keys:
+            v = update[k]
+            if isinstance(v, (set, frozenset)) and len(v) == 1:
+                v = list(v)[0]
             ret_str += "%s = %s\n" % (self._tensor_print(k),
                                       self._tensor_print(v))
         return ret_str
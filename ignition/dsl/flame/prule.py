@@ -3,7 +3,7 @@
 class Rule (object):
     """Abstract object for providing mappings from different atoms to objects
     in a domain language."""
-    def __new__ (cls):
+    def __new__ (cls, *args, **kws):
         obj = object.__new__(cls)
         return obj
 
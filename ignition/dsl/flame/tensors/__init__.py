@@ -10,6 +10,7 @@ from tensor_expr import (
 from tensor import (Tensor)
 from basic_operators import (NotInvertibleError, Inner, Inverse, Transpose, T)
 from simplify import simplify
+from canonical import canonical_hash, canonical_key
 from solvers import (all_back_sub, tensor_solver, solve_vec_eqn)
 from printers import (numpy_print, latex_print)
 from tensor_names import (convert_name, set_lower_ind, set_upper_ind, to_latex)
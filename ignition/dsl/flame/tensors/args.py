@@ -20,6 +20,10 @@ def iterative_arg(name, rank, *args, **kws):
     part_fun = kws.get("part_fun", None)
     repart_fun = kws.get("repart_fun", None)
     fuse_fun = kws.get("fuse_fun", None)
+    # Only the blocked rules take a block size.
+    rule_kws = {}
+    if kws.get("block_size", None) is not None:
+        rule_kws["block_size"] = kws["block_size"]
     if part_suffix is None:
         part_suffix = PART_SUFFIX_DEFAULT
         if part_fun is not None:
@@ -30,17 +34,20 @@ def iterative_arg(name, rank, *args, **kws):
             part_suffix = get_part_suffix(fuse_fun.__name__)
     if part_fun is None:
         try:
-            part_fun = getattr(iterative_prules, "Part_" + part_suffix)()
+            part_fun = getattr(iterative_prules, "Part_" + part_suffix)(
+                **rule_kws)
         except AttributeError:
             raise ValueError("Unable to find partition function for argument.")
     if repart_fun is None:
         try:
-            repart_fun = getattr(iterative_prules, "Repart_" + part_suffix)()
+            repart_fun = getattr(iterative_prules, "Repart_" + part_suffix)(
+                **rule_kws)
         except AttributeError:
             raise ValueError("Unable to find repartition function for argument.")
     if fuse_fun is None:
         try:
-            fuse_fun = getattr(iterative_prules, "Fuse_" + part_suffix)()
+            fuse_fun = getattr(iterative_prules, "Fuse_" + part_suffix)(
+                **rule_kws)
         except AttributeError:
             raise ValueError("Unable to find fuse function for argument.")
     return PObj(ten, part_fun=part_fun, repart_fun=repart_fun,
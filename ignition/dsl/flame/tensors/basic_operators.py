@@ -2,7 +2,7 @@
 
 import operator
 from numpy import matrix
-from sympy import Add, Basic, expand, Function, latex, Mul, Pow, S
+from sympy import Add, Basic, Function, latex, Mul, Pow, S
 
 from .tensor_expr import expr_rank, expr_shape, is_one, is_zero, TensorExpr
 from .tensor import Tensor
@@ -216,42 +216,8 @@ class Inner (TensorExpr, Function):
         return "%s %s" % tuple(map(latex, self.args))
 
     def _eval_expand_basic(self, deep=True, **hints):
-        arg0 = expand(self.args[0])
-        arg1 = expand(self.args[1])
-
-        arg0_adds = [arg0]
-        arg1_adds = [arg1]
-        if isinstance(arg0, Add):
-            arg0_adds = arg0.args
-        if isinstance(arg1, Add):
-            arg1_adds = arg1.args
-
-        add_exprs = []
-        for arg0 in arg0_adds:
-            for arg1 in arg1_adds:
-                add_exprs.append(Inner(arg0, arg1))
-
-        ret_add_exprs = []
-        for expr in add_exprs:
-            coeffs = []
-            arg0 = expr.args[0]
-            arg1 = expr.args[1]
-            if isinstance(arg0, Mul):
-                arg0_coeffs = filter(lambda arg: expr_rank(arg) == 0, arg0.args)
-                if len(arg0_coeffs) != 0:
-                    coeffs.extend(arg0_coeffs)
-                    arg0 = Mul(*filter(lambda arg: expr_rank(arg) != 0, arg0.args))
-            if isinstance(arg1, Mul):
-                arg1_coeffs = filter(lambda arg: expr_rank(arg) == 0, arg1.args)
-                if len(arg1_coeffs) != 0:
-                    coeffs.extend(arg1_coeffs)
-                    arg1 = Mul(*filter(lambda arg: expr_rank(arg) != 0, arg1.args))
-            if len(coeffs) == 0:
-                ret_add_exprs.append(expr)
-            else:
-                ret_add_exprs.append(Mul(*(coeffs + [Inner(arg0, arg1)])))
-
-        return Add(*ret_add_exprs)
+        from .expand import tensor_expand # cyclic
+        return tensor_expand(self)
 
 def expr_invertible(expr):
     if expr.is_Number:
@@ -0,0 +1,224 @@
+"""Canonical forms of tensor expressions for fast comparison.
+
+canonical_key maps a tensor expression to a hashable key so that
+expressions differing only in the order of commutative factors or terms,
+the nesting of Transpose and Inverse, or the side an inner product is
+written from share the same key.  Keys are interned, so equal keys are
+usually the same object, and canonical_hash gives a hash of the key that
+is stable between processes.
+
+No expansion is done, (a + b)*x and a*x + b*x have different keys.
+"""
+
+import hashlib
+from sympy import Add, Mul, Pow, Rational, S
+
+from .tensor_expr import expr_rank, register_expr_cache, TensorExpr
+from .tensor import Tensor
+from .basic_operators import Inner, Inverse, Transpose
+
+# Memoized keys of subexpressions, cleared when it grows past the limit.
+MAX_CACHE_SIZE = 100000
+_key_cache = {}
+_interned = {}
+
+@register_expr_cache
+def clear_cache ():
+    """Empties the memo and intern tables."""
+    _key_cache.clear()
+    _interned.clear()
+
+def _intern (key):
+    return _interned.setdefault(key, key)
+
+def _num_key (num):
+    if num.is_Rational:
+        return ('num', num.p, num.q)
+    return ('num', str(num))
+
+ZERO_KEY = _num_key(S(0))
+ONE_KEY = _num_key(S(1))
+
+def _coeff_rest (key):
+    """Splits a key into its numeric coefficient and the rest."""
+    if key[0] == 'num':
+        return Rational(*key[1:]) if len(key) == 3 else S(key[1]), ONE_KEY
+    if key[0] == 'mul' and key[1] != ONE_KEY:
+        return _coeff_rest(key[1])[0], _make_mul(ONE_KEY, key[2], key[3])
+    return S(1), key
+
+def _make_mul (coeff, comm, chain):
+    if coeff == ZERO_KEY:
+        return ZERO_KEY
+    if coeff == ONE_KEY and len(comm) + len(chain) == 1:
+        return (comm + chain)[0]
+    if len(comm) + len(chain) == 0:
+        return coeff
+    return _intern(('mul', coeff, comm, chain))
+
+def _is_rank_0 (expr):
+    try:
+        return expr_rank(expr) == 0
+    except Exception:
+        return False
+
+def _tensor_key (expr, trans):
+    key = _intern(('ten', expr.name))
+    # Only matrices flagged symmetric are taken for their transposes.
+    if not trans or expr.rank == 0 or getattr(expr, "symmetric", False):
+        return key
+    return _intern(('T', key))
+
+def _flatten_chain (keys):
+    """Splits nested product keys into a coefficient, commutative factors
+    and the non-commutative chain."""
+    coeff = S(1)
+    comm = []
+    chain = []
+    for key in keys:
+        c, rest = _coeff_rest(key)
+        coeff *= c
+        if rest[0] == 'mul':
+            comm.extend(rest[2])
+            chain.extend(rest[3])
+        elif rest != ONE_KEY:
+            chain.append(rest)
+    return coeff, comm, tuple(chain)
+
+def _mul_key (args, trans, rank_0):
+    coeff = S(1)
+    comm = []
+    chain = []
+    for arg in args:
+        if arg.is_Number:
+            coeff *= arg
+        elif arg.is_commutative:
+            comm.append(_key(arg, trans))
+        else:
+            chain.append(arg)
+    if trans:
+        chain.reverse()
+    c, chain_comm, chain_keys = _flatten_chain(_key(arg, trans)
+                                               for arg in chain)
+    if rank_0 and chain_keys:
+        # A scalar is its own transpose, pick the smaller way of writing it.
+        t_c, t_comm, t_keys = _flatten_chain(_key(arg, not trans)
+                                             for arg in reversed(chain))
+        if t_keys < chain_keys:
+            c, chain_comm, chain_keys = t_c, t_comm, t_keys
+    coeff *= c
+    comm_keys = chain_comm
+    for key in comm:
+        # Pull the coefficients and factors of scalar products out.
+        c, rest = _coeff_rest(key)
+        coeff *= c
+        if rest[0] == 'mul' and not rest[3]:
+            comm_keys.extend(rest[2])
+        elif rest != ONE_KEY:
+            comm_keys.append(rest)
+    return _make_mul(_num_key(coeff), tuple(sorted(comm_keys)), chain_keys)
+
+def _add_key (args, trans):
+    # Collect like terms, remembering if a lone factor is commutative.
+    terms = {}
+    for arg in args:
+        key = _key(arg, trans)
+        for sub_key in (key[1] if key[0] == 'add' else [key]):
+            coeff, rest = _coeff_rest(sub_key)
+            old_coeff, is_comm = terms.get(rest, (S(0), arg.is_commutative))
+            terms[rest] = (old_coeff + coeff, is_comm)
+    keys = []
+    for rest, (coeff, is_comm) in terms.iteritems():
+        if coeff == 0:
+            continue
+        if rest[0] == 'mul':
+            keys.append(_make_mul(_num_key(coeff), rest[2], rest[3]))
+        elif rest == ONE_KEY:
+            keys.append(_num_key(coeff))
+        elif is_comm:
+            keys.append(_make_mul(_num_key(coeff), (rest,), ()))
+        else:
+            keys.append(_make_mul(_num_key(coeff), (), (rest,)))
+    if len(keys) == 0:
+        return ZERO_KEY
+    if len(keys) == 1:
+        return keys[0]
+    return _intern(('add', tuple(sorted(keys))))
+
+def _key (expr, trans=False):
+    memo = (expr, trans)
+    if memo in _key_cache:
+        return _key_cache[memo]
+    if expr.is_Number:
+        key = _num_key(expr)
+    elif isinstance(expr, Tensor):
+        key = _tensor_key(expr, trans)
+    elif isinstance(expr, Transpose):
+        key = _key(expr.args[0], not trans)
+    elif isinstance(expr, Inverse):
+        key = _intern(('inv', _key(expr.args[0], trans)))
+    elif isinstance(expr, Inner):
+        # Same as the product T(x)*y it stands for.
+        key = _mul_key(expr.args, False, True)
+    elif isinstance(expr, Mul):
+        key = _mul_key(expr.args, trans, _is_rank_0(expr))
+    elif isinstance(expr, Add):
+        key = _add_key(expr.args, trans)
+    elif isinstance(expr, Pow):
+        key = _intern(('pow', _key(expr.args[0], trans),
+                       _key(expr.args[1])))
+    elif expr.is_Symbol:
+        key = _intern(('sym', expr.name))
+    else:
+        key = _intern((type(expr).__name__,
+                       tuple(_key(arg) for arg in expr.args)))
+        if trans and not (isinstance(expr, TensorExpr) and expr.rank == 0):
+            key = _intern(('T', key))
+    if len(_key_cache) > MAX_CACHE_SIZE:
+        clear_cache()
+    _key_cache[memo] = key
+    return key
+
+def canonical_key (expr):
+    """Returns a hashable key equal for equivalent forms of expr.
+
+    >>> from ignition.dsl.flame.tensors import T, Tensor
+    >>> x, y = Tensor('x', rank=1), Tensor('y', rank=1)
+    >>> canonical_key(T(x)*y) == canonical_key(T(y)*x)
+    True
+    """
+    return _key(S(expr))
+
+def transpose_key (expr):
+    """Returns the canonical key of the transpose of expr."""
+    return _key(S(expr), True)
+
+def canonical_hash (expr):
+    """Returns a hex digest of the canonical key of expr."""
+    return hashlib.sha1(repr(canonical_key(expr))).hexdigest()
+
+def unique_exprs (exprs):
+    """Returns exprs without the ones equivalent to an earlier expr."""
+    seen = set()
+    ret_val = []
+    for expr in exprs:
+        key = canonical_key(expr)
+        if key not in seen:
+            seen.add(key)
+            ret_val.append(expr)
+    return ret_val
+
+def sol_dict_key (sol_dict):
+    """Returns a key identifying a solution dict up to equivalent forms.
+
+    The values of sol_dict are either expressions or sets of expressions,
+    as returned by backward_sub.
+    """
+    def _val_key (val):
+        if val is None:
+            return None
+        if isinstance(val, (set, frozenset, list, tuple)):
+            return frozenset(map(canonical_key, val))
+        return canonical_key(val)
+    return frozenset((canonical_key(unk), _val_key(val))
+                     for unk, val in sol_dict.iteritems())
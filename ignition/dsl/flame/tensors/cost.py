@@ -0,0 +1,120 @@
+"""Cost model for evaluating tensor expressions.
+
+Estimates the floating point operations and memory traffic of computing an
+expression, or a whole update dictionary, once every symbolic dimension is
+set to dim.  Products are evaluated left to right, as in the generated code,
+so T(p)*A*p costs a matrix-vector product and an inner product.
+
+>>> from ignition.dsl.flame.tensors import T, Tensor
+>>> A = Tensor('A', rank=2)
+>>> p = Tensor('p', rank=1)
+>>> expr_flops(A*p, 10)
+200
+>>> expr_flops(T(p)*A*p, 10)
+220
+"""
+
+from sympy import Add, Mul, Pow, sympify
+
+from .tensor_expr import expr_shape
+from .tensor import Tensor
+from .basic_operators import Inner, Inverse, Transpose
+
+# Size used for every symbolic dimension.
+DEFAULT_DIM = 1000
+# Cost of moving one word to or from memory relative to one flop.
+MEM_WEIGHT = 1.0
+
+def _shape (expr, dim):
+    try:
+        shape = expr_shape(expr)
+    except Exception:
+        return (1, 1)
+    return tuple(int(d) if d.is_Number else dim for d in map(sympify, shape))
+
+def _size (expr, dim):
+    rows, cols = _shape(expr, dim)
+    return rows * cols
+
+def _mul_flops (args, dim):
+    flops = sum(expr_flops(arg, dim) for arg in args)
+    scalars = filter(lambda a: _size(a, dim) == 1, args)
+    chain = filter(lambda a: _size(a, dim) != 1, args)
+    rows, cols = _shape(chain[0], dim) if chain else (1, 1)
+    for arg in chain[1:]:
+        inner, cols_b = _shape(arg, dim)
+        flops += 2 * rows * inner * cols_b
+        cols = cols_b
+    # Scaling the result, a sign change is free.
+    num_scalars = len(filter(lambda a: not (a.is_Number and abs(a) == 1),
+                             scalars))
+    if num_scalars:
+        if chain:
+            flops += rows * cols
+        flops += num_scalars - 1
+    return flops
+
+def expr_flops (expr, dim=DEFAULT_DIM):
+    """Returns the number of flops needed to evaluate expr."""
+    if expr.is_Atom:
+        return 0
+    if isinstance(expr, Transpose):
+        return expr_flops(expr.args[0], dim)
+    if isinstance(expr, Inverse):
+        rows, _ = _shape(expr.args[0], dim)
+        # A scalar division or a dense factorization.
+        return expr_flops(expr.args[0], dim) + (1 if rows == 1 else rows ** 3)
+    if isinstance(expr, Inner):
+        return _mul_flops(expr.args, dim)
+    if isinstance(expr, Mul):
+        return _mul_flops(expr.args, dim)
+    if isinstance(expr, Add):
+        return sum(expr_flops(arg, dim) for arg in expr.args) + \
+               (len(expr.args) - 1) * _size(expr, dim)
+    if isinstance(expr, Pow):
+        base, exp = expr.args
+        rows, _ = _shape(base, dim)
+        flops = expr_flops(base, dim)
+        if rows == 1:
+            return flops + 1
+        if exp.is_Integer and exp > 0:
+            # Repeated matrix-matrix products.
+            return flops + (int(exp) - 1) * 2 * rows ** 3
+        return flops + rows ** 3
+    return sum(expr_flops(arg, dim) for arg in expr.args)
+
+def expr_reads (expr, dim=DEFAULT_DIM):
+    """Returns the number of words read to evaluate expr, each tensor being
+    read once."""
+    return sum(_size(atom, dim) for atom in expr.atoms(Tensor))
+
+def expr_cost (expr, dim=DEFAULT_DIM, mem_weight=MEM_WEIGHT):
+    """Returns the flops plus the weighted memory reads of expr."""
+    return expr_flops(expr, dim) + mem_weight * expr_reads(expr, dim)
+
+def update_cost (sol_dict, dim=DEFAULT_DIM, mem_weight=MEM_WEIGHT):
+    """Returns the cost of one iteration computing the updates in sol_dict.
+
+    Values may be expressions or sets of alternative expressions as
+    returned by backward_sub, the cheapest alternative is counted.  Unsolved
+    entries (None or empty sets) are skipped, so the cost of a partial
+    solution never exceeds the cost of completing it.
+    """
+    cost = 0
+    for unk, val in sol_dict.iteritems():
+        if isinstance(val, (set, frozenset, list, tuple)):
+            if len(val) == 0:
+                continue
+            cost += min(expr_cost(v, dim, mem_weight) for v in val)
+        elif val is not None:
+            cost += expr_cost(val, dim, mem_weight)
+        else:
+            continue
+        # Writing the updated unknown.
+        cost += mem_weight * _size(unk, dim)
+    return cost
+
+def sol_cost (sol_tup):
+    """Cost of a (sol_dict, order) solution with the default parameters,
+    the default ranking of all_back_sub."""
+    return update_cost(sol_tup[0])
@@ -0,0 +1,222 @@
+"""Common subexpression elimination for tensor expressions.
+
+Subexpressions used more than once are computed into temporary tensors.
+Only contiguous pieces of a product are shared, so the order of
+non-commutative factors is kept, and a piece matching the transpose of a
+temporary, like T(p)*A for A*p with A flagged symmetric, uses the
+transposed temporary.  Pieces cheaper than min_flops, such as products of
+scalars, are left in place, and so are matrix valued pieces since a
+temporary would not know whether it is symmetric.
+
+>>> from ignition.dsl.flame.tensors import T, Tensor
+>>> A = Tensor('A', rank=2, symmetric=True)
+>>> p, r = Tensor('p', rank=1), Tensor('r', rank=1)
+>>> delta = Tensor('delta', rank=0)
+>>> tensor_cse([r - delta*A*p, T(p)*A*p], min_flops=10, dim=10)
+([(tmp_0, A*p)], [-delta*tmp_0 + r, (tmp_0^t*p)])
+"""
+
+from sympy import Mul, S
+
+from .basic_operators import T
+from .canonical import canonical_key, transpose_key
+from .cost import DEFAULT_DIM, expr_cost, expr_flops
+from .tensor import Tensor
+from .tensor_expr import expr_rank, expr_shape
+
+# Name of the temporaries, numbered from 0.
+TMP_PREFIX = "tmp"
+
+def _split_mul (expr):
+    """Returns the commutative factors and the chain of a product."""
+    comm = filter(lambda a: a.is_commutative, expr.args)
+    chain = filter(lambda a: not a.is_commutative, expr.args)
+    return comm, chain
+
+def _subexprs (expr):
+    """Yields the subexpressions of expr that could be shared, including
+    the contiguous pieces of non-commutative products."""
+    if expr.is_Atom:
+        return
+    yield expr
+    if isinstance(expr, Mul):
+        comm, chain = _split_mul(expr)
+        if len(comm) > 1 and chain:
+            yield Mul(*comm)
+        for i in xrange(len(chain) - 1):
+            for j in xrange(i + 2, len(chain) + 1):
+                if len(comm) == 0 and j - i == len(chain):
+                    continue
+                yield Mul(*chain[i:j])
+    for arg in expr.args:
+        for sub in _subexprs(arg):
+            yield sub
+
+def _is_row (expr):
+    return expr_rank(expr) == 1 and expr_shape(expr)[0] == 1
+
+def _count (exprs, min_flops, dim):
+    """Returns {key: [count, flops, subexpr]} of the candidates in exprs.
+
+    A subexpression and its transpose are counted together, the column
+    vector form is kept if seen.
+    """
+    counts = {}
+    for expr in exprs:
+        for sub in _subexprs(expr):
+            key = min(canonical_key(sub), transpose_key(sub))
+            if key not in counts:
+                flops = expr_flops(sub, dim)
+                if flops < min_flops:
+                    continue
+                try:
+                    if expr_rank(sub) > 1:
+                        continue
+                except Exception:
+                    continue
+                counts[key] = [0, flops, sub]
+            elif _is_row(counts[key][2]) and not _is_row(sub):
+                counts[key][2] = sub
+            counts[key][0] += 1
+    return counts
+
+def _replace (expr, key, tmp):
+    """Returns expr with the subexpressions with the given key replaced by
+    tmp, and their transposes by T(tmp)."""
+    if canonical_key(expr) == key:
+        return tmp
+    if transpose_key(expr) == key:
+        return T(tmp)
+    if expr.is_Atom:
+        return expr
+    args = [_replace(arg, key, tmp) for arg in expr.args]
+    if isinstance(expr, Mul):
+        comm, chain = _split_mul(Mul(*args))
+        if len(comm) > 1 and chain and canonical_key(Mul(*comm)) == key:
+            comm = [tmp]
+        new_chain = []
+        i = 0
+        while i < len(chain):
+            # Longest match first.
+            for j in xrange(len(chain), i + 1, -1):
+                piece = Mul(*chain[i:j])
+                if canonical_key(piece) == key:
+                    new_chain.append(tmp)
+                elif transpose_key(piece) == key:
+                    new_chain.append(T(tmp))
+                else:
+                    continue
+                i = j
+                break
+            else:
+                new_chain.append(chain[i])
+                i += 1
+        return Mul(*(list(comm) + new_chain))
+    if args == list(expr.args):
+        return expr
+    return expr.func(*args)
+
+def _new_tmp (sub, names, prefix):
+    n = 0
+    while "%s_%d" % (prefix, n) in names:
+        n += 1
+    name = "%s_%d" % (prefix, n)
+    names.add(name)
+    rank = expr_rank(sub)
+    try:
+        shape = expr_shape(sub)
+    except Exception:
+        shape = None
+    return Tensor(name, rank=rank, shape=shape)
+
+def tensor_cse (exprs, min_flops=DEFAULT_DIM, dim=DEFAULT_DIM,
+                prefix=TMP_PREFIX, names=None):
+    """Eliminates the common subexpressions of exprs.
+
+    Returns (temps, new_exprs) where temps is a list of (tmp, expr) pairs
+    and new_exprs are exprs written with the temporaries.  The pieces
+    saving the most flops, as estimated with dimension dim, are shared
+    first.  Temporaries may use other temporaries and are not ordered, see
+    update_cse.  names are the tensor names to avoid for temporaries.
+    """
+    exprs = map(S, exprs)
+    if names is None:
+        names = set()
+    names = set(names)
+    for expr in exprs:
+        names.update(a.name for a in expr.atoms(Tensor))
+    temps = []
+    while True:
+        counts = _count(exprs + [e for _, e in temps], min_flops, dim)
+        shared = [((cnt - 1) * flops, key, sub)
+                  for key, (cnt, flops, sub) in counts.iteritems() if cnt > 1]
+        if not shared:
+            break
+        _, _, sub = max(shared)
+        key = canonical_key(sub)
+        tmp = _new_tmp(sub, names, prefix)
+        exprs = [_replace(e, key, tmp) for e in exprs]
+        temps = [(t, _replace(e, key, tmp)) for t, e in temps]
+        temps.append((tmp, sub))
+    return temps, exprs
+
+def update_cse (sol_dict, order, **kws):
+    """Eliminates the common subexpressions of an update dictionary.
+
+    sol_dict and order are as returned by backward_sub, the updates being
+    computed in the reverse of order.  Where a value is a set of
+    alternatives the cheapest one is kept.  Returns (new_dict, new_order,
+    temps) where the temporaries are added to new_dict and new_order right
+    before their first use.  A temporary holding the whole update of an
+    unknown is replaced by that unknown, which is then computed at the
+    first use.  The keywords go to tensor_cse.
+    """
+    dim = kws.get('dim', DEFAULT_DIM)
+    def _pick (val):
+        if isinstance(val, (set, frozenset, list, tuple)):
+            if len(val) == 0:
+                return None
+            return min(val, key=lambda v: (expr_cost(v, dim), str(v)))
+        return val
+    as_sets = any(isinstance(v, (set, frozenset)) for v in sol_dict.values())
+    eval_order = list(reversed(order))
+    unks = filter(lambda u: _pick(sol_dict[u]) is not None, eval_order)
+    names = set(u.name for u in sol_dict.keys() if isinstance(u, Tensor))
+    kws.setdefault('names', names)
+    temps, new_exprs = tensor_cse([_pick(sol_dict[u]) for u in unks], **kws)
+    new_exprs = dict(zip(unks, new_exprs))
+    for unk in unks:
+        tmp = new_exprs[unk]
+        tmp_exprs = dict(temps)
+        if tmp not in tmp_exprs:
+            continue
+        key = canonical_key(tmp)
+        new_exprs[unk] = tmp_exprs[tmp]
+        temps = [(t, _replace(e, key, unk)) for t, e in temps if t != tmp]
+        new_exprs = dict((u, _replace(e, key, unk))
+                         for u, e in new_exprs.iteritems())
+    # Order everything after what it uses, keeping the order of the updates
+    # where possible.
+    defs = dict(temps)
+    defs.update(new_exprs)
+    new_eval = []
+    added = set()
+    def _add (obj):
+        if obj in added:
+            return
+        added.add(obj)
+        if obj in defs:
+            for atom in sorted(defs[obj].atoms(Tensor), key=str):
+                if atom in defs:
+                    _add(atom)
+        new_eval.append(obj)
+    for unk in eval_order:
+        _add(unk)
+    new_dict = dict(sol_dict)
+    new_dict.update(new_exprs)
+    new_dict.update(temps)
+    if as_sets:
+        for k, v in new_dict.iteritems():
+            if v is not None and not isinstance(v, (set, frozenset)):
+                new_dict[k] = set([v])
+    return new_dict, list(reversed(new_eval)), temps
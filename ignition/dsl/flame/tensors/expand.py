@@ -0,0 +1,139 @@
+"""Distributive expansion of tensor expressions.
+
+tensor_expand multiplies out the sums in an expression, keeping the order
+of the non-commutative factors of products, and writes the result as a
+flat sum of products.  Rank 0 factors are moved to the front of each
+product as its coefficient, also out of inner products and transposes.
+Unlike sympy's expand, which walks the expression once per hint and
+expands the arguments of a node again for each of them, every node is
+expanded once and the expanded forms are remembered, so expanding an
+expression that is already expanded, or that contains expanded pieces,
+only costs a lookup.
+
+>>> from ignition.dsl.flame.tensors import T, Tensor
+>>> A = Tensor('A', rank=2)
+>>> p, r = Tensor('p', rank=1), Tensor('r', rank=1)
+>>> delta = Tensor('delta', rank=0)
+>>> tensor_expand(A*(r - delta*p))
+-delta*A*p + A*r
+>>> tensor_expand(T(r)*(r + delta*p))
+delta*(r^t*p) + (r^t*r)
+"""
+
+import itertools
+import operator
+
+from sympy import Add, Integer, Mul, Pow, S
+
+from .tensor_expr import expr_rank, register_expr_cache
+from .basic_operators import expr_invertible, Inner, Inverse, Transpose
+from ....utils.instrument import count, profiled
+
+# Expanded forms remembered, cleared when it grows past the limit.
+MAX_CACHE_SIZE = 100000
+
+_expanded = {}
+
+@register_expr_cache
+def clear_expand_cache ():
+    _expanded.clear()
+
+def is_expanded (expr):
+    """Returns True if expr is known to be in expanded form."""
+    return expr.is_Atom or _expanded.get(expr) == expr
+
+def _terms (expr):
+    return Add.make_args(expr)
+
+def _split_scalars (expr):
+    """Returns the rank 0 factors of the product expr and the product of
+    the others."""
+    if not isinstance(expr, Mul):
+        if expr_rank(expr) == 0:
+            return [expr], S(1)
+        return [], expr
+    coeffs = [arg for arg in expr.args if expr_rank(arg) == 0]
+    if not coeffs:
+        return [], expr
+    return coeffs, Mul(*[arg for arg in expr.args if expr_rank(arg) != 0])
+
+def _expand_mul (factors):
+    """Returns the expanded product of the expanded factors."""
+    sums = [_terms(factor) for factor in factors]
+    if all(len(terms) == 1 for terms in sums):
+        return Mul(*factors)
+    return Add(*[Mul(*prod) for prod in itertools.product(*sums)])
+
+def _expand_pow (base, exp):
+    if exp.is_Integer and exp > 1 and isinstance(base, Add):
+        return _expand_mul([base] * int(exp))
+    if exp.is_Integer and exp < -1 and isinstance(base, Add):
+        return Pow(_expand_pow(base, -exp), S(-1))
+    if exp.is_integer and isinstance(base, Mul) and base.is_commutative:
+        return _expand_mul([_expand(Pow(arg, exp)) for arg in base.args])
+    return Pow(base, exp)
+
+def _expand_inner (arg0, arg1):
+    ret_terms = []
+    for term0 in _terms(arg0):
+        coeffs0, vec0 = _split_scalars(term0)
+        for term1 in _terms(arg1):
+            coeffs1, vec1 = _split_scalars(term1)
+            ret_terms.append(Mul(*(coeffs0 + coeffs1 + [Inner(vec0, vec1)])))
+    return Add(*ret_terms)
+
+def _expand_transpose (arg):
+    if isinstance(arg, Add):
+        return Add(*[_expand(Transpose(term)) for term in arg.args])
+    if isinstance(arg, Mul):
+        coeffs, rest = _split_scalars(arg)
+        if isinstance(rest, Mul):
+            rest = Mul(*map(Transpose, reversed(rest.args)))
+        else:
+            rest = Transpose(rest)
+        return Mul(*(coeffs + [rest]))
+    return Transpose(arg)
+
+def _expand_inverse (arg):
+    if isinstance(arg, Mul) and all(map(expr_invertible, arg.args)):
+        return reduce(operator.mul, map(Inverse, reversed(arg.args)))
+    return Inverse(arg)
+
+def _expand (expr):
+    if expr.is_Atom:
+        return expr
+    ret_val = _expanded.get(expr)
+    if ret_val is not None:
+        count("tensor_expand.cache_hits")
+        return ret_val
+    args = [_expand(arg) for arg in expr.args]
+    if isinstance(expr, Add):
+        ret_val = Add(*args)
+    elif isinstance(expr, Mul):
+        ret_val = _expand_mul(args)
+    elif isinstance(expr, Pow):
+        ret_val = _expand_pow(*args)
+    elif isinstance(expr, Inner):
+        ret_val = _expand_inner(*args)
+    elif isinstance(expr, Transpose):
+        ret_val = _expand_transpose(args[0])
+    elif isinstance(expr, Inverse):
+        ret_val = _expand_inverse(args[0])
+    elif args != list(expr.args):
+        ret_val = expr.func(*args)
+    else:
+        ret_val = expr
+    if len(_expanded) >= MAX_CACHE_SIZE:
+        _expanded.clear()
+    _expanded[expr] = ret_val
+    _expanded[ret_val] = ret_val
+    return ret_val
+
+@profiled()
+def tensor_expand (expr):
+    """Returns expr with its products distributed over its sums.
+
+    The result is a sum of products whose rank 0 factors come first, see
+    the module documentation.
+    """
+    return _expand(S(expr))
@@ -3,7 +3,7 @@
 from numpy import matrix
 
 from basic_operators import T
-from constants import one, ZERO, Zero, zero
+from constants import I, one, ZERO, Zero, zero
 from prules import TensorPartRule, TensorRepartFuseRule
 
 
@@ -494,3 +494,247 @@ class Fuse_H_3x3 (TensorRepartFuseRule):
         ret[h_bm] = matrix([[h_bm.update(l_ind="32")]])
         ret[H_br] = matrix([[H_br.update(l_ind="33")]])
         return ret
+
+# Blocked rules, whose middle parts are blocks of block_size rows or
+# columns, so the middle parts keep the rank of the operand and the updates
+# are matrix-matrix products.
+
+DEFAULT_BLOCK_SIZE = 32
+
+class BlockedRule (object):
+    """Mixin of the blocked rules, which move the partition by block_size
+    entries a step instead of one."""
+    block_size = DEFAULT_BLOCK_SIZE
+
+    def __init__ (self, block_size=None):
+        if block_size is not None:
+            self.block_size = block_size
+
+class Part_Blocked_1x3 (BlockedRule, TensorPartRule):
+    shape = (1, 3)
+    _latex_head = "\FLAOneByThree"
+    def __call__ (self, M):
+        return [M.update(l_ind="L"), M.update(l_ind="M"), M.update(l_ind="R")]
+
+class Repart_Blocked_1x3 (BlockedRule, TensorRepartFuseRule):
+    shape = (1, 3)
+    reshape = (1, 4)
+    _latex_head = "\FLAOneByFour"
+    def __call__ (self, M):
+        ret = {}
+        [M_l, M_m, M_r] = M
+        ret[M_l] = matrix([[M_l.update(l_ind="0")]])
+        ret[M_m] = matrix([[M_m.update(l_ind="1")]])
+        ret[M_r] = matrix([[M_r.update(l_ind="2"), M_r.update(l_ind="3")]])
+        return ret
+
+class Fuse_Blocked_1x3 (BlockedRule, TensorRepartFuseRule):
+    shape = (1, 3)
+    reshape = (1, 4)
+    _latex_head = "\FLAOneByFour"
+    def __call__ (self, M):
+        ret = {}
+        [M_l, M_m, M_r] = M
+        ret[M_l] = matrix([M_l.update(l_ind="0"), M_m.update(l_ind="1")])
+        ret[M_m] = matrix([M_r.update(l_ind="2")])
+        ret[M_r] = matrix([M_r.update(l_ind="3")])
+        return ret
+
+class Part_Blocked_3x3 (BlockedRule, TensorPartRule):
+    shape = (3, 3)
+    _latex_head = "\FLAThreeByThree"
+    def __call__(self, M):
+        return \
+          [[M.update(l_ind="tl"), M.update(l_ind="tm"), M.update(l_ind="tr")],
+           [M.update(l_ind="ml"), M.update(l_ind="mm"), M.update(l_ind="mr")],
+           [M.update(l_ind="bl"), M.update(l_ind="bm"), M.update(l_ind="br")]]
+
+class Repart_Blocked_3x3 (BlockedRule, TensorRepartFuseRule):
+    shape = (3, 3)
+    reshape = (4, 4)
+    _latex_head = "\FLAFourByFour"
+    def __call__(self, M):
+        ret = {}
+        [[M_tl, M_tm, M_tr],
+         [M_ml, M_mm, M_mr],
+         [M_bl, M_bm, M_br]] = M
+
+        ret[M_tl] = matrix([[M_tl.update(l_ind="00")]])
+        ret[M_tm] = matrix([[M_tm.update(l_ind="01")]])
+        ret[M_tr] = matrix([[M_tr.update(l_ind="02"), M_tr.update(l_ind="03")]])
+
+        ret[M_ml] = matrix([[M_ml.update(l_ind="10")]])
+        ret[M_mm] = matrix([[M_mm.update(l_ind="11")]])
+        ret[M_mr] = matrix([[M_mr.update(l_ind="12"), M_mr.update(l_ind="13")]])
+
+        ret[M_bl] = matrix([[M_bl.update(l_ind="20")],
+                            [M_bl.update(l_ind="30")]])
+        ret[M_bm] = matrix([[M_bm.update(l_ind="21")],
+                            [M_bm.update(l_ind="31")]])
+        ret[M_br] = matrix([[M_br.update(l_ind="22"), M_br.update(l_ind="23")],
+                            [M_br.update(l_ind="32"), M_br.update(l_ind="33")]])
+        return ret
+
+class Fuse_Blocked_3x3 (BlockedRule, TensorRepartFuseRule):
+    shape = (3, 3)
+    reshape = (4, 4)
+    _latex_head = "\FLAFourByFour"
+    def __call__(self, M):
+        ret = {}
+        [[M_tl, M_tm, M_tr],
+         [M_ml, M_mm, M_mr],
+         [M_bl, M_bm, M_br]] = M
+
+        ret[M_tl] = matrix([[M_tl.update(l_ind="00"), M_tm.update(l_ind="01")],
+                            [M_ml.update(l_ind="10"), M_mm.update(l_ind="11")]])
+        ret[M_tm] = matrix([[M_tr.update(l_ind="02")],
+                            [M_mr.update(l_ind="12")]])
+        ret[M_tr] = matrix([[M_tr.update(l_ind="03")],
+                            [M_mr.update(l_ind="13")]])
+
+        ret[M_ml] = matrix([[M_bl.update(l_ind="20"), M_bm.update(l_ind="21")]])
+        ret[M_mm] = matrix([[M_br.update(l_ind="22")]])
+        ret[M_mr] = matrix([[M_br.update(l_ind="23")]])
+
+        ret[M_bl] = matrix([[M_bl.update(l_ind="30"), M_bm.update(l_ind="31")]])
+        ret[M_bm] = matrix([[M_br.update(l_ind="32")]])
+        ret[M_br] = matrix([[M_br.update(l_ind="33")]])
+        return ret
+
+class Part_Blocked_Upper_3x3 (BlockedRule, TensorPartRule):
+    """Partition rule for a block upper triangular matrix, whose diagonal
+    blocks are blocks of the matrix itself."""
+    shape = (3, 3)
+    _latex_head = "\FLAThreeByThree"
+    def __call__(self, U):
+        return \
+          [[U.update(l_ind="tl"), U.update(l_ind="tm"), U.update(l_ind="tr")],
+           [ZERO, U.update(l_ind="mm"), U.update(l_ind="mr")],
+           [ZERO, ZERO, U.update(l_ind="br")]]
+
+class Repart_Blocked_Upper_3x3 (BlockedRule, TensorRepartFuseRule):
+    shape = (3, 3)
+    reshape = (4, 4)
+    _latex_head = "\FLAFourByFour"
+    def __call__(self, U):
+        ret = {}
+        [[U_tl, U_tm, U_tr],
+         [_, U_mm, U_mr],
+         [_, _, U_br]] = U
+
+        ret[U_tl] = matrix([[U_tl.update(l_ind="00")]])
+        ret[U_tm] = matrix([[U_tm.update(l_ind="01")]])
+        ret[U_tr] = matrix([[U_tr.update(l_ind="02"), U_tr.update(l_ind="03")]])
+
+        ret[U_mm] = matrix([[U_mm.update(l_ind="11")]])
+        ret[U_mr] = matrix([[U_mr.update(l_ind="12"), U_mr.update(l_ind="13")]])
+
+        ret[U_br] = matrix([[U_br.update(l_ind="22"), U_br.update(l_ind="23")],
+                            [ZERO, U_br.update(l_ind="33")]])
+        return ret
+
+class Fuse_Blocked_Upper_3x3 (BlockedRule, TensorRepartFuseRule):
+    shape = (3, 3)
+    reshape = (4, 4)
+    _latex_head = "\FLAFourByFour"
+    def __call__(self, U):
+        ret = {}
+        [[U_tl, U_tm, U_tr],
+         [_, U_mm, U_mr],
+         [_, _, U_br]] = U
+
+        ret[U_tl] = matrix([[U_tl.update(l_ind="00"), U_tm.update(l_ind="01")],
+                            [ZERO, U_mm.update(l_ind="11")]])
+        ret[U_tm] = matrix([[U_tr.update(l_ind="02")],
+                            [U_mr.update(l_ind="12")]])
+        ret[U_tr] = matrix([[U_tr.update(l_ind="03")],
+                            [U_mr.update(l_ind="13")]])
+
+        ret[U_mm] = matrix([[U_br.update(l_ind="22")]])
+        ret[U_mr] = matrix([[U_br.update(l_ind="23")]])
+
+        ret[U_br] = matrix([[U_br.update(l_ind="33")]])
+        return ret
+
+class Part_Blocked_Diag_3x3 (BlockedRule, TensorPartRule):
+    shape = (3, 3)
+    _latex_head = "\FLAThreeByThree"
+    def __call__(self, D):
+        return \
+          [[D.update(l_ind="tl"), ZERO, ZERO],
+           [ZERO, D.update(l_ind="mm"), ZERO],
+           [ZERO, ZERO, D.update(l_ind="br")]]
+
+class Repart_Blocked_Diag_3x3 (BlockedRule, TensorRepartFuseRule):
+    shape = (3, 3)
+    reshape = (4, 4)
+    _latex_head = "\FLAFourByFour"
+    def __call__(self, D):
+        ret = {}
+        [[D_tl, _, _],
+         [_, D_mm, _],
+         [_, _, D_br]] = D
+        ret[D_tl] = matrix([[D_tl.update(l_ind="00")]])
+        ret[D_mm] = matrix([[D_mm.update(l_ind="11")]])
+        ret[D_br] = matrix([[D_br.update(l_ind="22"), ZERO],
+                            [ZERO, D_br.update(l_ind="33")]])
+        return ret
+
+class Fuse_Blocked_Diag_3x3 (BlockedRule, TensorRepartFuseRule):
+    shape = (3, 3)
+    reshape = (4, 4)
+    _latex_head = "\FLAFourByFour"
+    def __call__(self, D):
+        ret = {}
+        [[D_tl, _, _],
+         [_, D_mm, _],
+         [_, _, D_br]] = D
+        ret[D_tl] = matrix([[D_tl.update(l_ind="00"), ZERO],
+                            [ZERO, D_mm.update(l_ind="11")]])
+        ret[D_mm] = matrix([[D_br.update(l_ind="22")]])
+        ret[D_br] = matrix([[D_br.update(l_ind="33")]])
+        return ret
+
+class Part_Blocked_J_3x3 (BlockedRule, TensorPartRule):
+    """Partition rule for the block upper Hessenberg matrix of a block
+    Krylov recurrence, whose subdiagonal blocks are the identity."""
+    shape = (3, 3)
+    _latex_head = "\FLAThreeByThree"
+    def __call__(self, J):
+        return \
+          [[J.update(l_ind="tl"), ZERO, ZERO],
+           [J.update(l_ind="ml"), ZERO, ZERO],
+           [ZERO, J.update(l_ind="bm"), J.update(l_ind="br")]]
+
+class Repart_Blocked_J_3x3 (BlockedRule, TensorRepartFuseRule):
+    shape = (3, 3)
+    reshape = (4, 4)
+    _latex_head = "\FLAFourByFour"
+    def __call__(self, J):
+        ret = {}
+        [[J_tl, _, _],
+         [J_ml, _, _],
+         [_, J_bm, J_br]] = J
+        ret[J_tl] = matrix([[J_tl.update(l_ind="00")]])
+        ret[J_ml] = matrix([[J_ml.update(l_ind="10")]])
+        ret[J_bm] = matrix([[I],
+                            [ZERO]])
+        ret[J_br] = matrix([[ZERO, ZERO],
+                            [J_bm.update(l_ind="32"), J_br.update(l_ind="33")]])
+        return ret
+
+class Fuse_Blocked_J_3x3 (BlockedRule, TensorRepartFuseRule):
+    shape = (3, 3)
+    reshape = (4, 4)
+    _latex_head = "\FLAFourByFour"
+    def __call__(self, J):
+        ret = {}
+        [[J_tl, _, _],
+         [J_ml, _, _],
+         [_, J_bm, J_br]] = J
+        ret[J_tl] = matrix([[J_tl.update(l_ind="00"), ZERO],
+                            [J_ml.update(l_ind="10"), ZERO]])
+        ret[J_ml] = matrix([[ZERO, I]])
+        ret[J_bm] = matrix([[J_bm.update(l_ind="32")]])
+        ret[J_br] = matrix([[J_br.update(l_ind="33")]])
+        return ret
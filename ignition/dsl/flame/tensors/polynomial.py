@@ -0,0 +1,290 @@
+"""Sparse polynomial form of tensor equations.
+
+A TensorPoly is an expanded tensor expression stored as a map from words,
+the tuples of non-commutative factors of its terms in order, to their
+scalar coefficients.  Substituting a polynomial for an atom only rebuilds
+the terms containing it, and constraints are eliminated by looking their
+factors up in the words and coefficients, instead of rebuilding and
+simplifying the whole expression tree.  Polynomials are immutable and
+convert to and from tensor expressions with from_expr and as_expr.
+
+>>> from ignition.dsl.flame.tensors import T, Tensor
+>>> A = Tensor('A', rank=2)
+>>> p, q, r = map(lambda x: Tensor(x, rank=1), 'pqr')
+>>> delta = Tensor('delta', rank=0)
+>>> poly = TensorPoly.from_expr(r - delta*A*p)
+>>> sorted(poly.terms.items())
+[((A, p), -delta), ((r,), 1)]
+>>> poly.subs(p, q + delta*r)
+-delta**2*A*r - delta*A*q + r
+>>> TensorPoly.from_expr(delta*(T(r)*q)*p + r).eliminate([T(r)*q])
+r
+"""
+
+from sympy import Add, Mul, Pow, S
+
+from .tensor_expr import is_one, is_zero
+from .tensor import Tensor
+from .expand import tensor_expand
+from .rewrite import _cancels, rewrite
+from ....utils.instrument import count, profiled
+
+def _normal (expr):
+    return rewrite(tensor_expand(expr))
+
+def _factors (expr):
+    """Returns the commutative factors and the word of a product."""
+    comm = []
+    word = []
+    for arg in Mul.make_args(expr):
+        if arg.is_commutative:
+            comm.append(arg)
+        elif isinstance(arg, Pow) and arg.exp.is_Integer and arg.exp > 0:
+            word.extend([arg.base] * int(arg.exp))
+        else:
+            word.append(arg)
+    return comm, tuple(word)
+
+def _mul_words (word0, word1):
+    """Returns the word of the product of two words, cancelling the
+    inverses meeting in the middle, or None if it is zero."""
+    word = list(word0)
+    for arg in word1:
+        if word and _cancels(word[-1], arg):
+            word.pop()
+        else:
+            word.append(arg)
+    if any(is_zero(arg) for arg in word):
+        return None
+    new_word = [arg for arg in word if not is_one(arg)]
+    if not new_word and word:
+        new_word = [Tensor('1', 2)]
+    return tuple(new_word)
+
+# Atoms of the coefficients and factors, cleared when it grows past the
+# limit.
+MAX_CACHE_SIZE = 100000
+
+_atoms_cache = {}
+
+def _atoms (expr):
+    ret_val = _atoms_cache.get(expr)
+    if ret_val is None:
+        if len(_atoms_cache) >= MAX_CACHE_SIZE:
+            _atoms_cache.clear()
+        ret_val = frozenset(expr.atoms())
+        _atoms_cache[expr] = ret_val
+    return ret_val
+
+def _add_term (terms, word, coeff):
+    old_coeff = terms.get(word)
+    if old_coeff is not None:
+        coeff = old_coeff + coeff
+    if coeff == S(0) or is_zero(coeff):
+        terms.pop(word, None)
+    else:
+        terms[word] = coeff
+
+def _mul_coeffs (coeff0, coeff1):
+    if coeff0 == S(1):
+        return coeff1
+    if coeff1 == S(1):
+        return coeff0
+    return _normal(coeff0 * coeff1)
+
+def _contains (word, piece):
+    size = len(piece)
+    for i in xrange(len(word) - size + 1):
+        if word[i:i + size] == piece:
+            return True
+    return False
+
+class TensorPoly (object):
+    """A tensor expression as {word: coefficient}.
+
+    The coefficients are expanded scalar expressions, and the products of
+    the factors of the words are what rewrite leaves of them.  A polynomial
+    passes for an expression where the solvers need one: it has atoms, it
+    can be tested for containing an atom, compared to an expression, and
+    sympified to its expression.
+    """
+
+    __slots__ = ("terms", "_hash", "_expr", "_atoms")
+
+    def __init__ (self, terms=None):
+        self.terms = dict(terms or {})
+        self._hash = None
+        self._expr = None
+        self._atoms = None
+
+    @classmethod
+    def from_expr (cls, expr):
+        """Returns the polynomial of the expanded and rewritten expr."""
+        terms = {}
+        for term in Add.make_args(_normal(S(expr))):
+            comm, word = _factors(term)
+            _add_term(terms, word, Mul(*comm))
+        return cls(terms)
+
+    @profiled("poly.as_expr")
+    def as_expr (self):
+        """Returns the polynomial as a tensor expression."""
+        if self._expr is None:
+            self._expr = Add(*[Mul(*((mono,) + word))
+                               for word, coeff in self.terms.iteritems()
+                               for mono in Add.make_args(coeff)])
+        return self._expr
+
+    _sympy_ = as_expr
+
+    def atoms (self, *types):
+        if types:
+            return self.as_expr().atoms(*types)
+        if self._atoms is None:
+            atoms = set()
+            for word, coeff in self.terms.iteritems():
+                if coeff != S(1) or not word:
+                    atoms.update(_atoms(coeff))
+                for arg in word:
+                    atoms.update(_atoms(arg))
+            self._atoms = atoms
+        return set(self._atoms)
+
+    def __contains__ (self, atom):
+        if self._atoms is None:
+            self.atoms()
+        return atom in self._atoms
+
+    def __len__ (self):
+        return len(self.terms)
+
+    def __hash__ (self):
+        # The hash of the expression, so sets of equations iterate in the
+        # same order either way.
+        if self._hash is None:
+            self._hash = hash(self.as_expr())
+        return self._hash
+
+    def __eq__ (self, other):
+        if isinstance(other, TensorPoly):
+            return self.terms == other.terms
+        if other == S(0):
+            return len(self.terms) == 0
+        return self.as_expr() == other
+
+    def __ne__ (self, other):
+        return not self == other
+
+    def __str__ (self):
+        return str(self.as_expr())
+
+    __repr__ = __str__
+
+    def __add__ (self, other):
+        if not isinstance(other, TensorPoly):
+            other = TensorPoly.from_expr(other)
+        terms = dict(self.terms)
+        for word, coeff in other.terms.iteritems():
+            _add_term(terms, word, coeff)
+        return TensorPoly(terms)
+
+    def __neg__ (self):
+        return TensorPoly((word, -coeff)
+                          for word, coeff in self.terms.iteritems())
+
+    def __sub__ (self, other):
+        if not isinstance(other, TensorPoly):
+            other = TensorPoly.from_expr(other)
+        return self + (-other)
+
+    def __mul__ (self, other):
+        if not isinstance(other, TensorPoly):
+            other = TensorPoly.from_expr(other)
+        terms = {}
+        for word0, coeff0 in self.terms.iteritems():
+            for word1, coeff1 in other.terms.iteritems():
+                word = _mul_words(word0, word1)
+                if word is None:
+                    continue
+                _add_term(terms, word, _mul_coeffs(coeff0, coeff1))
+        return TensorPoly(terms)
+
+    @profiled("poly.subs")
+    def subs (self, old, new):
+        """Returns the polynomial with the atom old replaced by new, a
+        polynomial or an expression.
+
+        Only the terms containing old are rebuilt, from the polynomials of
+        their factors.
+        """
+        if old not in self:
+            return self
+        new = new.as_expr() if isinstance(new, TensorPoly) else S(new)
+        factor_polys = {}
+        def _factor_poly (factor):
+            poly = factor_polys.get(factor)
+            if poly is None:
+                poly = TensorPoly.from_expr(factor.subs(old, new))
+                factor_polys[factor] = poly
+            return poly
+        terms = {}
+        for word, coeff in self.terms.iteritems():
+            in_coeff = old in _atoms(coeff)
+            if not in_coeff and not any(old in _atoms(arg) for arg in word):
+                _add_term(terms, word, coeff)
+                continue
+            count("poly.subs.terms")
+            if in_coeff:
+                poly = _factor_poly(coeff)
+            else:
+                poly = TensorPoly({(): coeff})
+            for arg in word:
+                if old in _atoms(arg):
+                    poly = poly * _factor_poly(arg)
+                else:
+                    poly = poly * TensorPoly({(arg,): S(1)})
+            for new_word, new_coeff in poly.terms.iteritems():
+                _add_term(terms, new_word, new_coeff)
+        return TensorPoly(terms)
+
+    @profiled("poly.eliminate")
+    def eliminate (self, constraints):
+        """Returns the polynomial with the expressions in constraints taken
+        as zero.
+
+        A product constraint zeroes the terms whose word holds its word and
+        whose coefficient has its scalar factors.  Any other constraint,
+        like an inner product, zeroes the coefficients it is a factor of,
+        and is substituted by zero into those containing it deeper.
+        """
+        factors = []
+        products = []
+        for cnstrt in constraints:
+            cnstrt = _normal(S(cnstrt))
+            if isinstance(cnstrt, Mul):
+                products.append(_factors(cnstrt))
+            else:
+                factors.append(cnstrt)
+        terms = {}
+        changed = False
+        for word, coeff in self.terms.iteritems():
+            monos = []
+            for mono in Add.make_args(coeff):
+                mono_args = Mul.make_args(mono)
+                if any(factor in mono_args for factor in factors) or \
+                   any(set(comm).issubset(mono_args) and _contains(word, piece)
+                       for comm, piece in products):
+                    changed = True
+                    continue
+                deep = [factor for factor in factors
+                        if _atoms(factor).issubset(_atoms(mono))]
+                if deep:
+                    new_mono = rewrite(mono, deep)
+                    changed = changed or new_mono != mono
+                    mono = new_mono
+                monos.append(mono)
+            if len(monos) > 0:
+                _add_term(terms, word, Add(*monos))
+        if not changed:
+            return self
+        return TensorPoly(terms)
@@ -21,7 +21,10 @@ defaults = {"add" : " + ",
 def print_visitor(expr_to_print, str_dict):
     """Prints a tensor expression in with predefined strings in string dict.
     
-    See default_strs for str_dict keys.
+    See default_strs for str_dict keys.  Optional keys: "outer" prints the
+    product of two vectors that is a matrix, "mat_pow" the powers of
+    matrices, and "tensor" is a function printing a Tensor in place of its
+    name_attr.
     """
     def _visit (expr):
         if expr is None:
@@ -32,6 +35,9 @@ def print_visitor(expr_to_print, str_dict):
             if expr.args[0] is S(-1):
                 return str_dict["neg"] % _wrap_parens(-1 * expr)
             if len(expr.args) == 2:
+                if "outer" in str_dict and expr_rank(expr) == 2 and \
+                   all(expr_rank(arg) == 1 for arg in expr.args):
+                    return str_dict["outer"] % tuple(map(_visit, expr.args))
                 return str_dict["dot"] % tuple(map(_wrap_parens, expr.args))
             else:
                 return str_dict["dot"] % (_wrap_parens(expr.args[0]),
@@ -40,6 +46,10 @@ def print_visitor(expr_to_print, str_dict):
         elif isinstance(expr, Add):
             return str_dict["add"].join(map(_visit, expr.args))
         elif isinstance(expr, Pow):
+            if "mat_pow" in str_dict and expr_rank(expr.args[0]) == 2:
+                if expr.args[1] == S(-1):
+                    return str_dict["inverse"] % _wrap_parens(expr.args[0])
+                return str_dict["mat_pow"] % tuple(map(_visit, expr.args))
             if expr.args[1] == S(-1):
                 return str_dict["div_under_one"] % _wrap_parens(expr.args[0])
             if expr_rank(expr.args[1]) == 0 or expr_rank(expr) == 0:
@@ -63,6 +73,8 @@ def print_visitor(expr_to_print, str_dict):
             else:
                 raise NotImplementedError
         elif isinstance(expr, Tensor):
+            if "tensor" in str_dict:
+                return str_dict["tensor"](expr)
             return expr.__getattribute__(str_dict["name_attr"])
         else:
             raise NotImplementedError
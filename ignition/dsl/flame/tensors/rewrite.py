@@ -0,0 +1,257 @@
+"""Rule based rewriting of tensor expressions.
+
+A RewriteEngine normalizes an expression in a single bottom-up pass: the
+arguments of a node are rewritten first, then the rules registered for the
+type of the node are tried in turn, and the result of a rule that fires is
+rewritten again.  Results are memoized, so subexpressions shared between
+equations are only rewritten once.
+
+The rules of the default engine cancel inverses, remove double transposes,
+order the arguments of inner products, absorb zeros and identities, and
+zero the subexpressions given as zeros, the constraints of the solver.
+
+>>> from ignition.dsl.flame.tensors import Inverse, T, Tensor
+>>> A = Tensor('A', rank=2, has_inv=True)
+>>> p, r = Tensor('p', rank=1), Tensor('r', rank=1)
+>>> delta = Tensor('delta', rank=0)
+>>> rewrite(delta*Inverse(delta)*Inverse(A)*A*p + T(T(r)))
+p + r
+>>> rewrite(delta*(T(r)*p)*A*p + r, zeros=[T(p)*r])
+r
+"""
+
+import weakref
+
+from sympy import Add, Basic, Mul, S
+
+from .tensor_expr import expr_rank, is_one, is_zero, register_expr_cache
+from .tensor import Tensor
+from .basic_operators import Inner, Inverse, Transpose
+from ....utils.instrument import profiled
+
+# Memoized results of an engine, cleared when it grows past the limit.
+MAX_CACHE_SIZE = 100000
+
+_engines = weakref.WeakSet()
+
+@register_expr_cache
+def clear_engine_caches ():
+    """Empties the memos of every RewriteEngine."""
+    for engine in list(_engines):
+        engine.clear_cache()
+
+class RewriteEngine (object):
+    """Applies rewrite rules to tensor expressions bottom-up.
+
+    A rule is a function rule(expr, zeros) called on nodes of the type it
+    was registered for, or of a subclass, once the arguments of expr are
+    rewritten.  zeros is a frozenset of expressions known to be zero.  It
+    returns the replacement of expr, or None to leave it.  Rules must make
+    expressions simpler so that rewriting ends.
+    """
+
+    def __init__ (self, rules=()):
+        self._rules = {}
+        self._type_rules = {}
+        self._cache = {}
+        for node_type, rule in rules:
+            self.add_rule(node_type, rule)
+        _engines.add(self)
+
+    def add_rule (self, node_type, rule):
+        """Registers rule for the nodes of node_type, after the rules
+        already registered for it."""
+        self._rules.setdefault(node_type, []).append(rule)
+        self._type_rules.clear()
+        self.clear_cache()
+
+    def clear_cache (self):
+        self._cache.clear()
+
+    def _rules_for (self, node_type):
+        rules = self._type_rules.get(node_type)
+        if rules is None:
+            rules = []
+            for cls in reversed(node_type.__mro__):
+                rules.extend(self._rules.get(cls, []))
+            self._type_rules[node_type] = rules
+        return rules
+
+    def rewrite (self, expr, zeros=()):
+        """Returns expr with the rules applied until none matches.
+
+        The zeros are rewritten first so that they match the rewritten
+        subexpressions of expr.
+        """
+        zeros = frozenset(self._rewrite(S(zero), frozenset()) for zero in zeros)
+        return self._rewrite(S(expr), zeros)
+
+    __call__ = rewrite
+
+    def _rewrite (self, expr, zeros):
+        if expr.is_Atom:
+            return self._apply(expr, zeros)
+        key = (expr, zeros)
+        ret_val = self._cache.get(key)
+        if ret_val is not None:
+            return ret_val
+        args = tuple(self._rewrite(arg, zeros) for arg in expr.args)
+        if args != expr.args:
+            new_expr = expr.func(*args)
+        else:
+            new_expr = expr
+        ret_val = self._apply(new_expr, zeros)
+        if len(self._cache) >= MAX_CACHE_SIZE:
+            self._cache.clear()
+        self._cache[key] = ret_val
+        return ret_val
+
+    def _apply (self, expr, zeros):
+        for rule in self._rules_for(type(expr)):
+            new_expr = rule(expr, zeros)
+            if new_expr is not None and new_expr != expr:
+                return self._rewrite(S(new_expr), zeros)
+        return expr
+
+def _zero_like (expr):
+    try:
+        return Tensor('0', rank=expr_rank(expr))
+    except Exception:
+        return S(0)
+
+def _split_mul (expr):
+    comm = [arg for arg in expr.args if arg.is_commutative]
+    chain = [arg for arg in expr.args if not arg.is_commutative]
+    return comm, chain
+
+def zero_constraints (expr, zeros):
+    """Replaces expressions in zeros by zero."""
+    if expr in zeros:
+        return S(0)
+
+def zero_mul_constraints (expr, zeros):
+    """Zeroes products containing a product in zeros, its commutative
+    factors and a contiguous piece of its chain."""
+    comm, chain = None, None
+    for zero in zeros:
+        if not isinstance(zero, Mul) or len(zero.args) >= len(expr.args):
+            continue
+        if comm is None:
+            comm, chain = _split_mul(expr)
+        z_comm, z_chain = _split_mul(zero)
+        rest = list(comm)
+        try:
+            for arg in z_comm:
+                rest.remove(arg)
+        except ValueError:
+            continue
+        if not z_chain:
+            return S(0)
+        size = len(z_chain)
+        for i in xrange(len(chain) - size + 1):
+            if chain[i:i + size] == z_chain:
+                return S(0)
+
+def absorb_mul (expr, zeros):
+    """Zeroes products with a zero factor and drops the scalar ones, and
+    the identities next to other matrices or vectors."""
+    comm, chain = _split_mul(expr)
+    if any(is_zero(arg) for arg in expr.args):
+        return _zero_like(expr)
+    new_comm = [arg for arg in comm if not is_one(arg)]
+    new_chain = [arg for arg in chain
+                 if not (is_one(arg) and expr_rank(arg) == 2)]
+    if len(new_chain) == 0 and len(chain) > 0:
+        new_chain = chain[:1]
+    if len(new_comm) == len(comm) and len(new_chain) == len(chain):
+        return None
+    if len(new_comm) + len(new_chain) == 0:
+        return comm[0]
+    return Mul(*(new_comm + new_chain))
+
+def _cancels (a, b):
+    """True if a*b is an identity matrix, a and b being factors of a
+    chain."""
+    if isinstance(a, Inverse):
+        return a.args[0] == b and a.rank == 2
+    if isinstance(b, Inverse):
+        return b.args[0] == a and b.rank == 2
+    return False
+
+def cancel_inverses (expr, zeros):
+    """Cancels scalars against their inverses anywhere in a product and
+    matrices against their inverses next to them."""
+    comm, chain = _split_mul(expr)
+    changed = False
+    # Scalar inverses, which are commutative.
+    for inv in [a for a in comm if isinstance(a, Inverse)]:
+        if inv not in comm:
+            continue
+        rest = list(comm)
+        rest.remove(inv)
+        if inv.args[0] in rest:
+            rest.remove(inv.args[0])
+            comm = rest
+            changed = True
+    # Matrix inverses, like matching brackets.
+    new_chain = []
+    for arg in chain:
+        if new_chain and _cancels(new_chain[-1], arg):
+            new_chain.pop()
+            changed = True
+        else:
+            new_chain.append(arg)
+    if not changed:
+        return None
+    if len(new_chain) == 0 and len(chain) > 0:
+        new_chain = [Tensor('1', 2)]
+    if len(comm) + len(new_chain) == 0:
+        return S(1)
+    return Mul(*(comm + new_chain))
+
+def absorb_add (expr, zeros):
+    """Drops zero terms."""
+    terms = [arg for arg in expr.args if not is_zero(arg)]
+    if len(terms) == len(expr.args):
+        return None
+    if len(terms) == 0:
+        return _zero_like(expr.args[0])
+    return Add(*terms)
+
+def transpose_transpose (expr, zeros):
+    """T(T(x)) is x, and zero and identity matrices are symmetric."""
+    arg = expr.args[0]
+    if isinstance(arg, Transpose):
+        return arg.args[0]
+    if isinstance(arg, Tensor) and arg.rank == 2 and \
+       (is_zero(arg) or is_one(arg)):
+        return arg
+    if is_zero(arg):
+        return _zero_like(expr)
+
+def inner_symmetry (expr, zeros):
+    """Zeroes inner products with a zero vector and writes T(y)*x as
+    T(x)*y when x comes first, as Inner does for T(x)*A*y."""
+    arg0, arg1 = expr.args
+    if is_zero(arg0) or is_zero(arg1):
+        return Tensor('0', rank=0)
+    if isinstance(arg0, Transpose) and isinstance(arg0.args[0], Tensor) and \
+       isinstance(arg1, Tensor) and Basic.compare(arg1, arg0.args[0]) < 0:
+        return Inner(Transpose(arg1), arg0.args[0])
+
+DEFAULT_RULES = [(Mul, zero_constraints),
+                 (Mul, zero_mul_constraints),
+                 (Mul, absorb_mul),
+                 (Mul, cancel_inverses),
+                 (Add, absorb_add),
+                 (Inner, zero_constraints),
+                 (Inner, inner_symmetry),
+                 (Transpose, zero_constraints),
+                 (Transpose, transpose_transpose)]
+
+default_engine = RewriteEngine(DEFAULT_RULES)
+
+@profiled()
+def rewrite (expr, zeros=()):
+    """Rewrites expr with the default engine, see RewriteEngine."""
+    return default_engine.rewrite(expr, zeros)
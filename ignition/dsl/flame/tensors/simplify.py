@@ -6,10 +6,12 @@ from sympy import Add, Mul, Pow
 
 
 from basic_operators import Inverse, Transpose, Inner
+from ....utils.instrument import profiled
 
 def simplify(expr, **kws):
     return simplify_mul_inverse(expr)
 
+@profiled()
 def simplify_mul_inverse(expr):
     if isinstance(expr, Add):
         return reduce(operator.add, map(simplify_mul_inverse,expr.args))
@@ -1,24 +1,42 @@
 """Several solvers for overdetermined tensor systems."""
 
 from copy import copy
+import logging
 import pprint
-import traceback
-from sympy import Add, cse, expand, Mul, S
+import time
+from sympy import Add, Mul, S
 from sympy.utilities.iterables import postorder_traversal
 
 from ignition import IGNITION_DEBUG as DEBUG
 
-from ....utils import flatten, UpdatingPermutationIterator
-from .tensor_expr import expr_coeff, expr_nonlinear, expr_rank
+from ....utils import flatten, get_num_procs, pool_imap, \
+    PrunedPermutationIterator, UpdatingPermutationIterator
+from ....utils.cache import LRUCache
+from ....utils.instrument import count, get_profiler, profiled, profiling, \
+    timer, worker_profiler
+from ....utils.progress import console_logging, pformat_lazy, \
+    ProgressReporter
+from .tensor_expr import expr_coeff, expr_nonlinear, expr_rank, is_zero, \
+     register_expr_cache
 from .constants import CONSTANTS
-from .basic_operators import Inner, NotInvertibleError, \
+from .basic_operators import Inner, INVERTIBLE, NotInvertibleError, \
     Inverse, Transpose
-from .simplify import simplify
+from .canonical import sol_dict_key, unique_exprs
+from .cost import sol_cost
+from .cse import update_cse
+from .expand import tensor_expand
+from .polynomial import TensorPoly
+from .rewrite import rewrite
 from .printers import update_dict_to_latex
 from .tensor_expr import FlameTensorError
 
 #DEBUG = 1
 LATEX = 1
+log = logging.getLogger(__name__)
+# Number of order shards to queue per worker process in all_back_sub.
+SHARDS_PER_PROC = 4
+# Number of (equation, unknown) outcomes memoized by solve_vec_eqn.
+SOLVE_CACHE_SIZE = 4096
 
 class NonLinearEqnError (Exception):
     pass
@@ -29,68 +47,165 @@ class UnsolvableEqnsError (Exception):
 
 def tensor_solver (b4_eqns, aft_eqns, e_knowns=[], levels= -1, num_sols=1,
                    verbose=True, solution_file=None, logic_files=None,
-                   allow_recompute=False):
-    """Updater calling tensor solvers."""
-    if verbose or DEBUG:
-        print "tensor_solver:"
-        print "  b4_eqns:", pprint.pformat(b4_eqns, 4, 80)
-        print "  aft_eqns:", pprint.pformat(aft_eqns, 4, 80)
-        print "  e_knowns:", pprint.pformat(e_knowns, 4, 80)
+                   allow_recompute=False, num_procs=1, prune_orders=True,
+                   time_budget=None, max_sols=None, cheapest=None,
+                   sol_callback=None, cost=None, cse=False, profile=None,
+                   progress=None):
+    """Updater calling tensor solvers.
+
+    num_procs is the number of worker processes used to search the orders of
+    unknowns and prune_orders skips the orders that can't be solved.  The
+    search stops after time_budget seconds or max_sols solutions, keeping
+    only the cheapest solutions if given, and sol_callback is called with
+    each solution as it is found.  The solutions are ranked by cost, by
+    default the flop and memory traffic estimate of sol_cost.  With cse
+    the products shared between updates are computed once into
+    temporaries, see sol_cse, which is off by default so the updates are
+    as derived.  See all_back_sub.
+
+    profile is a Profiler, or the name of a file to write a JSON report
+    to, that records the time spent in each phase of the solver and counts
+    the orders tested (see ignition.utils.instrument).
+
+    Progress is logged to the logger of this module, the summary at INFO
+    and the equations and solutions at DEBUG.  With verbose the messages
+    are printed to stdout unless logging is configured, see
+    console_logging.  progress(event, payload) is called with each event of
+    all_back_sub.
+    """
+    level = logging.DEBUG if DEBUG else logging.INFO
+    with profiling(profile), timer("tensor_solver"):
+        if not verbose:
+            return _tensor_solver(b4_eqns, aft_eqns, e_knowns, levels,
+                                  num_sols, solution_file, logic_files,
+                                  allow_recompute, num_procs, prune_orders,
+                                  time_budget, max_sols, cheapest,
+                                  sol_callback, cost, cse, progress)
+        with console_logging(level=level):
+            return _tensor_solver(b4_eqns, aft_eqns, e_knowns, levels,
+                                  num_sols, solution_file, logic_files,
+                                  allow_recompute, num_procs, prune_orders,
+                                  time_budget, max_sols, cheapest,
+                                  sol_callback, cost, cse, progress)
+
+def _tensor_solver (b4_eqns, aft_eqns, e_knowns, levels, num_sols,
+                    solution_file, logic_files, allow_recompute, num_procs,
+                    prune_orders, time_budget, max_sols, cheapest,
+                    sol_callback, cost, cse, progress):
     knowns = set(flatten([eqn.atoms() for eqn in b4_eqns])).union(set(e_knowns))
     knowns.union(CONSTANTS)
     eqns = aft_eqns + b4_eqns
-    if verbose or DEBUG or True:
-        print "=" * 80
-        print "Calling Generator with following:"
-        print "*" * 80
-        print "Knowns:", pprint.pformat(knowns, 4, 80)
-        print "-" * 80
+    if log.isEnabledFor(logging.DEBUG):
         unknown = set(flatten([eqn.atoms() for eqn in aft_eqns])) - knowns
-        print "Unknowns:", pprint.pformat(unknown, 4, 80)
-        print "-" * 80
-        print "eqns:", pprint.pformat(eqns, 4, 80)
-        print "=" * 80
+        log.debug("tensor_solver:\n  b4_eqns: %s\n  aft_eqns: %s\n"
+                  "  e_knowns: %s", pformat_lazy(b4_eqns),
+                  pformat_lazy(aft_eqns), pformat_lazy(e_knowns))
+        log.debug("Knowns: %s\nUnknowns: %s\neqns: %s", pformat_lazy(knowns),
+                  pformat_lazy(unknown), pformat_lazy(eqns))
     multiple_sols = True
     sub_all = True
-    sol_dicts = all_back_sub(eqns, knowns, levels, multiple_sols, sub_all, allow_recompute)
-    #sol_dicts = map(sol_cse, sol_dicts)
+    sol_dicts = all_back_sub(eqns, knowns, levels, multiple_sols, sub_all,
+                             allow_recompute, num_procs,
+                             prune_orders=prune_orders,
+                             time_budget=time_budget, max_sols=max_sols,
+                             cheapest=cheapest, sol_callback=sol_callback,
+                             cost=cost, progress=progress)
     if solution_file:
         fp = open(solution_file, 'w')
         fp.write("%"*80 + \
                  "\n%% This file was automatically generated by Ignition\n" + \
                  "%" * 80 + "\n")
         for n, dict_ord in enumerate(sol_dicts):
+            if cse:
+                dict_ord = sol_cse(dict_ord)
             fp.write("Algorithm %d\n\n" % (n + 1))
             fp.write(update_dict_to_latex(*dict_ord))
             fp.write("\n\n")
     if logic_files:
-        print "Writing out logic files to %s_{0--%d}.out" % \
-            (logic_files, len(sol_dicts))
+        log.info("Writing out logic files to %s_{0--%d}.out", logic_files,
+                 len(sol_dicts))
         for n, dict_ord in enumerate(sol_dicts):
             fp = open("%s_%d.out" % (logic_files, n), 'w')
             backward_sub(eqns, knowns, dict_ord[1], multiple_sols, sub_all, fp)
             fp.close()
     sol_dicts = sol_dicts[:num_sols]
+    if cse:
+        with timer("cse"):
+            sol_dicts = map(sol_cse, sol_dicts)
     return sol_dicts
 
 
-def sol_cse (sol_dict):
-    update, ord = sol_dict
-    new_sym, new_exprs = cse(update.values())
-    ret_dict = dict(new_sym)
-    for n, k in enumerate(update.keys()):
-        ret_dict[k] = new_exprs[n]
-    return ret_dict, ord
+def sol_cse (sol_tup, **kws):
+    """Returns the (sol_dict, order) solution with the common
+    subexpressions of its updates computed into temporaries.
+
+    The temporaries are added to both, see update_cse.
+    """
+    return update_cse(*sol_tup, **kws)[:2]
+
+
+# Memo of solve_vec_eqn shared by all the solvers, see solve_cache_info.
+_solve_cache = LRUCache(SOLVE_CACHE_SIZE)
+# Failures of solve_vec_eqn that are cached and raised again, ValueError
+# being unmatched ranks.  They only depend on the key.  RuntimeError is not
+# cached: hitting the recursion limit depends on the depth of the caller.
+CACHED_SOLVE_ERRORS = (NonLinearEqnError, NotInvertibleError,
+                       NotImplementedError, ValueError)
+
+def solve_cache_info ():
+    """Returns (hits, misses, maxsize, size) of the solve_vec_eqn cache."""
+    return _solve_cache.info()
+
+@register_expr_cache
+def clear_solve_cache ():
+    _solve_cache.clear()
+
+@profiled("sympy.subs")
+def _subs (expr, old, new):
+    return expr.subs(old, new)
 
+def _normalize (expr, zeros=()):
+    """Expands expr and simplifies it with the rewrite engine, zeroing the
+    expressions in zeros.  A zero of any rank is returned as S(0)."""
+    expr = rewrite(tensor_expand(expr), zeros)
+    if is_zero(expr):
+        return S(0)
+    return expr
 
+@profiled()
 def solve_vec_eqn(eqn, var):
     """Returns the solution to a linear equation containing Tensors
 
+    Results, including the failures in CACHED_SOLVE_ERRORS, are memoized in
+    a bounded LRU cache keyed by (eqn, var, len(INVERTIBLE)), so
+    registering an invertible expression misses earlier entries.  eqn may
+    be a TensorPoly.
+
     Raises:
       NonLinearEqnError if the variable is detected to be nonlinear
       NotInvertibleError if an inverse is required that is not available
       NotImplementedError if operation isn't supported by routine
     """
+    eqn = S(eqn)
+    # Registering invertible expressions can change the outcome.
+    key = (eqn, var, len(INVERTIBLE))
+    outcome = _solve_cache.get(key)
+    if outcome is None:
+        count("solve_vec_eqn.cache_misses")
+        try:
+            outcome = (True, _solve_vec_eqn(eqn, var))
+        except CACHED_SOLVE_ERRORS as inst:
+            outcome = (False, (type(inst), inst.args))
+        _solve_cache.put(key, outcome)
+    else:
+        count("solve_vec_eqn.cache_hits")
+    solved, value = outcome
+    if solved:
+        return value
+    exc_type, exc_args = value
+    raise exc_type(*exc_args)
+
+def _solve_vec_eqn(eqn, var):
     if DEBUG:
         print "solve_vec_eqn: ", eqn, "for", var
     if var.rank != expr_rank(eqn):
@@ -106,7 +221,7 @@ def solve_vec_eqn(eqn, var):
     def _solve_recur(expr, rhs=S(0)):
         if expr == var:
             return rhs
-        expr = expand(expr)
+        expr = tensor_expand(expr)
         if isinstance(expr, Mul):
             lhs = S(1)
             # Try by rank
@@ -123,7 +238,7 @@ def solve_vec_eqn(eqn, var):
                     rhs -= arg
             if isinstance(lhs, Add):
                 coeff = lhs.coeff(var)
-                if expand(coeff * var) == lhs:
+                if tensor_expand(coeff * var) == lhs:
                     rhs /= coeff
                     lhs = var
             return _solve_recur(lhs, rhs)
@@ -143,6 +258,7 @@ def get_eqns_unk (eqns, knowns):
     atoms = reduce(lambda acc, eqn: acc.union(eqn.atoms()), eqns, set())
     return filter(lambda x: not x.is_Number, atoms - set(knowns))
 
+@profiled()
 def forward_solve(eqns, knowns, branching=False):
     """Returns a dict of unknowns:solutions from a simple backward solve.
 
@@ -185,11 +301,9 @@ def forward_solve(eqns, knowns, branching=False):
                 try:
                     sol = solve_vec_eqn(eqn, eqn_unk)
                 except RuntimeError as inst:
-                    print "=" * 80
-                    print inst
-                    print "Runtime error: forward_solve:"
-                    print "  solve_vec_eqn( " + str(eqn) + ", " + str(eqn_unk) + " )"
-                    print "=" * 80
+                    log.warning("Runtime error: forward_solve: %s\n"
+                                "  solve_vec_eqn( %s, %s )", inst, eqn,
+                                eqn_unk)
                     raise
                 if DEBUG:
                     print "given solution", sol
@@ -204,7 +318,7 @@ def forward_solve(eqns, knowns, branching=False):
                     else:
                         sol_dict[eqn_unk].append(sol)
                 else:
-                    sol_dict[eqn_unk] = expand(sol)
+                    sol_dict[eqn_unk] = tensor_expand(sol)
             except Exception as inst:
                 if DEBUG:
                     print "could not solve", eqn, "for", eqn_unk
@@ -255,13 +369,14 @@ def add_new_eqns (add_vars, all_eqns, sol_dict):
             if knwn in eqn:
                 if DEBUG:
                     print "substituting:", knwn, "=", sol_dict[knwn], "in", eqn
-                new_eqn = simplify(expand(eqn.subs(knwn, sol_dict[knwn])))
+                new_eqn = _normalize(_subs(eqn, knwn, sol_dict[knwn]))
                 if new_eqn == S(0): continue
                 all_eqns.append(new_eqn)
                 if DEBUG:
                     print "Added", new_eqn
 
 
+@profiled()
 def assump_solve(eqns, knowns, assumps=None):
     """An aggressive solver for list of eqns and given knowns.
 
@@ -282,7 +397,7 @@ def assump_solve(eqns, knowns, assumps=None):
     # See what we can solve first
     global DEBUG
 
-    all_eqns = map(expand, eqns)
+    all_eqns = map(tensor_expand, eqns)
     ret_dict = {}
     unknowns = get_eqns_unk(eqns, knowns)
     solved = []
@@ -344,7 +459,23 @@ def assump_solve(eqns, knowns, assumps=None):
 
     return ret_dict
 
-def build_assump_stack (eqns, knowns, levels= -1):
+def _expand_assump (args):
+    """Pool worker for build_assump_stack, returns the assumptions extending
+    assump by each unknown still free after assuming it."""
+    eqns, knowns, unknowns, assump = args
+    sol_dict = forward_solve(eqns, knowns + assump)
+    solved = get_solved(sol_dict)
+    free_vars = set(unknowns) - set(solved) - set(assump)
+    if len(free_vars) > 0:
+        return [assump + [unk] for unk in free_vars]
+    return [assump]
+
+def build_assump_stack (eqns, knowns, levels= -1, num_procs=1):
+    """Returns the lists of unknowns to assume known in assump_solve.
+
+    The forward_solve calls of each level are run on num_procs worker
+    processes (None means all cpus), see all_back_sub.
+    """
     unknowns = get_eqns_unk(eqns, knowns)
     sol_dict = forward_solve(eqns, knowns)
     solved = get_solved(sol_dict)
@@ -354,21 +485,11 @@ def build_assump_stack (eqns, knowns, levels= -1):
     complete_assump = []
     level = 1
     while level < levels and assump_stack:
-#        print "assump_stack:", assump_stack
         level_assumps = []
-        for assump in assump_stack:
-#            print "assump:", assump
-            sol_dict = forward_solve(eqns, knowns + assump)
-            solved = get_solved(sol_dict)
-#            print "solved:", solved
-            free_vars = set(unknowns) - set(solved) - set(assump)
-#            print "free_vars:", free_vars
-            if len(free_vars) > 0:
-                for unk in free_vars:
-                    level_assumps.append(assump + [unk])
-            else:
-                level_assumps.append(assump)
-#        print "level_assumps:", level_assumps
+        args = [(eqns, knowns, unknowns, assump) for assump in assump_stack]
+        for new_assumps in pool_imap(_expand_assump, args,
+                                     min(num_procs, len(args))):
+            level_assumps.extend(new_assumps)
         assump_stack = []
         for i in xrange(len(level_assumps)):
             if len(level_assumps[i]) < level:
@@ -378,35 +499,181 @@ def build_assump_stack (eqns, knowns, levels= -1):
         level += 1
     return complete_assump + assump_stack
 
-def branching_assump_solve(eqns, knowns, levels= -1):
+def _assump_solve (args):
+    """Pool worker for branching_assump_solve"""
+    return assump_solve(*args)
+
+def branching_assump_solve(eqns, knowns, levels= -1, num_procs=1,
+                           sol_callback=None):
     """Returns all unique solutions discovered by assuming different unknowns
     and branching to see if different solutions occur.
 
+    The assumption stacks are built and solved on num_procs worker processes
+    (None means all cpus).  The solutions are returned in the order of the
+    stacks, as in the serial search, and sol_callback(sol_dict) is called
+    with each new unique solution as it comes back.
+
     See also: assump_solve
     """
-    print "Building assumption stacks"
-    assump_stack = build_assump_stack(eqns, knowns, levels)
-    print "Got %d assumption stacks" % len(assump_stack)
-    print "Solving for each assumption"
-    sol_dicts = map(lambda assumps: assump_solve(eqns, knowns, assumps),
-                    assump_stack)
-    print "Done solving, filtering for unique sol_dicts"
-    sol_dicts = filter(is_solved, sol_dicts)
+    num_procs = get_num_procs(num_procs)
+    log.info("Building assumption stacks")
+    assump_stack = build_assump_stack(eqns, knowns, levels, num_procs)
+    log.info("Got %d assumption stacks", len(assump_stack))
+    log.info("Solving for each assumption")
     unique_dicts = []
-    for sol_dict in sol_dicts:
-        if not sol_dict in unique_dicts:
-            unique_dicts.append(sol_dict)
+    seen = set()
+    results = pool_imap(_assump_solve,
+                        [(eqns, knowns, assumps) for assumps in assump_stack],
+                        max(1, min(num_procs, len(assump_stack))))
+    try:
+        for sol_dict in results:
+            if not is_solved(sol_dict):
+                continue
+            key = sol_dict_key(sol_dict)
+            if key not in seen:
+                seen.add(key)
+                unique_dicts.append(sol_dict)
+                if sol_callback:
+                    sol_callback(sol_dict)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        results.close()
+    log.info("Done solving, found %d unique sol_dicts", len(unique_dicts))
     return unique_dicts
 
 
+class BackSubTrie (object):
+    """Cache of backward_sub states shared between orders of unknowns.
+
+    The orders of unknowns form a trie where each node is the state of
+    backward_sub (equations, partial solution dict and solved list) after
+    solving the unknowns on the path to it.  backward_sub resumes from the
+    deepest node matching the start of its order, so only the suffix of a
+    new order is solved.
+
+    The order iterators visit the trie depth first, so only the nodes on the
+    path to the last order are kept; this bounds the memory by the number of
+    unknowns.  A trie is only valid for one set of equations, knowns and
+    backward_sub options.
+    """
+
+    def __init__ (self):
+        self._path = []
+        self._states = []
+
+    def __len__ (self):
+        return len(self._path)
+
+    def lookup (self, unknowns):
+        """Returns the number of leading unknowns with a cached state and
+        that state, or (0, None).
+
+        Drops the cached nodes that are not on the path to unknowns.
+        """
+        depth = 0
+        while depth < min(len(self._path), len(unknowns)) and \
+              self._path[depth] == unknowns[depth]:
+            depth += 1
+        del self._path[depth:]
+        del self._states[depth:]
+        if depth == 0:
+            return 0, None
+        return depth, self._copy_state(self._states[-1])
+
+    def push (self, unk, state):
+        """Adds the state after solving unk as a child of the last node."""
+        self._path.append(unk)
+        self._states.append(self._copy_state(state))
+
+    def _copy_state (self, state):
+        all_eqns, sol_dict, solved = state
+        sol_dict = dict((k, copy(v)) for k, v in sol_dict.iteritems())
+        return list(all_eqns), sol_dict, list(solved)
+
+
+class AtomIndex (object):
+    """Inverted index from atoms to the equations containing them.
+
+    Used by backward_sub to only substitute into the equations that mention
+    a solved unknown or contain every atom of a constraint.
+    """
+
+    def __init__ (self, eqns=()):
+        self._eqn_atoms = {}
+        self._atom_eqns = {}
+        for eqn in eqns:
+            self.add(eqn)
+
+    def add (self, eqn):
+        if eqn in self._eqn_atoms:
+            return
+        atoms = eqn.atoms()
+        self._eqn_atoms[eqn] = atoms
+        for atom in atoms:
+            self._atom_eqns.setdefault(atom, set()).add(eqn)
+
+    def remove (self, eqn):
+        for atom in self._eqn_atoms.pop(eqn, ()):
+            self._atom_eqns[atom].discard(eqn)
+
+    def atoms (self, eqn):
+        """Returns the atoms of eqn, indexed or not."""
+        if eqn in self._eqn_atoms:
+            return self._eqn_atoms[eqn]
+        return eqn.atoms()
+
+    def containing (self, atoms):
+        """Returns the set of indexed equations containing all the atoms."""
+        ret_val = None
+        for atom in atoms:
+            eqns = self._atom_eqns.get(atom, set())
+            ret_val = eqns if ret_val is None else ret_val.intersection(eqns)
+            if len(ret_val) == 0:
+                break
+        return set(ret_val) if ret_val is not None else set(self._eqn_atoms)
+
+
+@profiled()
 def backward_sub(eqns, knowns, unknowns=None, multiple_sols=False, sub_all=True,
-                 fp=None):
+                 fp=None, trie=None, stats=None, prune=None, poly=False):
+    """Solves the unknowns one at a time in the given order by substituting
+    each solution into the remaining equations.
+
+    Returns (sol_dict, None) on success and (None, unk) if unk could not be
+    solved.  If trie, a BackSubTrie, is given the work for the start of the
+    order shared with previous calls is reused.  The trie is not used when
+    writing the logic to fp.
+
+    Equations left by an earlier step are only substituted into when they
+    mention the solved unknown, and constraints are only substituted into
+    equations containing all their atoms, see AtomIndex.  If stats is a
+    list, a (unk, num_eqns, sub_skipped, cnstrt_skipped) tuple is appended
+    to it for each step, counting the equations and the substitutions that
+    were skipped.
+
+    prune is called with the partial sol_dict after each unknown is solved,
+    if it returns True the order is abandoned as if that unknown failed.
+
+    With poly the equations, which may be expressions or TensorPoly
+    objects, are kept as TensorPoly objects.  Solutions are substituted
+    into them and constraints eliminated without rebuilding whole
+    expressions, which pays off on large equation sets.
+    """
     if unknowns is None:
         unknowns = []
     unknowns = unknowns + \
         [u for u in get_eqns_unk(eqns, knowns) if u not in unknowns]
 
-    constraints = filter(lambda x: isinstance(x, (Mul, Inner)), eqns)
+    constraints = filter(lambda x: isinstance(x, (Mul, Inner)), map(S, eqns))
+    cnstrt_atoms = [c.atoms() for c in constraints]
+    if poly:
+        eqns = map(TensorPoly.from_expr, eqns)
+        cnstrt_forms = set(map(TensorPoly.from_expr, constraints))
+    else:
+        # The constraints as the rewrite engine leaves them, so they are
+        # still recognized once normalized.
+        cnstrt_forms = set(constraints) | set(map(rewrite, constraints))
 
     if fp:
         fp.write("Solving unknowns in following order:\n    %s\n" % unknowns)
@@ -421,6 +688,19 @@ def backward_sub(eqns, knowns, unknowns=None, multiple_sols=False, sub_all=True,
     all_eqns = copy(eqns)
     solved = [] # Maintain a list of solved vars that can't be referenced in new
                 # solutions.
+    # Equations produced by a step, which the following steps leave alone
+    # unless they mention the unknown being solved.
+    settled = set()
+    if fp:
+        trie = None
+    if trie is not None:
+        num_cached, state = trie.lookup(unknowns)
+        if num_cached:
+            all_eqns, cached_dict, solved = state
+            sol_dict.update(cached_dict)
+            unknowns = unknowns[num_cached:]
+            settled = set(all_eqns) if sub_all else set(all_eqns) - set(eqns)
+    index = AtomIndex(all_eqns)
     while len(unknowns) > 0:
         if fp:
             fp.write("\n%s\nCurrent equations:\n%s\n\n" % \
@@ -436,11 +716,8 @@ def backward_sub(eqns, knowns, unknowns=None, multiple_sols=False, sub_all=True,
                 try:
                     sol = solve_vec_eqn(eqn, unk)
                 except RuntimeError as inst:
-                    print "=" * 80
-                    print inst
-                    print "Caught Runtime error: backward_sub"
-                    print "  solve_vec_eqn( " + str(eqn) + ", " + str(unk) + " )"
-                    print "=" * 80
+                    log.warning("Caught Runtime error: backward_sub: %s\n"
+                                "  solve_vec_eqn( %s, %s )", inst, eqn, unk)
                 except Exception as inst:
                     if DEBUG:
                         print "could not solve", eqn, "for", unk
@@ -455,10 +732,17 @@ def backward_sub(eqns, knowns, unknowns=None, multiple_sols=False, sub_all=True,
                         break
         if sol_dict[unk] is None or (multiple_sols and len(sol_dict[unk]) == 0):
             return (None, unk)
+        elif prune is not None and prune(sol_dict):
+            return (None, unk)
         else:
             solved.append(unk)
+            mention_unk = index.containing([unk])
             new_eqns = []
+            kept_eqns = []
             for eqn in all_eqns:
+                if eqn in settled and eqn not in mention_unk:
+                    kept_eqns.append(eqn)
+                    continue
                 if multiple_sols:
                     sols = sol_dict[unk]
                 else:
@@ -467,21 +751,49 @@ def backward_sub(eqns, knowns, unknowns=None, multiple_sols=False, sub_all=True,
                     # FIXME: This a hack, if the substitution raised a
                     #        NotInvertibleError then the equation is jacked up
                     try:
-                        sub_sol = eqn.subs(unk, sol)
-                        new_eqns.append(simplify(expand(sub_sol)))
+                        if poly:
+                            new_eqns.append(eqn.subs(unk, sol))
+                        else:
+                            sub_sol = _subs(eqn, unk, sol)
+                            new_eqns.append(_normalize(sub_sol))
                     except NotInvertibleError:
                         pass
+            num_cnstrt_skipped = 0
             for i in xrange(len(new_eqns)):
-                if new_eqns[i] in constraints:
+                if new_eqns[i] in cnstrt_forms:
                     continue
-                for cnstrt in constraints:
-                        new_eqns[i] = simplify(expand(new_eqns[i].subs(cnstrt, S(0))))
-            new_eqns = filter(lambda s: s != S(0), set(new_eqns))
+                eqn_atoms = index.atoms(new_eqns[i])
+                zeros = [cnstrt for cnstrt, atoms
+                         in zip(constraints, cnstrt_atoms)
+                         if atoms.issubset(eqn_atoms)]
+                num_cnstrt_skipped += len(constraints) - len(zeros)
+                if zeros and poly:
+                    new_eqns[i] = new_eqns[i].eliminate(zeros)
+                elif zeros:
+                    new_eqns[i] = rewrite(new_eqns[i], zeros)
+                    if is_zero(new_eqns[i]):
+                        new_eqns[i] = S(0)
+            # Drop equations that are equivalent forms of each other.
+            new_eqns = filter(lambda s: s != S(0),
+                              unique_exprs(set(new_eqns + kept_eqns)))
+            if stats is not None:
+                stats.append((unk, len(all_eqns), len(kept_eqns),
+                              num_cnstrt_skipped))
+            if DEBUG:
+                print "Skipped substituting into %d of %d equations" % \
+                    (len(kept_eqns), len(all_eqns))
 #            print "New Eqns:", pprint.pformat(new_eqns, 5, 80)
             if sub_all:
+                for eqn in all_eqns:
+                    index.remove(eqn)
                 all_eqns = new_eqns
             else:
                 all_eqns.extend(new_eqns)
+            for eqn in new_eqns:
+                index.add(eqn)
+            settled.update(new_eqns)
+            if trie is not None:
+                trie.push(unk, (all_eqns, sol_dict, solved))
     return (sol_dict, None)
 
 def sol_without_recomputes (sol_tup):
@@ -514,50 +826,326 @@ def sol_without_recomputes_multi (sol_tup):
     return sol_dict, ord_unks
 
 
-def all_back_sub(eqns, knowns, levels= -1, multiple_sols=False, sub_all=True,
-                 allow_recompute=False):
-    unks = get_eqns_unk(eqns, knowns)
-    print "Knowns:", knowns
-    print "Unknowns:", unks
-    ord_unk_iter = UpdatingPermutationIterator(unks,
-                                       levels if levels != -1 else len(unks))
+class StructuralOrderCheck (object):
+    """Finds orders of unknowns that backward_sub can't solve from the
+    structure of the equations alone.
+
+    The equations are reduced to their rank and the set of unknowns they
+    contain, an incidence graph between equations and unknowns.  Solving
+    for an unknown needs an equation of the same rank containing it (see
+    solve_vec_eqn), and substituting a solution found from equation E into
+    equation F keeps the rank of F and leaves at most the unknowns of E and
+    F other than the solved one.  Eliminating the unknowns of an order this
+    way gives a superset of the unknowns backward_sub will see, so an
+    unknown missing from every equation of its rank is a certain failure.
+
+    Calling the check with an order returns the position of the first
+    unknown that can't be solved, or None.  The states along the last order
+    are kept so consecutive orders with a common start are cheap, as in
+    BackSubTrie.
+    """
+
+    def __init__ (self, eqns, knowns):
+        self._eqns = frozenset((self._rank(eqn),
+                                frozenset(get_eqns_unk(eqn, knowns)))
+                               for eqn in eqns)
+        self._path = []
+        self._states = []
+
+    def _rank (self, eqn):
+        try:
+            return expr_rank(eqn)
+        except Exception:
+            # Unknown rank, assume the equation can solve anything.
+            return None
+
+    def __call__ (self, unknowns):
+        depth = 0
+        while depth < min(len(self._path), len(unknowns)) and \
+              self._path[depth] == unknowns[depth]:
+            depth += 1
+        del self._path[depth:]
+        del self._states[depth:]
+        eqns = self._states[-1] if depth else self._eqns
+        for pos in xrange(depth, len(unknowns)):
+            unk = unknowns[pos]
+            solvers = [unks for rank, unks in eqns if unk in unks and \
+                       rank in (None, unk.rank)]
+            if len(solvers) == 0:
+                return pos
+            sol_unks = reduce(frozenset.union, solvers) - frozenset([unk])
+            eqns = frozenset((rank, (unks - frozenset([unk])).union(sol_unks)
+                                    if unk in unks else unks)
+                             for rank, unks in eqns)
+            self._path.append(unk)
+            self._states.append(eqns)
+        return None
+
+
+def sol_size (sol_tup):
+    """Returns the number of nodes in the expressions of a solution, a
+    cost for all_back_sub ranking solutions by their size."""
+    return sum([len(list(postorder_traversal(v))) \
+                for _, v in sol_tup[0].iteritems()])
+
+def _keep_cheapest (sols, cheapest, cost):
+    """Drops the most expensive solutions past the first cheapest ones."""
+    while cheapest is not None and len(sols) > cheapest:
+        sols.remove(max(sols, key=cost))
+
+def _search_orders (ord_unk_iter, eqns, knowns, multiple_sols=False,
+                    sub_all=True, reporter=None, share_prefixes=True,
+                    deadline=None, max_sols=None, cheapest=None,
+                    sol_callback=None, cost=sol_cost, poly=False):
+    """Runs backward_sub over each order of the iterator.
+
+    Returns the unique solutions in the order they were found (compared by
+    sol_dict_key), the number of orders tested and the number of orders
+    skipped by a pruning iterator (see PrunedPermutationIterator).  Failed
+    orders are reported to the iterator with bad_pos so it can skip orders
+    sharing the failed prefix.  With share_prefixes the work on common
+    starts of orders is shared through a BackSubTrie.
+
+    The search stops once time.time() passes deadline or max_sols solutions
+    are found.  If cheapest is given only that many of the lowest cost
+    solutions are kept, and orders are abandoned as soon as their partial
+    solution costs more than all of them.  sol_callback is called with each
+    new solution and its order.  Progress goes to reporter, a
+    ProgressReporter, if given.  poly is passed on to backward_sub.
+    """
+    trie = BackSubTrie() if share_prefixes else None
     sols = []
+    seen = set()
+    def _prune (sol_dict):
+        if cheapest is None or len(sols) < cheapest:
+            return False
+        return cost((sol_dict, None)) > max(map(cost, sols))
     tot_to_test = len(ord_unk_iter)
-    print "Searching a possible %d orders" % tot_to_test
-    print "Hit control-C to stop searching and return solutions already found."
-    ord_unk_iter.reset()
     num_tested = 0
     for ord_unks in ord_unk_iter:
         try:
+            if deadline is not None and time.time() > deadline:
+                if reporter:
+                    reporter.event("time_budget", logging.INFO,
+                                   "Time budget exhausted")
+                break
     #        print "Testing order:", ord_unks
             num_tested += 1
-            if num_tested % (tot_to_test / 10 if tot_to_test > 10 else 2) == 0:
-                print "Tested: ", num_tested, ", Solutions:", len(sols)
+            if reporter:
+                reporter.progress("progress", "Tested: %d of %d, Solutions: %d",
+                                  num_tested, tot_to_test, len(sols),
+                                  tested=num_tested, total=tot_to_test,
+                                  solutions=len(sols))
             try:
                 sol_dict, failed_var = backward_sub(eqns, knowns, ord_unks,
-                                                    multiple_sols, sub_all)
+                                                    multiple_sols, sub_all,
+                                                    trie=trie, prune=_prune,
+                                                    poly=poly)
             except FlameTensorError, e:
-                print "Error for:", ord_unks
-                traceback.print_exc()
+                log.exception("Error for: %s", ord_unks)
                 continue
 
     #        print "  result:", sol_dict, failed_var
             if sol_dict is None:
+                count("orders.failed")
                 if failed_var in ord_unks:
                     ord_unk_iter.bad_pos(ord_unks.index(failed_var))
             else:
+                count("orders.succeeded")
 #                for var in sol_dict:
 #                    sol_dict[var] = sol_dict[var].expand()
-                if len(filter(lambda x: x[0] == sol_dict, sols)) == 0:
+                key = sol_dict_key(sol_dict)
+                if key not in seen:
+                    seen.add(key)
                     sols.append((sol_dict, ord_unks))
-                    print "Found new solution:\n%s" % pprint.pformat(sol_dict, 4, 80)
+                    _keep_cheapest(sols, cheapest, cost)
+                    if reporter:
+                        reporter.event("solution", logging.DEBUG,
+                                       "Found new solution:\n%s",
+                                       pformat_lazy(sol_dict),
+                                       sol_dict=sol_dict, order=ord_unks)
+                    if sol_callback:
+                        sol_callback(sol_dict, ord_unks)
+                    if max_sols is not None and len(seen) >= max_sols:
+                        break
         except KeyboardInterrupt:
             break
-    print "Tested %d orders" % num_tested
-    print "Found %d unique solutions" % len(sols)
-    sols.sort(key=lambda s: sum([len(list(postorder_traversal(v))) \
-                                      for _, v in s[0].iteritems()]))
+    num_skipped = getattr(ord_unk_iter, "num_skipped", 0)
+    count("orders.tested", num_tested)
+    count("orders.pruned", num_skipped)
+    return sols, num_tested, num_skipped
+
+def _search_shard (args):
+    """Pool worker for searching one shard of the orders, see all_back_sub.
+
+    Returns the result of _search_orders and the worker's profiler report,
+    or None when not profiling.
+    """
+    (ord_unk_iter, eqns, knowns, multiple_sols, sub_all, share_prefixes,
+     deadline, max_sols, cheapest, cost, poly) = args
+    prof = worker_profiler()
+    ret_val = _search_orders(ord_unk_iter, eqns, knowns, multiple_sols,
+                             sub_all, None, share_prefixes, deadline,
+                             max_sols, cheapest, cost=cost, poly=poly)
+    return ret_val + (prof.report() if prof else None, )
+
+def cheap_first_unknowns (eqns, unks):
+    """Sorts the unknowns so the orders likely to give small solutions are
+    permuted first.
+
+    Tensors of higher rank come first, since solving the scalars last
+    leaves them as ratios of inner products instead of substituting them
+    into every vector.  Ties go to the unknowns found in the fewest
+    equations and then to the ones with the smallest equation.
+    """
+    def _cost (unk):
+        sizes = [len(list(postorder_traversal(eqn))) for eqn in eqns \
+                 if unk in eqn.atoms()]
+        return (-getattr(unk, "rank", 0), len(sizes), min(sizes or [0]))
+    return sorted(unks, key=_cost)
+
+def _shard_depth (num_unks, num_procs, levels):
+    """Returns the prefix length giving a few shards per worker process."""
+    max_depth = min(levels, num_unks) if levels != -1 else num_unks
+    depth, num_shards = 1, num_unks
+    while depth < max_depth and num_shards < SHARDS_PER_PROC * num_procs:
+        num_shards *= num_unks - depth
+        depth += 1
+    return depth
+
+@profiled()
+def all_back_sub(eqns, knowns, levels= -1, multiple_sols=False, sub_all=True,
+                 allow_recompute=False, num_procs=1, share_prefixes=True,
+                 prune_orders=True, time_budget=None, max_sols=None,
+                 cheapest=None, sol_callback=None, cheap_first=None,
+                 cost=None, progress=None, poly=False):
+    """Returns the unique solutions found by backward_sub over all orders of
+    the unknowns.
+
+    levels limits the number of leading unknowns that are permuted.  If
+    num_procs is not 1 the orders are split into prefix-disjoint shards that
+    are searched on num_procs worker processes (None means all cpus).  The
+    result is the same as the serial search.  share_prefixes reuses the
+    backward_sub work on the common start of consecutive orders, see
+    BackSubTrie.  prune_orders skips the orders that fail the
+    StructuralOrderCheck without calling backward_sub on them.
+
+    The solutions are returned from the lowest cost up.  cost maps a
+    (sol_dict, order) tuple to a number and defaults to sol_cost, the flops
+    and memory traffic of an iteration (see the cost module); sol_size ranks
+    by expression size instead.  It should not decrease as more unknowns
+    are solved, and must be picklable when num_procs is not 1.
+
+    The search can be bounded for unattended runs: it stops after
+    time_budget seconds or once max_sols unique solutions are found, and
+    with cheapest only that many of the lowest cost solutions are kept,
+    pruning the orders that are already more expensive.
+    sol_callback(sol_dict, ord_unks) is called for each new solution as it
+    is found, in shard order when searching in parallel.  cheap_first
+    orders the unknowns with cheap_first_unknowns so a short budget tends
+    to find the smallest solutions, it defaults to on when the search is
+    bounded.
+
+    Progress is logged to the logger of this module and passed to
+    progress(event, payload) if given, see ProgressReporter.  The events
+    are start, progress (at most once a second), solution, time_budget and
+    done, their payloads hold the unformatted objects.
+
+    poly runs backward_sub on TensorPoly equations, see backward_sub.
+    """
+    if cost is None:
+        cost = sol_cost
+    deadline = time.time() + time_budget if time_budget is not None else None
+    if cheap_first is None:
+        cheap_first = time_budget is not None or max_sols is not None
+    unks = get_eqns_unk(eqns, knowns)
+    if cheap_first:
+        unks = cheap_first_unknowns(eqns, unks)
+    reporter = ProgressReporter(log, progress)
+    if prune_orders:
+        ord_unk_iter = PrunedPermutationIterator(unks,
+                                        StructuralOrderCheck(eqns, knowns),
+                                        levels if levels != -1 else len(unks))
+    else:
+        ord_unk_iter = UpdatingPermutationIterator(unks,
+                                        levels if levels != -1 else len(unks))
+    tot_to_test = len(ord_unk_iter)
+    log.debug("Knowns: %s\nUnknowns: %s", knowns, unks)
+    reporter.event("start", logging.INFO,
+                   "Searching a possible %d orders\n"
+                   "Hit control-C to stop searching and return solutions "
+                   "already found.", tot_to_test,
+                   knowns=knowns, unknowns=unks, total=tot_to_test)
+    ord_unk_iter.reset()
+    num_procs = get_num_procs(num_procs)
+    if num_procs == 1:
+        sols, num_tested, num_skipped = _search_orders(ord_unk_iter, eqns,
+                                        knowns, multiple_sols, sub_all,
+                                        share_prefixes=share_prefixes,
+                                        deadline=deadline, max_sols=max_sols,
+                                        cheapest=cheapest,
+                                        sol_callback=sol_callback, cost=cost,
+                                        reporter=reporter, poly=poly)
+    else:
+        shards = ord_unk_iter.shards(_shard_depth(len(unks), num_procs,
+                                                  levels))
+        log.info("Searching %d shards on %d processes", len(shards),
+                 num_procs)
+        shard_args = [(shard, eqns, knowns, multiple_sols, sub_all,
+                       share_prefixes, deadline, max_sols, cheapest, cost,
+                       poly)
+                      for shard in shards]
+        sols = []
+        seen = set()
+        num_tested = 0
+        num_skipped = 0
+        results = pool_imap(_search_shard, shard_args, num_procs)
+        try:
+            # Merging in shard order gives the order of the serial search.
+            for n, (shard_sols, shard_tested, shard_skipped, report) in \
+                    enumerate(results):
+                if report is not None and get_profiler() is not None:
+                    get_profiler().merge(report)
+                num_tested += shard_tested
+                num_skipped += shard_skipped
+                for sol_dict, ord_unks in shard_sols:
+                    key = sol_dict_key(sol_dict)
+                    if key not in seen:
+                        seen.add(key)
+                        sols.append((sol_dict, ord_unks))
+                        _keep_cheapest(sols, cheapest, cost)
+                        reporter.event("solution", logging.DEBUG,
+                                       "Found new solution:\n%s",
+                                       pformat_lazy(sol_dict),
+                                       sol_dict=sol_dict, order=ord_unks)
+                        if sol_callback:
+                            sol_callback(sol_dict, ord_unks)
+                        if max_sols is not None and len(seen) >= max_sols:
+                            break
+                reporter.progress("progress", "Searched shards: %d of %d, "
+                                  "Tested: %d of %d, Solutions: %d", n + 1,
+                                  len(shards), num_tested, tot_to_test,
+                                  len(sols), tested=num_tested,
+                                  total=tot_to_test, solutions=len(sols))
+                if max_sols is not None and len(seen) >= max_sols:
+                    break
+                if deadline is not None and time.time() > deadline:
+                    reporter.event("time_budget", logging.INFO,
+                                   "Time budget exhausted")
+                    break
+        except KeyboardInterrupt:
+            pass
+        finally:
+            results.close()
+    num_unique = len(sols)
+    sols.sort(key=cost)
     if not allow_recompute:
-        sols = filter(lambda x:x, map(sol_without_recomputes, sols))
-        print "Found %d unique solutions without recomputation" % len(sols)
+        with timer("sol_without_recomputes"):
+            sols = filter(lambda x:x, map(sol_without_recomputes, sols))
+    reporter.event("done", logging.INFO,
+                   "Tested %d orders, skipped %d structurally infeasible "
+                   "orders\nFound %d unique solutions, %d without "
+                   "recomputation", num_tested, num_skipped, num_unique,
+                   len(sols), tested=num_tested, skipped=num_skipped,
+                   solutions=num_unique, returned=len(sols))
     return sols
@@ -4,13 +4,23 @@ from sympy import Symbol, symbols
 from sympy.core.decorators import call_highest_priority
 
 
-from .tensor_expr import TensorExpr
+from .tensor_expr import clear_expr_caches, TensorExpr
+from ....utils.cache import memoize
 from .tensor_names import add_idx, convert_name, set_lower_ind, set_upper_ind, \
                          to_latex
 
 
 m, n, k = symbols('m n k')
 
+# Tensors built from a string, keyed by their constructor arguments.
+# Cleared when it grows past the limit.
+MAX_CACHE_SIZE = 100000
+
+_interned = {}
+
+def clear_tensor_cache ():
+    _interned.clear()
+
 class Tensor (TensorExpr, Symbol):
     """Basic Tensor symbol.
 
@@ -25,10 +35,26 @@ class Tensor (TensorExpr, Symbol):
     >>> expand((alpha*A+beta*B)*(x+y))
     alpha*A*x + alpha*A*y + beta*B*x + beta*B*y
 
+    Give symmetric=True for a matrix equal to its transpose, which lets
+    canonical keys take T(A) for A.
     """
 
     def __new__ (cls, ten, rank=None, shape=None, has_inv=None, transposed=None,
-                 **kws):
+                 symmetric=None, **kws):
+        # Symbol.__new__ returns the same object for the same name, so a
+        # Tensor built again with other attributes changes the earlier one
+        # too.  A hit is only returned while the attributes are the ones of
+        # its key, otherwise it is built again as before.
+        key = None
+        if isinstance(ten, str):
+            key = (cls, ten, rank, shape, has_inv, transposed, symmetric,
+                   tuple(sorted(kws.iteritems())))
+            try:
+                obj = _interned.get(key)
+            except TypeError:
+                key, obj = None, None
+            if obj is not None and obj._intern_key == key:
+                return obj
 
         # Handle either str or change the behavior
         if isinstance(ten, str):
@@ -57,6 +83,8 @@ class Tensor (TensorExpr, Symbol):
                 shape = ten.shape
             if transposed is None:
                 transposed = ten.transposed
+            if symmetric is None:
+                symmetric = ten.symmetric
             rank = ten.rank
         else:
             raise ValueError("Unable to create Tensor from a %s" \
@@ -71,12 +99,36 @@ class Tensor (TensorExpr, Symbol):
             name += "'"
 
         obj = Symbol.__new__(cls, name, **kws)
+        old_attrs = getattr(obj, "_attrs", None)
         obj.rank = rank
         obj.has_inverse = has_inv
+        # Checked on every product, see is_zero and is_one.
+        obj.is_zero_tensor = name.startswith('0')
+        obj.is_one_tensor = name.startswith('1')
         obj.transposed = transposed
+        # Zero and identity matrices are their own transposes.
+        obj.symmetric = rank == 2 and \
+                        bool(symmetric or obj.is_zero_tensor or
+                             obj.is_one_tensor)
         obj._set_default_shape(shape)
+        obj._attrs = (obj.rank, obj.shape, obj.has_inverse, obj.transposed,
+                      obj.symmetric)
+        if old_attrs is not None and old_attrs != obj._attrs:
+            # The memos of expressions may hold the earlier attributes.
+            clear_expr_caches()
+        obj._intern_key = key
+        if key is not None:
+            if len(_interned) >= MAX_CACHE_SIZE:
+                _interned.clear()
+            _interned[key] = obj
         return obj
 
+    def __getnewargs__ (self):
+        # Pickling support, Symbol only knows about the name.
+        name = self.name[:-1] if self.transposed else self.name
+        return (name, self.rank, self.shape, self.has_inverse, self.transposed,
+                self.symmetric)
+
     def _set_default_shape (self, shape):
         if self.rank == 0:
             self.shape = (1, 1)
@@ -101,15 +153,20 @@ class Tensor (TensorExpr, Symbol):
              has_inverse=None, shape=None, conform_name=True):
         """Forms a new Tensor with only the listed attributes changed"""
         name = self.name if name is None else name
-        if l_ind is not None:
-            name = set_lower_ind(name, l_ind)
-        if u_ind is not None:
-            name = set_upper_ind(name, u_ind)
         rank = self.rank if rank is None else rank
-        if conform_name:
-            name = convert_name(name, rank)
+        name = _update_name(name, l_ind, u_ind, rank, conform_name)
         return Tensor(name, rank=rank, shape=shape, has_inv=has_inverse)
 
+@memoize()
+def _update_name (name, l_ind, u_ind, rank, conform_name):
+    if l_ind is not None:
+        name = set_lower_ind(name, l_ind)
+    if u_ind is not None:
+        name = set_upper_ind(name, u_ind)
+    if conform_name:
+        name = convert_name(name, rank)
+    return name
+
 class BasisVector (Tensor):
     """Unit basis vector with 1 at given position r.
 
@@ -132,6 +189,9 @@ class BasisVector (Tensor):
         obj.idx = pos_or_ten
         return obj
 
+    def __getnewargs__ (self):
+        return (self.idx, )
+
     @call_highest_priority('__rmul__')
     def __mul__ (self, other):
         print "Inside BasisVector.__mul__"
@@ -1,8 +1,10 @@
 import operator
 
-from sympy import Add, Expr, Number, Mul, Pow, S, Symbol
+from sympy import Add, Basic, Expr, Number, Mul, Pow, S, Symbol
 from sympy.core.decorators import call_highest_priority
 
+from ....utils.instrument import count, profiled
+
 # from tensor import Tensor /* cyclic */
 # from functions import Inner, Inverse, Transpose /* cyclic */
 
@@ -28,52 +30,69 @@ class TensorExpr (Expr):
     shape = None
     is_symmetric = True
 
-    def __mul_by_one (self, other):
+    def __mul_by_one (self, other, self_rank, other_rank):
         self_is_one = is_one(self)
         other_is_one = is_one(other)
         if self_is_one or other_is_one:
-            ers = expr_rank(self)
-            ero = expr_rank(other)
-            if ers == ero == 2:
+            if self_rank == other_rank == 2:
                 return other if self_is_one else self
-            if self_is_one and ers == 0:
+            if self_is_one and self_rank == 0:
                 return other
-            if other_is_one and ero == 0:
+            if other_is_one and other_rank == 0:
                 return self
 
+    def __mul_checks (self, a, b):
+        """Returns the simplified a*b, where self is a or b, or None if the
+        product is left to Mul.
+
+        The ranks and shapes of a and b are found once and shared by the
+        checks, which are done in this order: conformity, zero factors,
+        inner products and factors of one.
+        """
+        rank_a, shape_a = _rank_shape(a)
+        rank_b, shape_b = _rank_shape(b)
+        if shape_a != (1, 1) and shape_b != (1, 1) and shape_a[1] != shape_b[0]:
+            is_mul_conforming_or_die(a, b)
+        if is_zero(a) or is_zero(b):
+            if rank_a == rank_b == 1 and shape_a[1] == shape_b[0] == 1 and \
+               shape_a[0] == shape_b[1]:
+                rank = 2
+            elif rank_a == 0 or rank_b == 0:
+                rank = max(rank_a, rank_b)
+            else:
+                rank = rank_a + rank_b - 2
+            return Tensor('0', rank=rank)
+        if rank_a == rank_b == 1 and shape_a[0] == shape_b[1] == 1 and \
+           shape_a[1] == shape_b[0]:
+            return Inner(a, b)
+        if a is self:
+            return self.__mul_by_one(b, rank_a, rank_b)
+        return self.__mul_by_one(a, rank_b, rank_a)
+
     @call_highest_priority('__rmul__')
     def __mul__ (self, other):
-        is_mul_conforming_or_die(self, other)
-        if is_zero(self) or is_zero(other):
-            return Tensor('0', rank=mul_rank(self, other))
-        if is_inner(self, other):
-            return Inner(self, other)
-        mul_by_one = self.__mul_by_one(other)
-        if mul_by_one is not None:
-            return mul_by_one
+        simple = self.__mul_checks(self, other)
+        if simple is not None:
+            return simple
 
         # Check for inverse multiplying
         self_rank = self.rank
         if self_rank not in [0,2]:
             pass
         elif isinstance(other, Mul):
-            self_inv = isinstance(self, Inverse)
-            inv_idx = 0
-            while inv_idx < len(other.args):
-                # Skip numbers, constants, or symbols
-                if not isinstance(other.args[inv_idx], TensorExpr):
-                    pass
-                elif (self_inv and self.args[0] == other.args[inv_idx]) or \
-                     (not self_inv and isinstance(other.args[inv_idx], Inverse) \
-                      and self == other.args[inv_idx].args[0]):
-                    break
-                elif self_rank == 2:
-                    # For rank 2 skip rank 0 objects otherwise break without inv
-                    if other.args[inv_idx].rank != 0:
-                        inv_idx = len(other.args)
-                        break
-                inv_idx += 1
-            if inv_idx < len(other.args):
+            index = _inverse_index(other)
+            if isinstance(self, Inverse):
+                inv_idx = index.positions.get(self.args[0])
+                if inv_idx is not None and \
+                   not isinstance(other.args[inv_idx], TensorExpr):
+                    inv_idx = None
+            else:
+                inv_idx = index.inverses.get(self)
+            # A matrix only cancels up to the first non-scalar factor.
+            if self_rank == 2 and inv_idx is not None and \
+               inv_idx > index.first_non_scalar:
+                inv_idx = None
+            if inv_idx is not None:
                 return reduce(operator.mul, other.args[:inv_idx] + \
                     (Tensor('1', self_rank), ) + other.args[inv_idx+1:])
         elif (isinstance(self, Inverse) and self.args[0] == other) or \
@@ -83,14 +102,9 @@ class TensorExpr (Expr):
 
     @call_highest_priority('__mul__')
     def __rmul__ (self, other):
-        is_mul_conforming_or_die(other, self)
-        if is_zero(self) or is_zero(other):
-            return Tensor('0', rank=mul_rank(other, self))
-        if is_inner(other, self):
-            return Inner(other, self)
-        mul_by_one = self.__mul_by_one(other)
-        if mul_by_one is not None:
-            return mul_by_one
+        simple = self.__mul_checks(other, self)
+        if simple is not None:
+            return simple
 
         # Check for inverse multiplying
         self_rank = self.rank
@@ -102,16 +116,14 @@ class TensorExpr (Expr):
             return reduce(operator.mul, other.args[:-1] + \
                           (Tensor('1', self_rank), ))
         elif self_rank == 0:
+            index = _inverse_index(other)
             if isinstance(self, Inverse):
-                for n in xrange(len(other.args)):
-                    if self.args[0] == other.args[n]:
-                        return reduce(operator.mul, other.args[:n] + \
-                                      (Tensor('1', self_rank), ) + other.args[n+1:])
+                n = index.positions.get(self.args[0])
             else:
-                for n in xrange(len(other.args)):
-                    if isinstance(other.args[n], Inverse) and self == other.args[n].args[0]:
-                        return reduce(operator.mul, other.args[:n] + \
-                                      (Tensor('1', self_rank), ) + other.args[n+1:])
+                n = index.inverses.get(self)
+            if n is not None:
+                return reduce(operator.mul, other.args[:n] + \
+                              (Tensor('1', self_rank), ) + other.args[n+1:])
         return super(TensorExpr, self).__rmul__(other)
 
     @call_highest_priority('__radd__')
@@ -191,21 +203,90 @@ class TensorExpr (Expr):
 def is_zero (expr):
     """Returns True, False, or None"""
     if isinstance(expr, Tensor):
-        return expr.name.startswith('0')
+        return expr.is_zero_tensor
     if isinstance(expr, Transpose):
         return is_zero(expr.args[0])
+    if isinstance(expr, Basic) and not expr.is_Number:
+        return None
     if expr == S(0):
         return True
 
 def is_one (expr):
     """Returns True, False, or None"""
     if isinstance(expr, Tensor):
-        return expr.name.startswith('1')
+        return expr.is_one_tensor
     if isinstance(expr, Transpose):
         return is_one(expr.args[0])
+    if isinstance(expr, Basic) and not expr.is_Number:
+        return None
     if expr == S(1):
         return True
 
+def _rank_shape (expr):
+    """Returns (expr_rank(expr), expr_shape(expr)) without walking a
+    product twice."""
+    if isinstance(expr, Tensor):
+        return expr.rank, expr.shape
+    if isinstance(expr, Mul):
+        shape = expr_shape(expr)
+        return sum(map(lambda x: x != 1, shape)), shape
+    shape = expr_shape(expr)
+    return expr_rank(expr), shape
+
+class InverseIndex (object):
+    """Where the factors of a product are, for cancelling inverses.
+
+    positions maps each factor to its first position and inverses maps x
+    to the first position of an Inverse(x) factor.  first_non_scalar is the
+    position of the first tensor factor of non-zero rank, or the number of
+    factors if there is none.
+    """
+
+    __slots__ = ("positions", "inverses", "first_non_scalar")
+
+    def __init__ (self, args):
+        self.positions = {}
+        self.inverses = {}
+        self.first_non_scalar = len(args)
+        for n, arg in enumerate(args):
+            self.positions.setdefault(arg, n)
+            if not isinstance(arg, TensorExpr):
+                continue
+            if isinstance(arg, Inverse):
+                self.inverses.setdefault(arg.args[0], n)
+            if n < self.first_non_scalar and arg.rank != 0:
+                self.first_non_scalar = n
+
+# Functions emptying the memos keyed on expressions, whose values depend on
+# the attributes of the tensors in them.  Tensors with the same name are
+# equal, so the memos are emptied when a tensor is redefined with other
+# attributes, see Tensor.
+_expr_cache_clearers = []
+
+def register_expr_cache (clear_fun):
+    """Registers clear_fun, called to empty a memo keyed on expressions when
+    a tensor is redefined.  Returns clear_fun."""
+    _expr_cache_clearers.append(clear_fun)
+    return clear_fun
+
+def clear_expr_caches ():
+    """Empties every memo registered with register_expr_cache."""
+    for clear_fun in _expr_cache_clearers:
+        clear_fun()
+
+# Inverse indices of recent products, cleared when it grows past the limit.
+MAX_INDEX_CACHE_SIZE = 10000
+_index_cache = {}
+register_expr_cache(_index_cache.clear)
+
+def _inverse_index (mul):
+    index = _index_cache.get(mul)
+    if index is None:
+        if len(_index_cache) > MAX_INDEX_CACHE_SIZE:
+            _index_cache.clear()
+        index = _index_cache[mul] = InverseIndex(mul.args)
+    return index
+
 def is_outer (a, b):
     esa = expr_shape(a)
     esb = expr_shape(b)
@@ -247,10 +328,37 @@ def mul_rank (a, b):
         return max(era, erb)
     return era + erb - 2
 
+# Memoized ranks and shapes of expressions, each cleared when it grows past
+# the limit.  Zero turns the memo off.
+MAX_RANK_CACHE_SIZE = 100000
+_rank_cache = {}
+_shape_cache = {}
+
+@register_expr_cache
+def clear_rank_cache ():
+    """Empties the memo of expr_rank and expr_shape."""
+    _rank_cache.clear()
+    _shape_cache.clear()
+
+def _memoized (cache, fun, expr, name):
+    if not isinstance(expr, Basic) or MAX_RANK_CACHE_SIZE <= 0:
+        return fun(expr)
+    try:
+        ret_val = cache[expr]
+    except KeyError:
+        ret_val = fun(expr)
+        if len(cache) >= MAX_RANK_CACHE_SIZE:
+            cache.clear()
+        cache[expr] = ret_val
+        return ret_val
+    count(name)
+    return ret_val
+
 def expr_shape(expr):
     """Returns the shape of a given expression
 
-    Will raise ConformityError if expression does not conform.
+    Will raise ConformityError if expression does not conform.  Expressions
+    are immutable so their shapes are memoized, see clear_rank_cache.
 
     >>> A = Tensor('A', rank=2)
     >>> B = Tensor('B', rank=2)
@@ -263,6 +371,12 @@ def expr_shape(expr):
     ---------------------------------------------------------------------------
     ConformityError                           Traceback (most recent call last)
     """
+    if isinstance(expr, Tensor):
+        return expr.shape
+    return _memoized(_shape_cache, _expr_shape, expr, "expr_shape.cache_hits")
+
+@profiled("expr_shape")
+def _expr_shape(expr):
     if isinstance(expr, TensorExpr):
         return expr.shape
     if isinstance(expr, (Number, Symbol, int, long, float)):
@@ -286,7 +400,8 @@ def expr_shape(expr):
 def expr_rank(expr):
     """Returns the rank of a given expression
 
-    Will raise ConformityError if expression does not conform.
+    Will raise ConformityError if expression does not conform.  Memoized
+    like expr_shape.
 
     >>> A = Tensor('A', rank=2)
     >>> B = Tensor('B', rank=2)
@@ -299,7 +414,12 @@ def expr_rank(expr):
     ---------------------------------------------------------------------------
     ConformityError                           Traceback (most recent call last)
     """
+    if isinstance(expr, Tensor):
+        return expr.rank
+    return _memoized(_rank_cache, _expr_rank, expr, "expr_rank.cache_hits")
 
+@profiled("expr_rank")
+def _expr_rank(expr):
     if isinstance(expr, TensorExpr):
         return expr.rank
     if isinstance(expr, (Number, int, float)):
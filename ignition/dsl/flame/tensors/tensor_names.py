@@ -1,5 +1,7 @@
 """Module for manipulating tensor names according to Householder notation"""
 
+from ....utils.cache import memoize
+
 RM_2_GREEK = {"a":"alpha", "b":"beta", "c":"gamma", "d":"delta",
             "e":"epsilon", "h":"eta", "i":"iota", "k":"kappa", "l":"lambda",
             "m":"mu", "n":"nu", "o":"omicron", "p":"pi", "r":"rho",
@@ -15,6 +17,7 @@ INV_TOK = '-'
 UP_TOKS = [TRANS_TOK, HAT_TOK, INV_TOK]
 
 
+@memoize()
 def split_name (name):
     """Returns base, lower, upper strings of name"""
     def _find (n, s):
@@ -103,6 +106,7 @@ def add_upper_ind (name, ind):
     u += ind
     return join_name(base, l, ''.join(sorted(u)))
 
+@memoize()
 def set_upper_ind (name, ind):
     base, l, _ = split_name(name)
     return join_name(base, l, ind)
@@ -114,6 +118,7 @@ def add_lower_ind (name, ind):
     l += ind
     return join_name(base, ''.join(sorted(l)), u)
 
+@memoize()
 def set_lower_ind (name, ind):
     base, _, u = split_name(name)
     return join_name(base, ind, ''.join(sorted(u)))
@@ -127,6 +132,7 @@ def hat_name (name):
 def inv_name (name):
     return add_upper_ind(name, INV_TOK)
 
+@memoize()
 def householder_name (name, rank):
     """Returns if the name conforms to Householder notation.
     
@@ -149,6 +155,7 @@ def householder_name (name, rank):
             return True
     return False
 
+@memoize()
 def convert_name (name, rank):
     """Converts a Householder name to a specific rank. 
     
@@ -203,6 +210,7 @@ def convert_name (name, rank):
                 return r_1
     raise ValueError("Unable to convert name: %s." % name)
 
+@memoize()
 def rank_from_name (name):
     base, _, _ = split_name(name)
     if len(base) == 1 and base.isalpha():
@@ -0,0 +1,33 @@
+from ignition.dsl.flame.tensors import (canonical_hash, canonical_key, Inverse,
+                                        T, Tensor)
+from ignition.dsl.flame.tensors.canonical import sol_dict_key, unique_exprs
+
+def test_canonical_key ():
+    x, y = map(lambda n: Tensor(n, rank=1), 'xy')
+    a, b = map(lambda n: Tensor(n, rank=0), 'ab')
+    A = Tensor('A', rank=2, has_inv=True, symmetric=True)
+    assert(canonical_key(T(x)*y) == canonical_key(T(y)*x))
+    assert(canonical_key(T(x)*A*y) == canonical_key(T(y)*A*x))
+    assert(canonical_key(a*b*x) == canonical_key(b*a*x))
+    assert(canonical_key(a*x + a*x) == canonical_key(2*a*x))
+    assert(canonical_key(T(a*x + A*y)) == canonical_key(a*T(x) + T(y)*A))
+    assert(canonical_key(T(Inverse(A))) == canonical_key(Inverse(T(A))))
+    assert(canonical_key(a*x) != canonical_key(b*x))
+    assert(canonical_key(A*x) != canonical_key(T(x)*A))
+    assert(canonical_hash(T(x)*y) == canonical_hash(T(y)*x))
+
+def test_unique_exprs ():
+    x, y = map(lambda n: Tensor(n, rank=1), 'xy')
+    a = Tensor('a', rank=0)
+    assert(unique_exprs([T(x)*y, a, T(y)*x, a]) == [T(x)*y, a])
+    assert(sol_dict_key({a: set([T(x)*y])}) == \
+           sol_dict_key({a: set([T(y)*x])}))
+
+def test_nonsymmetric ():
+    x, b = map(lambda n: Tensor(n, rank=1), 'xb')
+    M = Tensor('M', rank=2)
+    assert(canonical_key(T(M)*x) != canonical_key(M*x))
+    assert(canonical_key(M*x*T(b)) != canonical_key(b*T(x)*T(M)))
+    assert(canonical_key(M*x*T(b)) == canonical_key(T(b*T(x)*T(M))))
+    assert(unique_exprs([M*x - b, T(M)*x - b]) == [M*x - b, T(M)*x - b])
+    assert(sol_dict_key({x: M*b}) != sol_dict_key({x: T(M)*b}))
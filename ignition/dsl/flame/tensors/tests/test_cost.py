@@ -0,0 +1,24 @@
+from ignition.dsl.flame.tensors import Inverse, T, Tensor
+from ignition.dsl.flame.tensors.cost import (expr_flops, expr_reads,
+                                             update_cost)
+
+def test_expr_flops ():
+    A = Tensor('A', rank=2, has_inv=True)
+    p, r = map(lambda x: Tensor(x, rank=1), 'pr')
+    delta = Tensor('delta', rank=0)
+    assert(expr_flops(A * p, 10) == 200)
+    assert(expr_flops(T(p) * A * p, 10) == 220)
+    assert(expr_flops(r - delta * A * p, 10) == 220)
+    assert(expr_flops(A * A * p, 10) == 2200)
+    assert(expr_flops(Inverse(A), 10) == 1000)
+    assert(expr_flops(Inverse(T(p) * r), 10) == 21)
+    assert(expr_reads(r - delta * A * p, 10) == 121)
+
+def test_update_cost ():
+    A = Tensor('A', rank=2)
+    p, r, x = map(lambda n: Tensor(n, rank=1), 'prx')
+    delta = Tensor('delta', rank=0)
+    # Only the cheapest alternative is counted.
+    cheap = {x: set([x + delta * p, r + delta * A * p]), delta: set()}
+    assert(update_cost(cheap, 10) == 20 + 21 + 10)
+    assert(update_cost({x: r + delta * A * p}, 10) > update_cost(cheap, 10))
@@ -0,0 +1,65 @@
+from ignition.dsl.flame.tensors import Inverse, T, Tensor
+from ignition.dsl.flame.tensors.cost import update_cost
+from ignition.dsl.flame.tensors.cse import tensor_cse, update_cse
+
+def test_tensor_cse ():
+    A, B = map(lambda x: Tensor(x, rank=2, symmetric=True), 'AB')
+    p, r = map(lambda x: Tensor(x, rank=1), 'pr')
+    delta = Tensor('delta', rank=0)
+    temps, exprs = tensor_cse([r - delta * A * p, T(p) * A * p], dim=10,
+                              min_flops=10)
+    assert(len(temps) == 1)
+    tmp, expr = temps[0]
+    assert(expr == A * p)
+    assert(tmp.rank == 1)
+    assert(exprs[0] == r - delta * tmp)
+    assert(A not in exprs[1].atoms())
+    # Only contiguous pieces of products are shared.
+    temps, exprs = tensor_cse([A * B * p, B * A * p], dim=10, min_flops=10)
+    assert(temps == [])
+    # Cheap scalar products are left alone.
+    temps, exprs = tensor_cse([delta * delta * p, delta * delta * r],
+                              dim=10, min_flops=10)
+    assert(temps == [])
+
+def test_nonsymmetric ():
+    M = Tensor('M', rank=2)
+    p, r = map(lambda x: Tensor(x, rank=1), 'pr')
+    delta = Tensor('delta', rank=0)
+    # T(p)*M is the transpose of T(M)*p, not of M*p.
+    temps, exprs = tensor_cse([r - delta * M * p, T(p) * M * p], dim=10,
+                              min_flops=10)
+    assert(temps == [])
+    temps, exprs = tensor_cse([r - delta * T(M) * p, T(p) * M * p], dim=10,
+                              min_flops=10)
+    assert(len(temps) == 1)
+    tmp, expr = temps[0]
+    assert(expr == T(M) * p)
+    assert(exprs == [r - delta * tmp, T(tmp) * p])
+
+def test_update_cse ():
+    A = Tensor('A', rank=2, symmetric=True)
+    p_1, p_2, r_1, r_2, x_1, x_2 = map(lambda x: Tensor(x, rank=1),
+                                       ['p_1', 'p_2', 'r_1', 'r_2',
+                                        'x_1', 'x_2'])
+    delta_1, mu_12 = map(lambda x: Tensor(x, rank=0), ['delta_1', 'mu_12'])
+    delta_sol = (T(r_1) * r_1) * Inverse(T(r_1) * A * p_1)
+    sol_dict = {delta_1: set([delta_sol]),
+                r_2: set([r_1 - delta_1 * A * p_1]),
+                x_2: set([x_1 + delta_sol * p_1]),
+                mu_12: set([(T(p_1) * A * r_2) * Inverse(T(p_1) * A * p_1)]),
+                p_2: set([r_2 - mu_12 * p_1])}
+    order = [p_2, mu_12, r_2, x_2, delta_1]
+    new_dict, new_order, temps = update_cse(sol_dict, order)
+    assert(len(temps) == 1)
+    tmp, expr = temps[0]
+    assert(expr == A * p_1)
+    assert(new_dict[tmp] == set([expr]))
+    # Computed once, before its first use.
+    assert(new_order[-1] == tmp)
+    for unk in sol_dict:
+        assert(A not in list(new_dict[unk])[0].atoms())
+    # The repeated step length is reused instead of recomputed.
+    assert(new_dict[x_2] == set([x_1 + delta_1 * p_1]))
+    assert(new_order.index(delta_1) > new_order.index(x_2))
+    assert(update_cost(new_dict) < update_cost(sol_dict))
@@ -0,0 +1,43 @@
+from sympy import expand, S
+
+from ignition.dsl.flame.tensors import Inner, Inverse, T, Tensor
+from ignition.dsl.flame.tensors.expand import clear_expand_cache, \
+    is_expanded, tensor_expand
+
+
+A = Tensor('A', rank=2, has_inv=True)
+B = Tensor('B', rank=2, has_inv=True)
+p_1, r_1, x = map(lambda n: Tensor(n, rank=1), ['p_1', 'r_1', 'x'])
+alpha, delta = Tensor('alpha', rank=0), Tensor('delta', rank=0)
+
+def test_non_commutative ():
+    expr = (A + delta*B)*(p_1 - r_1)
+    assert(tensor_expand(expr) == A*p_1 - A*r_1 + delta*B*p_1 - delta*B*r_1)
+    assert(tensor_expand(B*(A + B)) != tensor_expand((A + B)*B))
+
+def test_inner ():
+    expr = Inner(T(p_1), A*(r_1 - alpha*x))
+    assert(tensor_expand(expr) == \
+           Inner(T(p_1), A*r_1) - alpha*Inner(T(p_1), A*x))
+
+def test_transpose ():
+    assert(tensor_expand(T(A*p_1 + delta*r_1)) == \
+           T(p_1)*T(A) + delta*T(r_1))
+
+def test_inverse ():
+    assert(tensor_expand(Inverse(A*B)) == Inverse(B)*Inverse(A))
+
+def test_same_as_sympy ():
+    exprs = [(A + delta*B)*(p_1 - r_1), T(r_1)*(r_1 + delta*p_1),
+             (alpha + delta)**2*p_1, x - (T(r_1)*r_1)*Inverse(T(p_1)*A*p_1)*p_1]
+    for expr in exprs:
+        assert(tensor_expand(expr) == expand(expr))
+
+def test_expanded_flag ():
+    clear_expand_cache()
+    expr = A*(p_1 + r_1)
+    assert(not is_expanded(expr))
+    new_expr = tensor_expand(expr)
+    assert(is_expanded(new_expr))
+    assert(tensor_expand(new_expr) == new_expr)
+    assert(is_expanded(S(2)) and is_expanded(p_1))
@@ -0,0 +1,54 @@
+from sympy import S
+
+from ignition.dsl.flame.tensors import Inverse, T, Tensor
+from ignition.dsl.flame.tensors.canonical import canonical_key
+from ignition.dsl.flame.tensors.expand import tensor_expand
+from ignition.dsl.flame.tensors.polynomial import TensorPoly
+
+
+A = Tensor('A', rank=2, has_inv=True)
+p_1, q_1, r_1 = map(lambda n: Tensor(n, rank=1), ['p_1', 'q_1', 'r_1'])
+alpha, delta = Tensor('alpha', rank=0), Tensor('delta', rank=0)
+
+def test_round_trip ():
+    expr = r_1 - delta*A*p_1 + alpha*delta*A*p_1 + A*A*q_1
+    poly = TensorPoly.from_expr(expr)
+    assert(poly.terms[(A, p_1)] == alpha*delta - delta)
+    assert(poly.terms[(A, A, q_1)] == S(1))
+    assert(poly.as_expr() == tensor_expand(expr))
+    assert(S(poly) == poly.as_expr())
+    assert(poly == TensorPoly.from_expr(poly.as_expr()))
+    assert(hash(poly) == hash(poly.as_expr()))
+
+def test_atoms ():
+    poly = TensorPoly.from_expr(r_1 - delta*(T(p_1)*q_1)*A*p_1)
+    assert(poly.atoms() == set([r_1, delta, p_1, q_1, A, S(-1)]))
+    assert(q_1 in poly and alpha not in poly)
+
+def test_subs ():
+    poly = TensorPoly.from_expr(r_1 - delta*A*p_1)
+    new = poly.subs(p_1, Inverse(A)*q_1 + alpha*r_1)
+    assert(new.as_expr() == tensor_expand(r_1 - delta*q_1 - \
+                                          delta*alpha*A*r_1))
+    assert(poly.subs(alpha, delta) is poly)
+    scalar = TensorPoly.from_expr(T(r_1)*r_1 - delta*(T(p_1)*q_1))
+    assert(scalar.subs(delta, alpha + delta) == \
+           TensorPoly.from_expr(T(r_1)*r_1 - alpha*(T(p_1)*q_1) - \
+                                delta*(T(p_1)*q_1)))
+
+def test_eliminate ():
+    poly = TensorPoly.from_expr(r_1 - delta*(T(p_1)*q_1)*A*p_1 + \
+                                (T(p_1)*A*q_1)*delta*p_1)
+    assert(poly.eliminate([T(p_1)*q_1]) == \
+           TensorPoly.from_expr(r_1 + (T(p_1)*A*q_1)*delta*p_1))
+    assert(poly.eliminate([delta*A*p_1]) == \
+           TensorPoly.from_expr(r_1 + (T(p_1)*A*q_1)*delta*p_1))
+    assert(poly.eliminate([T(r_1)*q_1]) is poly)
+
+def test_arithmetic ():
+    x = TensorPoly.from_expr(p_1 + delta*q_1)
+    y = TensorPoly.from_expr(Inverse(A) - alpha*A)
+    assert(canonical_key(y*x) == canonical_key(tensor_expand(
+        (Inverse(A) - alpha*A)*(p_1 + delta*q_1))))
+    assert(x - x == S(0))
+    assert(x + x == TensorPoly.from_expr(2*p_1 + 2*delta*q_1))
@@ -0,0 +1,43 @@
+from sympy import S
+
+from ignition.dsl.flame.tensors import Inverse, T, Tensor
+from ignition.dsl.flame.tensors.basic_operators import Inner, Transpose
+from ignition.dsl.flame.tensors.rewrite import RewriteEngine, rewrite
+
+
+A = Tensor('A', rank=2, has_inv=True)
+p_1, r_1 = Tensor('p_1', rank=1), Tensor('r_1', rank=1)
+delta = Tensor('delta', rank=0)
+Zero = Tensor('0', rank=2)
+One = Tensor('1', rank=2)
+
+def test_cancel_inverses():
+    assert(rewrite(delta*Inverse(delta)*p_1) == p_1)
+    assert(rewrite(Inverse(A)*A*p_1) == p_1)
+    assert(rewrite(A*Inverse(A)) == One)
+
+def test_transpose():
+    assert(rewrite(T(T(r_1))) == r_1)
+    assert(rewrite(T(Zero)) == Zero)
+
+def test_inner_symmetry():
+    assert(rewrite(T(r_1)*p_1) == rewrite(T(p_1)*r_1))
+
+def test_absorb():
+    assert(rewrite(One*A*p_1) == A*p_1)
+    assert(rewrite(Zero*p_1 + r_1) == r_1)
+    assert(rewrite(T(Tensor('0', rank=1))*p_1) == Tensor('0', rank=0))
+
+def test_constraints():
+    expr = delta*(T(r_1)*p_1)*A*p_1 + r_1
+    assert(rewrite(expr, zeros=[T(p_1)*r_1]) == r_1)
+    assert(rewrite(expr, zeros=[T(p_1)*A*r_1]) == rewrite(expr))
+
+def test_add_rule():
+    def swap_transpose (expr, zeros):
+        if expr.args[0] == r_1:
+            return p_1
+    engine = RewriteEngine()
+    engine.add_rule(Transpose, swap_transpose)
+    assert(engine.rewrite(T(r_1) + T(p_1)) == p_1 + T(p_1))
+    assert(engine.rewrite(T(T(r_1))) == r_1)
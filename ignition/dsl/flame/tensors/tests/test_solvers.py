@@ -1,9 +1,15 @@
 from sympy import S
+from sympy.utilities.pytest import raises
 
 from ignition.dsl.flame.tensors import (expr_rank, expr_shape, solve_vec_eqn,
                                     T, Tensor, Transpose)
 from ignition.dsl.flame.tensors.solvers import (all_back_sub, assump_solve,
-    backward_sub, branching_assump_solve, forward_solve, sol_without_recomputes)
+    AtomIndex, backward_sub, BackSubTrie, branching_assump_solve,
+    build_assump_stack, clear_solve_cache, forward_solve, solve_cache_info,
+    sol_without_recomputes, StructuralOrderCheck, tensor_solver)
+from ignition.dsl.flame.tensors import solvers
+from ignition.dsl.flame.tensors.polynomial import TensorPoly
+from ignition.utils.instrument import Profiler
 
 def test_backward_sub():
     q, r, s = map(lambda x: Tensor(x, rank=1), 'qrs')
@@ -286,3 +292,149 @@ def test_sol_without_recomputes ():
     sol_dict = {a: set([b + c*d, b*d]), b: set([c*d])}
     ord_unk = [a, b]
     assert(sol_without_recomputes((sol_dict, ord_unk)) == (sol_dict, ord_unk))
+
+def test_back_sub_trie ():
+    q, r, s = map(lambda x: Tensor(x, rank=1), 'qrs')
+    delta = Tensor('delta', rank=0)
+    eqns = [r - s - q * delta, T(s) * r]
+    trie = BackSubTrie()
+    sol = backward_sub(eqns, [q, s], [r, delta], True, trie=trie)
+    assert(sol[0] is not None)
+    assert(len(trie) == 2)
+    assert(backward_sub(eqns, [q, s], [r, delta], True, trie=trie) == sol)
+    assert(backward_sub(eqns, [q, s], [delta, r], True, trie=trie) == \
+           (None, delta))
+    assert(len(trie) == 0)
+
+def test_parallel_all_back_sub ():
+    q, r, s = map(lambda x: Tensor(x, rank=1), 'qrs')
+    delta = Tensor('delta', rank=0)
+    eqns = [r - s - q * delta, T(s) * r]
+    serial_sols = all_back_sub(eqns, [q, s], multiple_sols=True)
+    parallel_sols = all_back_sub(eqns, [q, s], multiple_sols=True,
+                                 num_procs=2)
+    assert(len(serial_sols) > 0)
+    assert(parallel_sols == serial_sols)
+
+def test_parallel_branching_assump_solve ():
+    q, r, s = map(lambda x: Tensor(x, rank=1), 'qrs')
+    delta = Tensor('delta', rank=0)
+    eqns = [r - s - q * delta, T(s) * r]
+    assert(build_assump_stack(eqns, [q, s], num_procs=2) == \
+           build_assump_stack(eqns, [q, s]))
+    found = []
+    serial_sols = branching_assump_solve(eqns, [q, s])
+    parallel_sols = branching_assump_solve(eqns, [q, s], num_procs=2,
+                                           sol_callback=found.append)
+    assert(len(serial_sols) > 0)
+    assert(parallel_sols == serial_sols)
+    assert(found == parallel_sols)
+
+def test_structural_order_check ():
+    q, r, s = map(lambda x: Tensor(x, rank=1), 'qrs')
+    delta = Tensor('delta', rank=0)
+    eqns = [r - s - q * delta, T(s) * r]
+    check = StructuralOrderCheck(eqns, [q, s])
+    # delta can only come from the scalar equation, which needs r first.
+    assert(check([delta, r]) == 0)
+    assert(check([r, delta]) is None)
+    assert(all_back_sub(eqns, [q, s], multiple_sols=True) == \
+           all_back_sub(eqns, [q, s], multiple_sols=True, prune_orders=False))
+
+def test_backward_sub_index ():
+    q, r, s, x, y = map(lambda n: Tensor(n, rank=1), 'qrsxy')
+    delta = Tensor('delta', rank=0)
+    eqns = [r - s - q * delta, T(s) * r, x - q, y - s]
+    index = AtomIndex(eqns)
+    assert(index.containing([r]) == set(eqns[:2]))
+    assert(index.containing([q, s]) == set(eqns[:1]))
+    stats = []
+    sol = backward_sub(eqns, [q, s], [x, r, delta, y], True, stats=stats)
+    assert(sol[0] is not None)
+    assert(sol == backward_sub(eqns, [q, s], [x, r, delta, y], True))
+    assert([st[0] for st in stats] == [x, r, delta, y])
+    # y - s is left alone once it has been through a step.
+    assert(stats[1][1:3] == (3, 1))
+
+def test_backward_sub_poly ():
+    q, r, s, x, y = map(lambda n: Tensor(n, rank=1), 'qrsxy')
+    delta = Tensor('delta', rank=0)
+    eqns = [r - s - q * delta, T(s) * r, x - q, y - s]
+    for order in [[x, r, delta, y], [delta, r, y, x], [r, delta, x, y]]:
+        assert(backward_sub(eqns, [q, s], order, True, poly=True) == \
+               backward_sub(eqns, [q, s], order, True))
+    assert(all_back_sub(eqns, [q, s], multiple_sols=True, poly=True) == \
+           all_back_sub(eqns, [q, s], multiple_sols=True))
+
+def test_forward_solve_poly ():
+    q, r, s = map(lambda x: Tensor(x, rank=1), 'qrs')
+    delta = Tensor('delta', rank=0)
+    eqns = [s + q, delta * r - q]
+    assert(forward_solve(map(TensorPoly.from_expr, eqns), [delta, r]) == \
+           forward_solve(eqns, [delta, r]))
+
+def test_solve_cache ():
+    q, r, s = map(lambda x: Tensor(x, rank=1), 'qrs')
+    delta = Tensor('delta', rank=0)
+    clear_solve_cache()
+    sol = solve_vec_eqn(r - s - q * delta, r)
+    assert(solve_vec_eqn(r - s - q * delta, r) == sol)
+    assert(solve_cache_info()[:2] == (1, 1))
+    # Failures are cached too.
+    raises(ValueError, "solve_vec_eqn(T(r) * r, r)")
+    raises(ValueError, "solve_vec_eqn(T(r) * r, r)")
+    assert(solve_cache_info()[:2] == (2, 2))
+    # Except RuntimeError, which depends on the depth of the stack.
+    def _deep (eqn, var):
+        raise RuntimeError("maximum recursion depth exceeded")
+    old_solve = solvers._solve_vec_eqn
+    solvers._solve_vec_eqn = _deep
+    try:
+        raises(RuntimeError, "solve_vec_eqn(s - q, q)")
+        raises(RuntimeError, "solve_vec_eqn(s - q, q)")
+    finally:
+        solvers._solve_vec_eqn = old_solve
+    assert(solve_cache_info()[:2] == (2, 4))
+    assert(solve_vec_eqn(s - q, q) == s)
+
+def test_bounded_all_back_sub ():
+    q, r, s = map(lambda x: Tensor(x, rank=1), 'qrs')
+    delta = Tensor('delta', rank=0)
+    eqns = [r - s - q * delta, T(s) * r]
+    found = []
+    sols = all_back_sub(eqns, [q, s], multiple_sols=True, max_sols=1,
+                        sol_callback=lambda *sol: found.append(sol))
+    assert(len(sols) == 1)
+    assert(found == sols)
+    assert(all_back_sub(eqns, [q, s], multiple_sols=True, time_budget=0) == [])
+    assert(all_back_sub(eqns, [q, s], multiple_sols=True, cheapest=1) == \
+           all_back_sub(eqns, [q, s], multiple_sols=True)[:1])
+
+def test_tensor_solver_profile ():
+    q, r, s = map(lambda x: Tensor(x, rank=1), 'qrs')
+    delta = Tensor('delta', rank=0)
+    prof = Profiler()
+    sols = tensor_solver([], [r - s - q * delta, T(s) * r], [q, s],
+                         verbose=False, profile=prof, cse=True)
+    assert(len(sols) == 1)
+    report = prof.report()
+    assert(report["counters"]["orders.tested"] > 0)
+    assert(report["counters"]["orders.succeeded"] > 0)
+    for phase in ["tensor_solver", "all_back_sub", "backward_sub",
+                  "solve_vec_eqn", "tensor_expand", "cse"]:
+        assert(report["timers"][phase]["calls"] > 0)
+
+def test_tensor_solver_progress ():
+    q, r, s = map(lambda x: Tensor(x, rank=1), 'qrs')
+    delta = Tensor('delta', rank=0)
+    events = []
+    sols = tensor_solver([], [r - s - q * delta, T(s) * r], [q, s],
+                         verbose=False,
+                         progress=lambda e, p: events.append((e, p)))
+    assert(len(sols) == 1)
+    names = [e for e, _ in events]
+    assert(names[0] == "start" and names[-1] == "done")
+    assert(names.count("solution") == 1)
+    payload = dict(events)["solution"]
+    assert(set(payload["sol_dict"]) == set([r, delta]))
+    assert(dict(events)["done"]["returned"] == 1)
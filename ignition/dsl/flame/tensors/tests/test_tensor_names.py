@@ -1,5 +1,7 @@
+from sympy.utilities.pytest import raises
 from ignition.dsl.flame.tensors.tensor_names import (convert_name,
-    add_lower_ind, add_upper_ind, set_lower_ind, set_upper_ind, to_latex)
+    add_lower_ind, add_upper_ind, set_lower_ind, set_upper_ind, split_name,
+    to_latex)
 
 def test_convert_name():
     assert(convert_name("A", 2) == "A")
@@ -27,3 +29,12 @@ def test_inds():
 def test_to_latex():
     assert(to_latex("A_01^T") == "A_{01}^T")
     assert(to_latex("alpha") == "\\alpha")
+
+def test_name_cache():
+    split_name.cache.clear()
+    assert(split_name("A_01^T") == ("A", "01", "T"))
+    assert(split_name.cache.keys() == [("A_01^T",)])
+    assert(split_name("A_01^T") == ("A", "01", "T"))
+    # Errors are not remembered.
+    raises(ValueError, 'convert_name("theta", 1)')
+    assert(("theta", 1) not in convert_name.cache)
@@ -1,7 +1,12 @@
-from sympy import S, Symbol
+from sympy import Mul, S, Symbol
 from sympy.utilities.pytest import raises
 from ignition.dsl.flame.tensors import (ConformityError, I, Inverse, one, T,
                                     Tensor, solve_vec_eqn)
+from ignition.dsl.flame.tensors.expand import tensor_expand
+from ignition.dsl.flame.tensors.tensor import clear_tensor_cache
+from ignition.dsl.flame.tensors.tensor_expr import (clear_rank_cache,
+                                                    expr_rank, expr_shape)
+from ignition.utils.instrument import Profiler, profiling
 
 
 delta_1, omega_2, pi_1, pi_2, gamma_2, mu_12 = \
@@ -123,6 +128,65 @@ def testInverseMul():
     assert(A_I*e == 5*pAp*I)
     assert(e*pAp_I == 5*A)
 
+def testInverseMulBlocked():
+    A = Tensor('A', rank=2, has_inv=True)
+    B = Tensor('B', rank=2, has_inv=True)
+    # A matrix inverse only cancels its neighbour, past scalars.
+    e = B * A
+    assert(Inverse(A) * e == Mul(Inverse(A), B, A))
+    e = delta_1 * A * B
+    assert(Inverse(A) * e == delta_1 * I * B)
+    # A scalar inverse cancels anywhere in a product.
+    e = delta_1 * mu_12 * A * p_1
+    assert(Inverse(delta_1) * e == mu_12 * A * p_1)
+    assert(e * Inverse(mu_12) == delta_1 * A * p_1)
+    assert(Inverse(A) * Tensor('0', 2) == Tensor('0', 2))
+    assert((T(p_1) * Tensor('0', 1)).rank == 0)
+
+def testRankMemo():
+    clear_rank_cache()
+    expr = delta_1 * A * p_1 + r_1
+    assert(expr_rank(expr) == 1)
+    assert(expr_shape(T(expr)) == T(p_1).shape)
+    prof = Profiler()
+    with profiling(prof):
+        assert(expr_rank(expr) == 1)
+        assert(expr_shape(T(expr)) == T(p_1).shape)
+    # Looked up rather than computed again.
+    report = prof.report()
+    assert(report["timers"] == {})
+    assert(report["counters"] == {"expr_rank.cache_hits": 1,
+                                  "expr_shape.cache_hits": 1})
+    # Shapes that don't conform are not memoized.
+    raises(ConformityError, "expr_shape(p_1 ** 2)")
+    raises(ConformityError, "expr_shape(p_1 ** 2)")
+    clear_rank_cache()
+
+def testInterned():
+    clear_tensor_cache()
+    k = Symbol('k')
+    A_01 = Tensor('A_01', 2, shape=(k, k))
+    assert(Tensor('A_01', 2, shape=(k, k)) is A_01)
+    assert(A_01.update(l_ind='01', shape=(k, k)) is A_01)
+    # Building the name again with other attributes still sets them.
+    A_01_inv = Tensor('A_01', 2, has_inv=True)
+    assert(A_01_inv.has_inverse and A_01_inv.shape == (Symbol('n'),) * 2)
+    A_01 = Tensor('A_01', 2, shape=(k, k))
+    assert(A_01.shape == (k, k) and not A_01.has_inverse)
+    clear_tensor_cache()
+
+def testRedefined():
+    y = Tensor('y', rank=1)
+    expr = T(y) * A
+    assert(expr_rank(expr) == 1)
+    assert(tensor_expand(expr * y) == T(y) * A * y)
+    # The memos keyed on expressions with y don't outlive its redefinition.
+    y = Tensor('y', rank=2)
+    assert(expr_rank(expr) == 2)
+    assert(expr_shape(expr) == (Symbol('n'), Symbol('n')))
+    y = Tensor('y', rank=1)
+    assert(expr_rank(expr) == 1)
+
 
 if __name__ == "__main__":
     test_numpy_print()
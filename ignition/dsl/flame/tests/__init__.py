@@ -1 +1,27 @@
 __author__ = 'aterrel'
+
+import shutil
+import tempfile
+
+from ignition.dsl.flame import generator
+from ignition.dsl.flame.printing import printer
+
+_saved = {}
+
+def setup_package ():
+    """Keeps the solution and template caches of the tests out of the
+    user's home directory."""
+    _saved["solution_dir"] = generator.SOLUTION_CACHE_DIR
+    _saved["use_solutions"] = generator.USE_SOLUTION_CACHE
+    _saved["use_templates"] = printer.USE_TEMPLATE_MODULES
+    generator.SOLUTION_CACHE_DIR = tempfile.mkdtemp(prefix="ignition-test-")
+    generator.USE_SOLUTION_CACHE = False
+    printer.USE_TEMPLATE_MODULES = False
+    printer._template_lookup = None
+
+def teardown_package ():
+    shutil.rmtree(generator.SOLUTION_CACHE_DIR, ignore_errors=True)
+    generator.SOLUTION_CACHE_DIR = _saved["solution_dir"]
+    generator.USE_SOLUTION_CACHE = _saved["use_solutions"]
+    printer.USE_TEMPLATE_MODULES = _saved["use_templates"]
+    printer._template_lookup = None
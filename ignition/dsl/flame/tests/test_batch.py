@@ -0,0 +1,74 @@
+import os
+import shutil
+import tempfile
+
+import numpy
+
+from ignition.dsl.flame import Fuse_1x1, generate_batch, iterative_arg, \
+                               Part_1x1, PObj, Repart_1x1, tensor_solver
+from ignition.dsl.flame.batch import _arg_key
+from ignition.dsl.flame.benchmarks import _ak_kj_inv
+
+from test_generator import AK_KJ_args, AK_KJ_Rule
+
+def test_generate_batch ():
+    calls = []
+    def counting_solver (b4_eqns, aft_eqns, **kws):
+        calls.append(kws)
+        return tensor_solver(b4_eqns, aft_eqns, **kws)
+
+    directory = tempfile.mkdtemp()
+    try:
+        filename = os.path.join(directory, "ak_kj.tex")
+        jobs = [(None, AK_KJ_Rule, AK_KJ_args()),
+                (None, AK_KJ_Rule, AK_KJ_args(), filename),
+                (None, _ak_kj_inv, AK_KJ_args())]
+        gens = generate_batch(jobs, counting_solver, num_procs=1,
+                              use_cache=False)
+        # Equal operands are shared, and so are the generators of equal
+        # jobs and the solver runs of equal equations.
+        assert(len(calls) == 1)
+        assert(gens[0] is gens[1])
+        assert(gens[0] is not gens[2])
+        assert(gens[0]._args[1] is gens[2]._args[1])
+        assert(gens[0].update == gens[2].update)
+        assert(os.path.exists(filename))
+    finally:
+        shutil.rmtree(directory)
+
+def test_arg_key ():
+    A, K, J = AK_KJ_args()
+    other_A, other_K, _ = AK_KJ_args()
+    assert(_arg_key(K) == _arg_key(other_K))
+    sym_A = PObj(A.obj, part_fun=A.part_fun, repart_fun=A.repart_fun,
+                 fuse_fun=A.fuse_fun, arg_src=A.arg_src, props=["Symmetric"])
+    assert(_arg_key(sym_A) != _arg_key(A))
+    assert(_arg_key(sym_A) == _arg_key(PObj(A.obj, part_fun=Part_1x1(),
+                                            repart_fun=Repart_1x1(),
+                                            fuse_fun=Fuse_1x1(),
+                                            arg_src=A.arg_src,
+                                            props=["Symmetric"])))
+    # Operands that can't be compared are not shared.
+    odd_A = PObj(A.obj, part_fun=A.part_fun, repart_fun=A.repart_fun,
+                 fuse_fun=A.fuse_fun, arg_src=A.arg_src,
+                 props=[numpy.zeros(2)])
+    assert(_arg_key(odd_A) == id(odd_A))
+    gens = generate_batch([(None, AK_KJ_Rule, [A, K, J]),
+                           (None, AK_KJ_Rule, [sym_A, other_K, J])],
+                          num_procs=1, use_cache=False)
+    assert(gens[0] is not gens[1])
+    assert(gens[1]._args[0] is sym_A and gens[1]._args[1] is K)
+
+def test_generate_batch_pool ():
+    blocked_args = [iterative_arg("A", rank=2, part_suffix="1x1"),
+                    iterative_arg("K", rank=2, part_suffix="Blocked_1x3",
+                                  arg_src="Output"),
+                    iterative_arg("J", rank=2, part_suffix="Blocked_J_3x3",
+                                  arg_src="Computed")]
+    jobs = [(None, AK_KJ_Rule, AK_KJ_args()),
+            (None, _ak_kj_inv, blocked_args)]
+    gens = generate_batch(jobs, num_procs=2, use_cache=False)
+    for job, gen_obj in zip(jobs, gens):
+        gen = generate_batch([job], num_procs=1, use_cache=False)[0]
+        assert(gen_obj.update == gen.update)
+    assert(map(str, gens[1].update) == ["K_2"])
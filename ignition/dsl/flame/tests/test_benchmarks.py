@@ -0,0 +1,10 @@
+from ignition.dsl.flame.benchmarks import format_records, run_benchmarks
+
+def test_run_benchmarks ():
+    records = run_benchmarks(["ak_kj"], isolate=False)
+    assert(records.keys() == ["ak_kj"])
+    record = records["ak_kj"]
+    assert(record["solutions"] == 1)
+    assert(record["orders_tested"] >= 1)
+    assert(record["levels"] == -1)
+    assert("ak_kj" in format_records(records, records))
@@ -0,0 +1,141 @@
+import functools
+import os
+import shutil
+import tempfile
+from numpy import matrix
+
+from ignition.dsl.flame import generator
+from ignition.dsl.flame import *
+from ignition.utils import flatten
+
+def AK_KJ_Rule (A, K, J):
+    [A] = A
+    [K_l, k_m, K_r] = K
+    [[J_tl, _, _],
+     [Tj_ml, _, _],
+     [_, j_bm, J_br]] = J
+    op = A * K_l - K_l * J_tl - k_m * Tj_ml
+    if type(op) is matrix:
+        op = flatten(op.tolist())
+    return op, []
+
+def AK_KJ_args ():
+    A = PObj(Tensor("A", rank=2),
+             part_fun=Part_1x1(),
+             repart_fun=Repart_1x1(),
+             fuse_fun=Fuse_1x1(),
+             arg_src=PObj.ARG_SRC.Input)
+    K = PObj(Tensor("K", rank=2),
+             part_fun=Part_1x3(),
+             repart_fun=Repart_1x3(),
+             fuse_fun=Fuse_1x3(),
+             arg_src=PObj.ARG_SRC.Output)
+    J = PObj(Tensor("J", rank=2),
+             part_fun=Part_J_3x3(),
+             repart_fun=Repart_J_3x3(),
+             fuse_fun=Fuse_J_3x3(),
+             arg_src=PObj.ARG_SRC.Computed)
+    return [A, K, J]
+
+calls = []
+
+def counting_solver (b4_eqns, aft_eqns, **kws):
+    # Defined at module level, so its solutions can be cached.
+    calls.append(kws)
+    return tensor_solver(b4_eqns, aft_eqns, **kws)
+
+def test_gen_update_cache ():
+    del calls[:]
+    old_dir = generator.SOLUTION_CACHE_DIR
+    generator.SOLUTION_CACHE_DIR = tempfile.mkdtemp()
+    try:
+        gen = PAlgGenerator(AK_KJ_Rule, counting_solver, *AK_KJ_args())
+        gen.gen_update(use_cache=True, verbose=False)
+        assert(len(calls) == 1)
+        update = gen.update
+        assert(update is not None)
+        gen = PAlgGenerator(AK_KJ_Rule, counting_solver, *AK_KJ_args())
+        gen.gen_update(use_cache=True)
+        assert(len(calls) == 1)
+        assert(gen.update == update)
+        gen.gen_update(use_cache=True, num_sols=2)
+        assert(len(calls) == 2)
+        gen.gen_update(use_cache=False)
+        assert(len(calls) == 3)
+    finally:
+        shutil.rmtree(generator.SOLUTION_CACHE_DIR)
+        generator.SOLUTION_CACHE_DIR = old_dir
+
+def test_unnamed_solver ():
+    # Lambdas and partials have no name telling them apart, so their
+    # solutions are not cached.
+    del calls[:]
+    solvers = [lambda b4_eqns, aft_eqns, **kws: \
+                   counting_solver(b4_eqns, aft_eqns, **kws),
+               functools.partial(counting_solver, num_sols=1)]
+    old_dir = generator.SOLUTION_CACHE_DIR
+    generator.SOLUTION_CACHE_DIR = tempfile.mkdtemp()
+    try:
+        for solver in solvers:
+            gen = PAlgGenerator(AK_KJ_Rule, solver, *AK_KJ_args())
+            assert(gen.solution_key(gen.gen_eqns(), {}) is None)
+            gen.gen_update(use_cache=True, verbose=False)
+            gen.gen_update(use_cache=True, verbose=False)
+        assert(len(calls) == 4)
+        gen = PAlgGenerator(AK_KJ_Rule, tensor_solver, *AK_KJ_args())
+        knowns = gen.gen_eqns()
+        assert(gen.solution_key(knowns, {}) is not None)
+        assert(gen.solution_key(knowns, {"cost": lambda s: 0}) is None)
+        assert(os.listdir(generator.SOLUTION_CACHE_DIR) == [])
+    finally:
+        shutil.rmtree(generator.SOLUTION_CACHE_DIR)
+        generator.SOLUTION_CACHE_DIR = old_dir
+
+def test_mappings ():
+    A, K, J = AK_KJ_args()
+    gen = PAlgGenerator(AK_KJ_Rule, tensor_solver, A, K, J)
+    assert(gen.partition is gen.partition)
+    assert(gen.repartition[K.obj] == K.repart)
+    assert(gen.mappings.reparts[1] is K.repart)
+    try:
+        gen.repart_fun[K.obj] = Repart_1x1()
+    except TypeError:
+        pass
+    else:
+        assert False, "The repartition rules of a generator changed."
+    K.repart_fun = Repart_Blocked_1x3()
+    K.part_fun = Part_Blocked_1x3()
+    assert(isinstance(gen.repart_fun[K.obj], Repart_1x3))
+    gen.invalidate(K)
+    assert(isinstance(gen.repart_fun[K.obj], Repart_Blocked_1x3))
+    assert(str(gen.partition[K.obj]) == "[K_L, K_M, K_R]")
+
+def test_partsub ():
+    J = AK_KJ_args()[2]
+    J_tl = J.part[0][0]
+    subs = {J_tl: "tl"}
+    part = J._apply_partsub(subs)
+    assert(part[0][0] == "tl")
+    assert(part[1:] == J.part[1:])
+    assert(J.part[0][0] == J_tl)
+
+def test_solution_key_symmetric ():
+    x, b = Tensor("x", rank=1), Tensor("b", rank=1)
+    keys = []
+    for symmetric in [False, True]:
+        A = Tensor("A", rank=2, symmetric=symmetric)
+        keys.append(generator.solution_cache_key(tensor_solver, [],
+                                                 [A * x - b], [A, b], {}))
+    assert(keys[0] != keys[1])
+
+def test_solution_key_version ():
+    gen = PAlgGenerator(AK_KJ_Rule, tensor_solver, *AK_KJ_args())
+    knowns = gen.gen_eqns()
+    key = gen.solution_key(knowns, {})
+    old_version = generator.SOLUTION_CACHE_VERSION
+    generator.SOLUTION_CACHE_VERSION = old_version + 1
+    try:
+        assert(gen.solution_key(knowns, {}) != key)
+    finally:
+        generator.SOLUTION_CACHE_VERSION = old_version
+    assert(gen.solution_key(knowns, {}) == key)
@@ -1,3 +1,4 @@
 from .enum import Enum
 from .iterators import (flatten, flatten_list, nested_list_idxs,
-                       UpdatingPermutationIterator)
+                       PrunedPermutationIterator, UpdatingPermutationIterator)
+from .parallel import get_num_procs, pool_imap
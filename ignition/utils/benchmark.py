@@ -0,0 +1,115 @@
+"""Running benchmarks and comparing them to a stored baseline.
+
+A benchmark is a function returning a dict of numbers describing its
+result, like the number of solutions found.  measure runs it under a
+Profiler and adds the wall time, the peak memory and the profiler counters
+to that dict, and run_isolated does so in a fresh process so that the peak
+memory and any global state belong to that benchmark alone.  The records of
+a run are saved as JSON and compare flags the entries of a later run that
+got worse.
+
+>>> base = {"cg": {"seconds": 1.0, "solutions": 2}}
+>>> compare({"cg": {"seconds": 2.0, "solutions": 2}}, base)
+[('cg', 'seconds', 1.0, 2.0)]
+"""
+
+import json
+import multiprocessing
+import resource
+import sys
+import time
+
+from .instrument import Profiler, profiling
+
+# Relative increase of the wall time or peak memory flagged as a regression.
+TOLERANCE = 0.25
+# Changes in wall time smaller than this many seconds are taken as noise.
+MIN_SECONDS = 0.1
+
+def peak_memory ():
+    """Returns the peak resident memory of this process in kilobytes."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        # Reported in bytes there.
+        peak //= 1024
+    return peak
+
+def measure (fun, *args):
+    """Returns the record of running fun(*args).
+
+    The record is the dict returned by fun plus the wall time in seconds,
+    the peak memory in kilobytes of the process, and the counters and the
+    number of calls of each timed phase of the Profiler active during the
+    call.
+    """
+    prof = Profiler()
+    start = time.time()
+    with profiling(prof):
+        record = dict(fun(*args) or {})
+    record["seconds"] = time.time() - start
+    record["peak_kb"] = peak_memory()
+    report = prof.report()
+    record["counters"] = report["counters"]
+    record["calls"] = dict((name, timer["calls"])
+                           for name, timer in report["timers"].iteritems())
+    return record
+
+def _measure (args):
+    return measure(*args)
+
+def run_isolated (fun, *args):
+    """Returns measure(fun, *args) run in a new process.
+
+    fun and args must be picklable.
+    """
+    pool = multiprocessing.Pool(1)
+    try:
+        return pool.apply(_measure, ((fun,) + args,))
+    finally:
+        pool.terminate()
+        pool.join()
+
+def load_records (filename):
+    """Returns the records saved with save_records."""
+    with open(filename) as fp:
+        return json.load(fp)
+
+def save_records (records, filename):
+    """Writes the dict of records, keyed by benchmark name, as JSON."""
+    with open(filename, 'w') as fp:
+        json.dump(records, fp, indent=1, sort_keys=True)
+
+def _worse (key, old, new, tolerance, min_seconds):
+    if key == "seconds":
+        return new > old * (1 + tolerance) and new - old > min_seconds
+    if key == "peak_kb":
+        return new > old * (1 + tolerance)
+    # Any other number is a result that should not change.
+    return new != old
+
+def compare (records, baseline, tolerance=TOLERANCE, min_seconds=MIN_SECONDS,
+             keys=None):
+    """Returns the regressions of records against the baseline records.
+
+    The regressions are (name, key, old, new) tuples, sorted.  The wall
+    time and the peak memory regress when they grow by more than the
+    tolerance, the wall time also by more than min_seconds, and any other
+    number regresses when it changes.  keys limits the compared numbers,
+    by default every number found in both records.  Benchmarks missing
+    from either side are skipped.
+    """
+    regressions = []
+    for name, record in records.iteritems():
+        old_record = baseline.get(name)
+        if old_record is None:
+            continue
+        for key, new in record.iteritems():
+            if keys is not None and key not in keys:
+                continue
+            old = old_record.get(key)
+            if not isinstance(new, (int, long, float)) or \
+               not isinstance(old, (int, long, float)):
+                continue
+            if _worse(key, old, new, tolerance, min_seconds):
+                regressions.append((name, key, old, new))
+    return sorted(regressions)
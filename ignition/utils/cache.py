@@ -0,0 +1,211 @@
+"""In memory and persistent caches for expensive results"""
+
+from collections import OrderedDict
+import cPickle as pickle
+import functools
+import hashlib
+import os
+import tempfile
+
+# Default bound on the total size of a DiskCache in bytes.
+DEFAULT_MAX_SIZE = 64 * 1024 * 1024
+# Default number of results kept by memoize.
+DEFAULT_MEMO_SIZE = 100000
+
+class LRUCache (object):
+    """Bounded in memory mapping that drops the least recently used entry.
+
+    Counts the hits and misses of get, see info.  A maxsize of 0 disables
+    the cache.
+
+    >>> cache = LRUCache(2)
+    >>> cache.put('a', 1); cache.put('b', 2); cache.get('a')
+    1
+    >>> cache.put('c', 3); 'b' in cache
+    False
+    >>> cache.info()
+    (1, 0, 2, 2)
+    """
+
+    _missing = object()
+
+    def __init__ (self, maxsize=1024):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+
+    def get (self, key, default=None):
+        """Returns the value stored under key, or default."""
+        value = self._data.pop(key, self._missing)
+        if value is self._missing:
+            self.misses += 1
+            return default
+        self.hits += 1
+        self._data[key] = value
+        return value
+
+    def put (self, key, value):
+        if self.maxsize <= 0:
+            return
+        self._data.pop(key, None)
+        self._data[key] = value
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def __contains__ (self, key):
+        return key in self._data
+
+    def __len__ (self):
+        return len(self._data)
+
+    def clear (self):
+        """Removes every entry and resets the statistics."""
+        self._data.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def info (self):
+        """Returns (hits, misses, maxsize, current size)."""
+        return (self.hits, self.misses, self.maxsize, len(self._data))
+
+def memoize (maxsize=DEFAULT_MEMO_SIZE):
+    """Decorator remembering the results of a pure function.
+
+    The results are kept in a dict keyed by the positional arguments, which
+    must be hashable, and the dict is emptied when it holds maxsize of
+    them.  It is the cache attribute of the decorated function.
+
+    >>> @memoize(2)
+    ... def double (x):
+    ...     return 2 * x
+    >>> double(1), double(1), len(double.cache)
+    (2, 2, 1)
+    """
+    def _decorator (fun):
+        cache = {}
+        @functools.wraps(fun)
+        def _memoized (*args):
+            try:
+                return cache[args]
+            except KeyError:
+                pass
+            ret_val = fun(*args)
+            if len(cache) >= maxsize:
+                cache.clear()
+            cache[args] = ret_val
+            return ret_val
+        _memoized.cache = cache
+        return _memoized
+    return _decorator
+
+def hash_key (*parts):
+    """Returns a hex digest identifying the given strings."""
+    sha = hashlib.sha1()
+    for part in parts:
+        part = str(part)
+        # The length prefix keeps ("ab", "c") and ("a", "bc") apart.
+        sha.update("%d:" % len(part))
+        sha.update(part)
+    return sha.hexdigest()
+
+class DiskCache (object):
+    """Content addressed store of picklable values in a directory.
+
+    Each value is pickled to a file named after its key, normally a digest
+    from hash_key.  When the files grow past max_size bytes the least
+    recently used entries are removed.  Unreadable entries are treated as
+    misses, so a cache directory can be deleted or shared between processes
+    at any time.
+
+    >>> cache = DiskCache(tempfile.mkdtemp())
+    >>> key = hash_key("x", 1)
+    >>> cache.put(key, [1, 2])
+    >>> cache.get(key)
+    [1, 2]
+    """
+
+    suffix = ".pkl"
+
+    def __init__ (self, directory, max_size=DEFAULT_MAX_SIZE):
+        self.directory = directory
+        self.max_size = max_size
+
+    def _path (self, key):
+        return os.path.join(self.directory, key + self.suffix)
+
+    def _entries (self):
+        """Returns (mtime, size, path) of each entry, oldest first."""
+        if not os.path.isdir(self.directory):
+            return []
+        entries = []
+        for fname in os.listdir(self.directory):
+            if not fname.endswith(self.suffix):
+                continue
+            path = os.path.join(self.directory, fname)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        return sorted(entries)
+
+    def get (self, key, default=None):
+        """Returns the value stored under key, or default."""
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as fp:
+                value = pickle.load(fp)
+        except IOError:
+            return default
+        except Exception:
+            self._remove(path)
+            return default
+        try:
+            # Mark as recently used for eviction.
+            os.utime(path, None)
+        except OSError:
+            pass
+        return value
+
+    def put (self, key, value):
+        """Stores value under key, evicting old entries if needed."""
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+        # Write to a temporary file first so readers never see partial data.
+        fd, tmp_path = tempfile.mkstemp(suffix=".tmp", dir=self.directory)
+        try:
+            with os.fdopen(fd, 'wb') as fp:
+                pickle.dump(value, fp, pickle.HIGHEST_PROTOCOL)
+            os.rename(tmp_path, self._path(key))
+        except:
+            self._remove(tmp_path)
+            raise
+        self._evict()
+
+    def __contains__ (self, key):
+        return os.path.exists(self._path(key))
+
+    def __len__ (self):
+        return len(self._entries())
+
+    def clear (self):
+        """Removes every entry."""
+        for _, _, path in self._entries():
+            self._remove(path)
+
+    def _evict (self):
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+        # Always keep the newest entry, even if it is larger than max_size.
+        for _, size, path in entries[:-1]:
+            if total <= self.max_size:
+                break
+            self._remove(path)
+            total -= size
+
+    def _remove (self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
@@ -0,0 +1,43 @@
+"""An immutable dict.
+
+>>> d = FrozenDict(a=1)
+>>> d["a"], len(d), "a" in d
+(1, 1, True)
+>>> d["b"] = 2
+Traceback (most recent call last):
+    ...
+TypeError: 'FrozenDict' object does not support item assignment
+"""
+
+import collections
+
+
+class FrozenDict (collections.Mapping):
+    """A read only dict, built like dict.  It is hashable if its values
+    are."""
+
+    __slots__ = ("_dict", "_hash")
+
+    def __init__ (self, *args, **kws):
+        self._dict = dict(*args, **kws)
+        self._hash = None
+
+    def __getitem__ (self, key):
+        return self._dict[key]
+
+    def __iter__ (self):
+        return iter(self._dict)
+
+    def __len__ (self):
+        return len(self._dict)
+
+    def __contains__ (self, key):
+        return key in self._dict
+
+    def __hash__ (self):
+        if self._hash is None:
+            self._hash = hash(frozenset(self._dict.iteritems()))
+        return self._hash
+
+    def __repr__ (self):
+        return "FrozenDict(%r)" % self._dict
@@ -0,0 +1,162 @@
+"""Lightweight timers and counters for finding where the time goes.
+
+Instrumented code calls timer, count or the profiled decorator, which do
+nothing unless a Profiler is active.  A Profiler is activated for a block
+with set_profiler, or for the whole run by setting the IGNITION_PROFILE
+environment variable to the name of the JSON report to write at exit.
+
+>>> prof = Profiler()
+>>> old = set_profiler(prof)
+>>> with timer("work"):
+...     count("items", 3)
+>>> _ = set_profiler(old)
+>>> prof.report()["counters"]
+{'items': 3}
+"""
+
+import atexit
+from contextlib import contextmanager
+from functools import wraps
+import json
+import os
+import time
+
+# Report written at exit when set, see write_global_report.
+PROFILE_FILE = os.environ.get('IGNITION_PROFILE')
+
+class Profiler (object):
+    """Accumulates the time and calls of named phases and named counters.
+
+    Only the outermost of nested or recursive timings of the same name is
+    timed, so the seconds of a phase never count a recursive call twice,
+    but every call is counted.
+    """
+
+    def __init__ (self):
+        self.timers = {}
+        self.counters = {}
+        self._depth = {}
+
+    @contextmanager
+    def timer (self, name):
+        depth = self._depth.get(name, 0)
+        self._depth[name] = depth + 1
+        start = time.time()
+        try:
+            yield
+        finally:
+            self._depth[name] = depth
+            entry = self.timers.setdefault(name, [0, 0.0])
+            entry[0] += 1
+            if depth == 0:
+                entry[1] += time.time() - start
+
+    def count (self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def merge (self, report):
+        """Adds a report, from a worker process for example."""
+        for name, entry in report["timers"].iteritems():
+            old = self.timers.setdefault(name, [0, 0.0])
+            old[0] += entry["calls"]
+            old[1] += entry["seconds"]
+        for name, n in report["counters"].iteritems():
+            self.count(name, n)
+
+    def report (self):
+        """Returns the timers and counters as a JSON serializable dict."""
+        return {"timers": dict((name, {"calls": calls, "seconds": seconds})
+                               for name, (calls, seconds)
+                               in self.timers.iteritems()),
+                "counters": dict(self.counters)}
+
+    def write (self, filename):
+        """Writes the report to filename as JSON."""
+        with open(filename, 'w') as fp:
+            json.dump(self.report(), fp, indent=1, sort_keys=True)
+
+_profiler = None
+
+def get_profiler ():
+    """Returns the active Profiler or None."""
+    return _profiler
+
+def set_profiler (profiler):
+    """Makes profiler the active Profiler, None turns profiling off.
+
+    Returns the previously active Profiler.
+    """
+    global _profiler
+    old = _profiler
+    _profiler = profiler
+    return old
+
+@contextmanager
+def _null_timer ():
+    yield
+
+def timer (name):
+    """Context manager timing a block as the phase name."""
+    if _profiler is None:
+        return _null_timer()
+    return _profiler.timer(name)
+
+def count (name, n=1):
+    """Adds n to the counter name."""
+    if _profiler is not None:
+        _profiler.count(name, n)
+
+def profiled (name=None):
+    """Decorator timing every call of a function as the phase name, which
+    defaults to the function name."""
+    def _decorator (fun):
+        phase = name or fun.__name__
+        @wraps(fun)
+        def _wrapper (*args, **kws):
+            if _profiler is None:
+                return fun(*args, **kws)
+            with _profiler.timer(phase):
+                return fun(*args, **kws)
+        return _wrapper
+    return _decorator
+
+def worker_profiler ():
+    """Starts a fresh Profiler in a pool worker if profiling is on.
+
+    Worker processes inherit the Profiler of their parent, so each task
+    starts a new one and returns its report for the parent to merge.
+    """
+    if _profiler is None:
+        return None
+    set_profiler(Profiler())
+    return _profiler
+
+@contextmanager
+def profiling (profile):
+    """Profiles a block with profile, a Profiler or a file name for the
+    JSON report, or does nothing if profile is None.
+
+    The results are also added to the Profiler active before the block.
+    """
+    if profile is None:
+        yield None
+        return
+    prof = Profiler() if isinstance(profile, basestring) else profile
+    old = set_profiler(prof)
+    try:
+        yield prof
+    finally:
+        set_profiler(old)
+        if old is not None and old is not prof:
+            old.merge(prof.report())
+        if isinstance(profile, basestring):
+            prof.write(profile)
+
+def write_global_report ():
+    """Writes the report of the active Profiler to PROFILE_FILE."""
+    if PROFILE_FILE and _profiler is not None:
+        _profiler.write(PROFILE_FILE)
+
+if PROFILE_FILE:
+    set_profiler(Profiler())
+    atexit.register(write_global_report)
@@ -20,18 +20,28 @@ class UpdatingPermutationIterator (object):
     >>> list(iter)
     >>> [[2, 0, 1], [2, 1, 0]]
 
-
+    If prefix is given, a list of item indexes, only the permutations
+    starting with those items are visited.  See shards.
     """
 
-    def __init__ (self, items, n= -1):
+    def __init__ (self, items, n= -1, prefix=None):
         self._items = copy(items)
         self._n = n if n > 0 and n <= len(items) else len(items)
-        self._curr = range(self._n)
+        self._prefix = [] if prefix is None else list(prefix)
+        self._curr = self._first_perm()
         self._done = False
         self._first = True
 
     def __len__(self):
-        return math.factorial(len(self._items))
+        return math.factorial(len(self._items) - len(self._prefix))
+
+    def _first_perm(self):
+        rest = [idx for idx in xrange(len(self._items)) \
+                if idx not in self._prefix]
+        return self._prefix + rest[:self._n - len(self._prefix)]
+
+    def _left_prefix(self):
+        return self._curr[:len(self._prefix)] != self._prefix
 
     def _increment(self):
         i = self._n - 1
@@ -56,7 +66,7 @@ class UpdatingPermutationIterator (object):
         return self
 
     def reset (self):
-        self._curr = range(self._n)
+        self._curr = self._first_perm()
         self._done = False
         self._first = True
 
@@ -66,23 +76,93 @@ class UpdatingPermutationIterator (object):
             return map(lambda idx: self._items[idx], self._curr)
         while not self._done:
             self._increment()
-            if self._is_perm():
+            if self._done or self._left_prefix():
+                # Wrapped around or moved past the prefix.
+                self._done = True
+            elif self._is_perm():
                 ret_val = map(lambda idx: self._items[idx], self._curr)
                 return ret_val
         raise StopIteration
 
     def bad_pos(self, pos):
-        #find largest after bad pos
-        if self._curr[pos] < len(self._items) - 1:
-            self._curr[pos] += 1
-            for idx in xrange(pos + 1, self._n):
-                self._curr[idx] = 0
-        elif pos == 0:
+        if pos < len(self._prefix):
             self._done = True
-        else:
-            self._curr[pos - 1] += 1
-            for idx in xrange(pos, self._n):
-                self._curr[idx] = 0
+            return
+        # Max out everything after pos so the next increment carries into
+        # pos, skipping every permutation with the current prefix.
+        for idx in xrange(pos + 1, self._n):
+            self._curr[idx] = len(self._items) - 1
+
+    def shards(self, depth=1):
+        """Splits the remaining permutations into prefix-disjoint iterators.
+
+        Returns a list of iterators, one for each permutation prefix of
+        length depth, in the order this iterator would visit them.  Chaining
+        the shards visits the same permutations as this iterator, including
+        the skipping done through bad_pos.
+
+        >>> [list(s) for s in UpdatingPermutationIterator(range(3)).shards()]
+        [[[0, 1, 2], [0, 2, 1]], [[1, 0, 2], [1, 2, 0]], [[2, 0, 1], [2, 1, 0]]]
+        """
+        depth = max(min(depth, self._n), len(self._prefix))
+        ret_val = []
+        def _recur (prefix):
+            if len(prefix) == depth:
+                ret_val.append(self._shard(prefix))
+                return
+            for idx in xrange(len(self._items)):
+                if idx not in prefix:
+                    _recur(prefix + [idx])
+        _recur(self._prefix)
+        return ret_val
+
+    def _shard(self, prefix):
+        return UpdatingPermutationIterator(self._items, self._n, prefix)
+
+    def _num_completions(self, pos):
+        """Number of permutations sharing the current first pos+1 items."""
+        return math.factorial(len(self._items) - pos - 1) / \
+               math.factorial(len(self._items) - self._n)
+
+
+class PrunedPermutationIterator (UpdatingPermutationIterator):
+    """An UpdatingPermutationIterator that only yields permutations passing
+    a check.
+
+    check is called with each candidate permutation and returns the first
+    position at which the permutation is known to fail, or None.  Every
+    permutation sharing the failed prefix is skipped without being checked
+    again and counted in num_skipped.
+
+    >>> iter = PrunedPermutationIterator(range(3),
+    ...     lambda p: 0 if p[0] == 1 else None)
+    >>> list(iter)
+    [[0, 1, 2], [0, 2, 1], [2, 0, 1], [2, 1, 0]]
+    >>> iter.num_skipped
+    2
+    """
+
+    def __init__ (self, items, check, n= -1, prefix=None):
+        super(PrunedPermutationIterator, self).__init__(items, n, prefix)
+        self._check = check
+        self.num_skipped = 0
+
+    def reset (self):
+        super(PrunedPermutationIterator, self).reset()
+        self.num_skipped = 0
+
+    def next(self):
+        while True:
+            perm = super(PrunedPermutationIterator, self).next()
+            pos = self._check(perm)
+            if pos is None:
+                return perm
+            self.num_skipped += self._num_completions(pos)
+            self.bad_pos(pos)
+
+    def _shard(self, prefix):
+        return PrunedPermutationIterator(self._items, self._check, self._n,
+                                         prefix)
 
 
 def flatten (alst):
@@ -0,0 +1,49 @@
+"""Helpers for running independent jobs on a pool of worker processes"""
+
+import multiprocessing
+import signal
+
+# Seconds between checks for KeyboardInterrupt while waiting on workers.
+POLL_TIMEOUT = 0.5
+
+def _ignore_sigint ():
+    # Workers leave Ctrl-C to the parent, which tears down the pool.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+def get_num_procs (num_procs=None):
+    """Returns the number of worker processes to use.
+
+    None or a value less than one means use every available cpu.
+    """
+    if num_procs is None or num_procs < 1:
+        return multiprocessing.cpu_count()
+    return num_procs
+
+def pool_imap (fun, args_list, num_procs=None):
+    """Yields fun(args) for each args in args_list, in order.
+
+    The calls are farmed out to num_procs worker processes, fun and each args
+    must be picklable.  With a single process everything is run in the
+    calling process.  Closing the generator early, for example on a
+    KeyboardInterrupt, terminates the outstanding workers.
+    """
+    num_procs = get_num_procs(num_procs)
+    if num_procs == 1:
+        for args in args_list:
+            yield fun(args)
+        return
+    pool = multiprocessing.Pool(num_procs, _ignore_sigint)
+    try:
+        results = pool.imap(fun, args_list)
+        while True:
+            try:
+                # A timeout keeps the wait interruptible by Ctrl-C.
+                yield results.next(POLL_TIMEOUT)
+            except multiprocessing.TimeoutError:
+                continue
+            except StopIteration:
+                break
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
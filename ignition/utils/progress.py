@@ -0,0 +1,116 @@
+"""Progress reporting through logging and callbacks.
+
+Messages go to the standard logging module with their arguments left
+unformatted, and large payloads wrapped in Lazy, so nothing is turned into
+a string unless a handler emits the record.  ProgressReporter also passes
+each event with its raw payload to an optional callback and rate limits the
+periodic progress events.
+
+>>> import logging
+>>> events = []
+>>> reporter = ProgressReporter(logging.getLogger("ignition.doc"),
+...                             lambda event, payload: events.append(event))
+>>> reporter.event("start", logging.INFO, "Starting %d", 3, total=3)
+>>> reporter.progress("tested", "Tested %d", 1)
+True
+>>> reporter.progress("tested", "Tested %d", 2)
+False
+>>> events
+['start', 'tested']
+"""
+
+from contextlib import contextmanager
+import logging
+import pprint
+import sys
+import time
+
+# Minimum number of seconds between two progress events of the same name.
+PROGRESS_INTERVAL = 1.0
+
+class Lazy (object):
+    """Defers calling fun(*args) until the object is formatted."""
+
+    __slots__ = ("fun", "args")
+
+    def __init__ (self, fun, *args):
+        self.fun = fun
+        self.args = args
+
+    def __str__ (self):
+        return str(self.fun(*self.args))
+
+    __repr__ = __str__
+
+def pformat_lazy (obj):
+    """Returns obj pretty printed as the solvers do, when formatted."""
+    return Lazy(pprint.pformat, obj, 4, 80)
+
+class ProgressReporter (object):
+    """Sends events to a logger and to callback(event, payload).
+
+    The payload is the dict of keywords given with the event, passed on as
+    is.  progress events of the same name are dropped if the last one was
+    less than interval seconds ago.
+    """
+
+    def __init__ (self, logger, callback=None, interval=PROGRESS_INTERVAL):
+        self.logger = logger
+        self.callback = callback
+        self.interval = interval
+        self._last = {}
+
+    def enabled (self, level):
+        """Returns True if an event at level would go anywhere."""
+        return self.callback is not None or self.logger.isEnabledFor(level)
+
+    def event (self, event, level, msg, *args, **payload):
+        """Logs msg % args at level and calls the callback."""
+        if self.logger.isEnabledFor(level):
+            self.logger.log(level, msg, *args)
+        if self.callback is not None:
+            self.callback(event, payload)
+
+    def progress (self, event, msg, *args, **payload):
+        """Reports an INFO event unless one of the same name was just
+        reported.  Returns True if it was reported."""
+        now = time.time()
+        last = self._last.get(event)
+        if last is not None and now - last < self.interval:
+            return False
+        self._last[event] = now
+        self.event(event, logging.INFO, msg, *args, **payload)
+        return True
+
+def _has_handlers (logger):
+    while logger is not None:
+        if any(not isinstance(h, logging.NullHandler)
+               for h in logger.handlers):
+            return True
+        if not logger.propagate:
+            break
+        logger = logger.parent
+    return False
+
+@contextmanager
+def console_logging (name="ignition", level=logging.INFO):
+    """Prints the messages of the logger name at level and above to stdout
+    for the duration of the block.
+
+    Does nothing if logging is already configured for that logger, so an
+    application's own handlers and levels are left alone.
+    """
+    logger = logging.getLogger(name)
+    if _has_handlers(logger):
+        yield logger
+        return
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    old_level = logger.level
+    logger.addHandler(handler)
+    logger.setLevel(level)
+    try:
+        yield logger
+    finally:
+        logger.removeHandler(handler)
+        logger.setLevel(old_level)
@@ -0,0 +1,44 @@
+import os
+import shutil
+import tempfile
+
+from ignition.utils.benchmark import (compare, load_records, measure,
+                                      run_isolated, save_records)
+from ignition.utils.instrument import count, timer
+
+def _counting (n):
+    count("items", n)
+    for i in xrange(n):
+        with timer("step"):
+            pass
+    return {"result": n * 2}
+
+def test_measure ():
+    record = measure(_counting, 3)
+    assert(record["result"] == 6)
+    assert(record["counters"] == {"items": 3})
+    assert(record["calls"] == {"step": 3})
+    assert(record["seconds"] >= 0)
+    assert(record["peak_kb"] > 0)
+    assert(run_isolated(_counting, 2)["counters"] == {"items": 2})
+
+def test_compare ():
+    base = {"a": {"seconds": 10.0, "peak_kb": 1000, "solutions": 4},
+            "b": {"seconds": 0.01, "peak_kb": 1000, "solutions": 1}}
+    # Faster, within the tolerance, or too small a change to matter.
+    new = {"a": {"seconds": 11.0, "peak_kb": 900, "solutions": 4},
+           "b": {"seconds": 0.05, "peak_kb": 1000, "solutions": 1},
+           "c": {"seconds": 100.0}}
+    assert(compare(new, base) == [])
+    new = {"a": {"seconds": 20.0, "peak_kb": 2000, "solutions": 3}}
+    assert(compare(new, base) == [("a", "peak_kb", 1000, 2000),
+                                  ("a", "seconds", 10.0, 20.0),
+                                  ("a", "solutions", 4, 3)])
+    assert(compare(new, base, keys=["solutions"]) == [("a", "solutions", 4, 3)])
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        filename = os.path.join(tmp_dir, "base.json")
+        save_records(base, filename)
+        assert(load_records(filename) == base)
+    finally:
+        shutil.rmtree(tmp_dir)
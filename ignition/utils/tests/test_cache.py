@@ -0,0 +1,74 @@
+import os
+import shutil
+import tempfile
+
+from ignition.utils.cache import DiskCache, hash_key, LRUCache, memoize
+
+def test_hash_key ():
+    assert(hash_key("a", 1) == hash_key("a", "1"))
+    assert(hash_key("ab", "c") != hash_key("a", "bc"))
+
+def test_LRUCache ():
+    cache = LRUCache(2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert(cache.get('a') == 1)
+    cache.put('c', 3)
+    assert('b' not in cache)
+    assert(cache.get('b') is None)
+    assert(cache.info() == (1, 1, 2, 2))
+    cache.clear()
+    assert(cache.info() == (0, 0, 2, 0))
+    cache = LRUCache(0)
+    cache.put('a', 1)
+    assert(len(cache) == 0)
+
+def test_memoize ():
+    calls = []
+    @memoize(2)
+    def square (x):
+        calls.append(x)
+        return x * x
+    assert(square(2) == 4 and square(2) == 4)
+    assert(calls == [2])
+    assert(square.__name__ == "square")
+    square(3)
+    # Full, so emptied before storing the third result.
+    square(4)
+    assert(square.cache == {(4,): 16})
+    assert(square(2) == 4 and calls == [2, 3, 4, 2])
+
+def test_DiskCache ():
+    directory = tempfile.mkdtemp()
+    try:
+        cache = DiskCache(os.path.join(directory, "cache"))
+        key = hash_key("x")
+        assert(cache.get(key) is None)
+        assert(cache.get(key, 3) == 3)
+        cache.put(key, {"x": [1, 2]})
+        assert(key in cache)
+        assert(cache.get(key) == {"x": [1, 2]})
+        # Corrupt entries are misses.
+        open(cache._path(key), 'w').write("garbage")
+        assert(cache.get(key) is None)
+        assert(key not in cache)
+        cache.put(key, 1)
+        cache.clear()
+        assert(len(cache) == 0)
+    finally:
+        shutil.rmtree(directory)
+
+def test_DiskCache_evict ():
+    directory = tempfile.mkdtemp()
+    try:
+        cache = DiskCache(directory, max_size=1500)
+        keys = map(hash_key, range(3))
+        for n, key in enumerate(keys):
+            cache.put(key, "x" * 600)
+            # Make sure the mtimes are ordered.
+            os.utime(cache._path(key), (n, n))
+        assert(keys[0] not in cache)
+        assert(keys[1] in cache)
+        assert(keys[2] in cache)
+    finally:
+        shutil.rmtree(directory)
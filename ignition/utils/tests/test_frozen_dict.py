@@ -0,0 +1,15 @@
+from ignition.utils.frozen_dict import FrozenDict
+
+def test_frozen_dict ():
+    d = FrozenDict({"a": 1}, b=2)
+    assert(d == {"a": 1, "b": 2})
+    assert(sorted(d.iteritems()) == [("a", 1), ("b", 2)])
+    assert(hash(d) == hash(FrozenDict(a=1, b=2)))
+    for stmt in ["d['c'] = 3", "del d['a']", "d.update(c=3)"]:
+        try:
+            exec stmt
+        except (TypeError, AttributeError):
+            pass
+        else:
+            assert False, "FrozenDict allowed: %s" % stmt
+    assert(d == {"a": 1, "b": 2})
@@ -0,0 +1,56 @@
+import json
+import os
+import shutil
+import tempfile
+
+from ignition.utils.instrument import (count, get_profiler, profiled,
+                                       Profiler, profiling, set_profiler,
+                                       timer)
+
+@profiled()
+def _fact (n):
+    return 1 if n <= 1 else n * _fact(n - 1)
+
+def test_profiler ():
+    # Nothing is recorded without an active profiler.
+    assert(get_profiler() is None)
+    count("ignored")
+    assert(_fact(3) == 6)
+    prof = Profiler()
+    old = set_profiler(prof)
+    try:
+        with timer("outer"):
+            count("items", 2)
+            count("items")
+            assert(_fact(4) == 24)
+    finally:
+        set_profiler(old)
+    report = prof.report()
+    assert(report["counters"] == {"items": 3})
+    assert(report["timers"]["outer"]["calls"] == 1)
+    # Recursive calls are counted but timed once.
+    assert(report["timers"]["_fact"]["calls"] == 4)
+    assert(report["timers"]["_fact"]["seconds"] <= \
+           report["timers"]["outer"]["seconds"])
+    total = Profiler()
+    total.merge(report)
+    total.merge(report)
+    assert(total.report()["counters"] == {"items": 6})
+    assert(total.report()["timers"]["_fact"]["calls"] == 8)
+
+def test_profiling ():
+    directory = tempfile.mkdtemp()
+    try:
+        filename = os.path.join(directory, "report.json")
+        outer = Profiler()
+        with profiling(outer):
+            with profiling(filename) as prof:
+                count("items")
+            assert(get_profiler() is outer)
+        assert(get_profiler() is None)
+        assert(json.load(open(filename)) == prof.report())
+        assert(outer.report()["counters"] == {"items": 1})
+        with profiling(None) as prof:
+            assert(prof is None)
+    finally:
+        shutil.rmtree(directory)
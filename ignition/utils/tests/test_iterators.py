@@ -1,6 +1,7 @@
 from sympy.utilities.pytest import raises
 
 from ignition.utils.iterators import (flatten, flatten_list, nested_list_idxs,
+                                      PrunedPermutationIterator,
                                       UpdatingPermutationIterator)
 
 
@@ -25,3 +26,38 @@ def test_UpdatingPermutationIterator ():
     assert(iter.next() == [1, 0, 2])
     iter.bad_pos(0)
     assert(iter.next() == [2, 0, 1])
+
+def test_UpdatingPermutationIterator_bad_last_pos ():
+    iter = UpdatingPermutationIterator(range(3))
+    assert(iter.next() == [0, 1, 2])
+    iter.bad_pos(2)
+    assert(iter.next() == [0, 2, 1])
+
+def test_UpdatingPermutationIterator_shards ():
+    shards = UpdatingPermutationIterator(range(3)).shards()
+    assert(map(list, shards) == [[[0, 1, 2], [0, 2, 1]],
+                                 [[1, 0, 2], [1, 2, 0]],
+                                 [[2, 0, 1], [2, 1, 0]]])
+    assert(len(UpdatingPermutationIterator(range(4)).shards(2)) == 12)
+    # Shards chain to the full iteration, including bad_pos skipping.
+    def _skip_visit (iter):
+        perms = []
+        for perm in iter:
+            perms.append(perm)
+            if perm[1] == 3:
+                iter.bad_pos(1)
+        return perms
+    shard_perms = []
+    for shard in UpdatingPermutationIterator(range(4)).shards():
+        shard_perms.extend(_skip_visit(shard))
+    assert(shard_perms == _skip_visit(UpdatingPermutationIterator(range(4))))
+
+def test_PrunedPermutationIterator ():
+    check = lambda perm: 1 if perm[1] == 2 else None
+    iter = PrunedPermutationIterator(range(4), check, 3)
+    perms = list(iter)
+    assert(perms == filter(lambda p: p[1] != 2,
+                           UpdatingPermutationIterator(range(4), 3)))
+    assert(iter.num_skipped == 6)
+    shards = PrunedPermutationIterator(range(4), check, 3).shards()
+    assert(sum(map(list, shards), []) == perms)
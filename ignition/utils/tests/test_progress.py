@@ -0,0 +1,55 @@
+import logging
+
+from ignition.utils.progress import (console_logging, Lazy, pformat_lazy,
+                                     ProgressReporter)
+
+def test_lazy ():
+    calls = []
+    def _format (obj):
+        calls.append(obj)
+        return "formatted %s" % obj
+    lazy = Lazy(_format, 1)
+    assert(calls == [])
+    assert(str(lazy) == "formatted 1")
+    assert(calls == [1])
+    assert(str(pformat_lazy([1, 2])) == "[1, 2]")
+
+def _quiet_logger (name):
+    # Keep the test runner's logging setup out of the way.
+    logger = logging.getLogger(name)
+    logger.propagate = False
+    logger.setLevel(logging.WARNING)
+    return logger
+
+def test_progress_reporter ():
+    calls = []
+    events = []
+    logger = _quiet_logger("ignition_test_progress")
+    reporter = ProgressReporter(logger, lambda e, p: events.append((e, p)))
+    # Disabled levels never format their arguments.
+    reporter.event("solution", logging.DEBUG, "%s", Lazy(calls.append, 1),
+                   sol_dict={})
+    assert(calls == [])
+    assert(events == [("solution", {"sol_dict": {}})])
+    assert(reporter.progress("progress", "Tested %d", 1, tested=1))
+    assert(not reporter.progress("progress", "Tested %d", 2, tested=2))
+    assert(reporter.progress("other", "Other"))
+    reporter.interval = 0
+    assert(reporter.progress("progress", "Tested %d", 3, tested=3))
+    assert([e for e, _ in events] == ["solution", "progress", "other",
+                                      "progress"])
+    assert(not ProgressReporter(logger).enabled(logging.DEBUG))
+
+def test_console_logging ():
+    logger = _quiet_logger("ignition_test_console")
+    with console_logging("ignition_test_console", logging.DEBUG):
+        assert(len(logger.handlers) == 1)
+        assert(logger.isEnabledFor(logging.DEBUG))
+    assert(len(logger.handlers) == 0)
+    assert(not logger.isEnabledFor(logging.INFO))
+    # Configured loggers are left alone.
+    logger.addHandler(logging.NullHandler())
+    logger.addHandler(logging.StreamHandler())
+    with console_logging("ignition_test_console", logging.DEBUG):
+        assert(len(logger.handlers) == 2)
+        assert(not logger.isEnabledFor(logging.INFO))